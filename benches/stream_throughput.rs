@@ -0,0 +1,99 @@
+//! Stream 消息 JSON 编码与二进制帧的吞吐对比
+//!
+//! 运行: `cargo bench --bench stream_throughput`
+//! 输出每种格式一行 JSON，便于脚本收集。
+
+#[allow(dead_code)]
+#[path = "../src/connect/frame.rs"]
+mod frame;
+
+use serde::{Deserialize, Serialize};
+use serde_json::{json, Value};
+use std::hint::black_box;
+use std::time::{Duration, Instant};
+
+use frame::{decode_stream_frame, encode_stream_frame};
+
+/// 与 `connect::data::Stream` 的 JSON 结构一致
+#[derive(Serialize, Deserialize)]
+struct JsonStream {
+    id: String,
+    tag: String,
+    bytes: Vec<u8>,
+    #[serde(skip_serializing_if = "Option::is_none", default)]
+    data: Option<Value>,
+}
+
+const CHUNK_SIZES: [usize; 3] = [1024, 4096, 16384];
+const MIN_DURATION: Duration = Duration::from_millis(500);
+const STREAM_ID: &str = "3f2b6c1e-6a0d-4c55-9a87-6d1f4d2e9b10";
+
+fn audio_chunk(size: usize) -> Vec<u8> {
+    // 伪随机字节，避免全零数据在 JSON 中被编码得过短
+    let mut state = 0x2545_f491_u32;
+    (0..size)
+        .map(|_| {
+            state ^= state << 13;
+            state ^= state >> 17;
+            state ^= state << 5;
+            state as u8
+        })
+        .collect()
+}
+
+fn measure<F: FnMut() -> usize>(mut run: F) -> (u64, Duration, usize) {
+    let mut iterations = 0u64;
+    let mut wire_bytes = 0;
+    let start = Instant::now();
+    while start.elapsed() < MIN_DURATION {
+        for _ in 0..64 {
+            wire_bytes = run();
+        }
+        iterations += 64;
+    }
+    (iterations, start.elapsed(), wire_bytes)
+}
+
+fn report(format: &str, chunk_size: usize, (iterations, elapsed, wire_bytes): (u64, Duration, usize)) {
+    let secs = elapsed.as_secs_f64();
+    let result = json!({
+        "bench": "stream_roundtrip",
+        "format": format,
+        "chunk_bytes": chunk_size,
+        "wire_bytes": wire_bytes,
+        "iterations": iterations,
+        "ns_per_roundtrip": secs * 1e9 / iterations as f64,
+        "mib_per_sec": (chunk_size as f64 * iterations as f64) / secs / (1024.0 * 1024.0),
+    });
+    println!("{}", result);
+}
+
+fn main() {
+    let data = Some(json!({ "sample_rate": 16000 }));
+    for chunk_size in CHUNK_SIZES {
+        let bytes = audio_chunk(chunk_size);
+
+        let json_stats = measure(|| {
+            let stream = JsonStream {
+                id: STREAM_ID.to_string(),
+                tag: "play".to_string(),
+                bytes: bytes.clone(),
+                data: data.clone(),
+            };
+            let encoded = serde_json::to_vec(black_box(&stream)).unwrap();
+            let decoded: JsonStream = serde_json::from_slice(black_box(&encoded)).unwrap();
+            assert_eq!(decoded.bytes.len(), chunk_size);
+            encoded.len()
+        });
+        report("json", chunk_size, json_stats);
+
+        let binary_stats = measure(|| {
+            let encoded = encode_stream_frame(STREAM_ID, "play", data.as_ref(), black_box(&bytes));
+            let wire_len = encoded.len();
+            let (_, decoded) = decode_stream_frame(black_box(encoded)).unwrap();
+            assert_eq!(decoded.len(), chunk_size);
+            wire_len
+        });
+        report("binary", chunk_size, binary_stats);
+    }
+}
@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from command_matcher import CommandMatcher  # noqa: E402
+from config import MUSIC_CONFIG  # noqa: E402
+from music_search import extract_play_keyword  # noqa: E402
+from music_search import is_stop_play_command  # noqa: E402
+from music_search import normalize_keyword  # noqa: E402
+
+
+UTTERANCES = [
+    "播放许嵩",
+    "播放 周杰伦 的 晴天",
+    "停止播放",
+    "暂停",
+    "刷新曲库",
+    "随便听听",
+    "音量调大一点",
+    "把声音调小",
+    "今天天气怎么样",
+    "明天早上七点叫我起床",
+    "给我讲个笑话吧",
+    "播放",
+]
+
+
+def _compact_set(keywords) -> set[str]:
+    return {normalize_keyword(item).replace(" ", "") for item in keywords if normalize_keyword(item)}
+
+
+def build_legacy_dispatch(command_config: dict):
+    play_keywords = list(command_config.get("play_keywords", []))
+    stop_keywords = set(command_config.get("stop_keywords", []))
+    refresh_keywords = _compact_set(command_config.get("refresh_keywords", []))
+    random_keywords = _compact_set(command_config.get("random_play_keywords", []))
+    whitelist_keywords = _compact_set(command_config.get("interrupt_whitelist_keywords", []))
+
+    def dispatch(text: str):
+        normalized = normalize_keyword(text).replace(" ", "")
+        whitelisted = any(keyword in normalized for keyword in whitelist_keywords if keyword)
+        if is_stop_play_command(text, stop_keywords):
+            return "stop", "", whitelisted
+        if normalized in refresh_keywords:
+            return "refresh", "", whitelisted
+        if normalized in random_keywords:
+            return "random", "", whitelisted
+        keyword = extract_play_keyword(text, play_keywords)
+        if keyword:
+            return "play", keyword, whitelisted
+        return None, "", whitelisted
+
+    return dispatch
+
+
+def measure(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in UTTERANCES:
+            fn(text)
+    return (time.perf_counter() - start) / (rounds * len(UTTERANCES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语音命令分发耗时基准")
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    command_config = MUSIC_CONFIG.get("commands", {}) or {}
+    legacy = build_legacy_dispatch(command_config)
+    matcher = CommandMatcher(command_config)
+
+    build_start = time.perf_counter()
+    for _ in range(100):
+        CommandMatcher(command_config)
+    build_us = (time.perf_counter() - build_start) / 100 * 1e6
+
+    result = {
+        "utterances": len(UTTERANCES),
+        "rounds": args.rounds,
+        "matcher_build_us": round(build_us, 2),
+        "legacy_us_per_utterance": round(measure(legacy, args.rounds), 3),
+        "matcher_us_per_utterance": round(measure(matcher.match, args.rounds), 3),
+    }
+    print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""曲库规模基准：索引构建（冷/热）、索引文件读写、按命中率分档的搜索延迟与随机选歌。
+
+```bash
+# 1 万与 10 万首；索引构建只对不超过 --max-disk 的规模在磁盘上生成文件
+python benchmarks/bench_music_library.py --sizes 10000,100000,1000000 --out bench.jsonl
+```
+
+每项结果输出一行 JSON（同时追加到 --out），字段 bench/size/case 标识测试项，便于比较不同提交的结果。
+默认 --probe none 跳过 ffprobe，只测遍历、stat 与索引组装；--probe ffprobe 测真实解析耗时（大规模下很慢）。
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_library import build_indexed_songs  # noqa: E402
+from benchmarks.synthetic_library import generate_library  # noqa: E402
+from music_search_core import MusicIndexer  # noqa: E402
+from music_search_core import MusicIndexStore  # noqa: E402
+from music_search_core import MusicSearchEngine  # noqa: E402
+from music_search_core.indexer import MusicMetadataExtractor  # noqa: E402
+from music_search_core.models import SongMetadata  # noqa: E402
+
+
+# 关键词按预期命中率从高到低排列，实际命中率随结果一起输出
+SEARCH_KEYWORDS = {
+    "very_high": "0",
+    "high": "周杰伦",
+    "medium": "adele",
+    "low": "歌手0042",
+    "none": "不存在的关键词",
+}
+EXTENSIONS = {".mp3", ".flac", ".m4a", ".wav"}
+
+
+def git_revision() -> str:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            check=False,
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    except OSError:
+        return ""
+    return result.stdout.strip()
+
+
+def percentile(samples: list[float], ratio: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * ratio), len(ordered) - 1)]
+
+
+def summarize(samples_sec: list[float]) -> dict:
+    samples_ms = [value * 1000 for value in samples_sec]
+    return {
+        "runs": len(samples_ms),
+        "mean_ms": round(statistics.fmean(samples_ms), 4),
+        "p50_ms": round(percentile(samples_ms, 0.5), 4),
+        "p95_ms": round(percentile(samples_ms, 0.95), 4),
+        "max_ms": round(max(samples_ms), 4),
+    }
+
+
+class Reporter:
+    def __init__(self, out_file: str):
+        self.out_file = out_file
+        self.common = {
+            "git_rev": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "timestamp": int(time.time()),
+        }
+
+    def emit(self, bench: str, size: int, case: str = "", **values):
+        record = {"bench": bench, "size": size, "case": case, **values, **self.common}
+        line = json.dumps(record, ensure_ascii=False)
+        print(line, flush=True)
+        if self.out_file:
+            with open(self.out_file, "a", encoding="utf-8") as file_obj:
+                file_obj.write(line + "\n")
+
+
+def bench_indexer(reporter: Reporter, root: str, size: int, probe: str, workers: int):
+    start = time.perf_counter()
+    written = generate_library(root, size)
+    reporter.emit("generate", size, written=written, seconds=round(time.perf_counter() - start, 3))
+
+    indexer = MusicIndexer(extensions=EXTENSIONS, metadata_workers=workers)
+    start = time.perf_counter()
+    songs = indexer.build([root])
+    cold_sec = time.perf_counter() - start
+    reporter.emit("indexer_build", size, "cold", probe=probe, workers=workers, seconds=round(cold_sec, 3), songs=len(songs))
+
+    # 热构建: 传入上一次结果，大小与修改时间未变的文件直接复用
+    start = time.perf_counter()
+    warm = indexer.build([root], previous_songs=songs)
+    warm_sec = time.perf_counter() - start
+    reporter.emit("indexer_build", size, "warm", probe=probe, workers=workers, seconds=round(warm_sec, 3), songs=len(warm))
+
+
+def bench_store(reporter: Reporter, work_dir: str, size: int, songs: list, rounds: int):
+    store = MusicIndexStore(os.path.join(work_dir, f"index_{size}.json"))
+    save_samples, load_samples = [], []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        store.save(songs)
+        save_samples.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        loaded = store.load()
+        load_samples.append(time.perf_counter() - start)
+    assert len(loaded) == len(songs)
+    file_bytes = os.path.getsize(store.index_file)
+    reporter.emit("store", size, "save", file_bytes=file_bytes, **summarize(save_samples))
+    reporter.emit("store", size, "load", file_bytes=file_bytes, **summarize(load_samples))
+
+
+def bench_search(reporter: Reporter, size: int, songs: list, rounds: int, limit: int):
+    engine = MusicSearchEngine()
+    for case, keyword in SEARCH_KEYWORDS.items():
+        samples = []
+        total = 0
+        for _ in range(rounds):
+            start = time.perf_counter()
+            total, _ = engine.search_with_count(songs, keyword.lower(), limit)
+            samples.append(time.perf_counter() - start)
+        reporter.emit(
+            "search",
+            size,
+            case,
+            keyword=keyword,
+            matches=total,
+            selectivity=round(total / max(size, 1), 6),
+            **summarize(samples),
+        )
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        engine.random_pick(songs, limit)
+        samples.append(time.perf_counter() - start)
+    reporter.emit("random_pick", size, limit=limit, **summarize(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="曲库规模基准")
+    parser.add_argument("--sizes", default="10000,100000", help="逗号分隔的曲目数")
+    parser.add_argument("--max-disk", type=int, default=100000, help="超过该规模时跳过磁盘上的索引构建基准")
+    parser.add_argument("--work-dir", default="", help="合成曲库目录，默认使用临时目录；指定后可在多次运行间复用")
+    parser.add_argument("--probe", choices=["none", "ffprobe"], default="none")
+    parser.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 4))
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20, help="搜索与随机选歌的返回上限")
+    parser.add_argument("--out", default="", help="结果追加写入的 JSON Lines 文件")
+    args = parser.parse_args()
+
+    if args.probe == "none":
+        MusicMetadataExtractor.extract = lambda self, file_path: SongMetadata()
+    random.seed(0)
+    reporter = Reporter(args.out)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="music-bench-")
+    sizes = [int(item) for item in args.sizes.split(",") if item.strip()]
+
+    for size in sizes:
+        root = os.path.join(work_dir, f"library_{size}")
+        if size <= args.max_disk:
+            bench_indexer(reporter, root, size, args.probe, args.workers)
+        songs = build_indexed_songs(root, size)
+        bench_store(reporter, work_dir, size, songs, rounds=max(1, min(args.rounds, 5)))
+        bench_search(reporter, size, songs, rounds=args.rounds, limit=args.limit)
+
+
+if __name__ == "__main__":
+    main()
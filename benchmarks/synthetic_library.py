@@ -0,0 +1,212 @@
+"""合成曲库生成器：按固定种子生成带中英文标签的小体积 MP3/FLAC/M4A/WAV 文件及多层目录。
+
+```bash
+python benchmarks/synthetic_library.py /tmp/library --tracks 10000
+```
+
+文件只包含标签与极短的静音数据（每个几百字节到 1KB 左右），ffprobe 能正常读出歌名/歌手/专辑。
+同一种子下每首歌的标签与路径固定，也可以不落盘，直接生成 IndexedSong 用于存储与搜索基准。
+"""
+
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+import time
+import wave
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from music_search_core.models import IndexedSong  # noqa: E402
+
+
+FORMATS = (".mp3", ".flac", ".m4a", ".wav")
+
+CN_ARTISTS = ["许嵩", "周杰伦", "陈奕迅", "林俊杰", "王菲", "邓紫棋", "五月天", "孙燕姿", "李荣浩", "毛不易"]
+EN_ARTISTS = ["Adele", "Coldplay", "Taylor Swift", "Ed Sheeran", "Linkin Park", "Norah Jones", "Daft Punk"]
+CN_WORDS = ["晴天", "夜曲", "红豆", "十年", "后来", "平凡之路", "稻香", "光年之外", "雅俗共赏", "如约而至", "海阔天空", "消愁"]
+EN_WORDS = ["Hello", "Yellow", "Shape", "Numb", "Memory", "Sunrise", "Echo", "River", "Paper", "Midnight", "Blue"]
+ALBUM_SUFFIXES = ["", " (Live)", " 精选", " Deluxe", " 2024 Remaster"]
+
+
+@dataclass(frozen=True)
+class SyntheticTrack:
+    relpath: str
+    title: str
+    artist: str
+    album: str
+
+
+def iter_tracks(count: int, seed: int = 42, depth: int = 4) -> Iterator[SyntheticTrack]:
+    """按种子生成曲目；艺人按 Zipf 分布，少数热门艺人占多数歌曲，便于构造不同命中率的查询。"""
+    rng = random.Random(seed)
+    artists = CN_ARTISTS + EN_ARTISTS
+    # 长尾艺人名包含编号，作为低命中率的查询目标
+    long_tail = [f"歌手{index:04d}" for index in range(2000)] + [f"Artist {index:04d}" for index in range(2000)]
+    weights = [1 / (rank + 1) for rank in range(len(artists))]
+    for index in range(count):
+        if rng.random() < 0.6:
+            artist = rng.choices(artists, weights=weights)[0]
+        else:
+            artist = rng.choice(long_tail)
+        chinese = any("一" <= char <= "鿿" for char in artist) or rng.random() < 0.3
+        words = CN_WORDS if chinese else EN_WORDS
+        title = f"{rng.choice(words)}{rng.choice(words) if rng.random() < 0.5 else ''} {index}"
+        album = f"{rng.choice(words)}{rng.choice(ALBUM_SUFFIXES)}"
+        # 多层目录: 首字母/艺人/专辑/碟片，depth 控制层数
+        levels = [artist[:1].upper(), artist, album, f"CD{index % 3 + 1}", f"part{index % 7}"][: max(depth, 1)]
+        ext = FORMATS[index % len(FORMATS)]
+        relpath = os.path.join(*levels, f"{index:07d} {artist} - {title}{ext}")
+        yield SyntheticTrack(relpath=relpath, title=title, artist=artist, album=album)
+
+
+def build_indexed_songs(root: str, count: int, seed: int = 42) -> list[IndexedSong]:
+    """不写文件，直接生成与 generate_library 相同路径和标签的索引条目。"""
+    songs = []
+    for index, track in enumerate(iter_tracks(count, seed=seed)):
+        path = os.path.join(root, track.relpath)
+        songs.append(
+            IndexedSong(
+                path=path,
+                name_lower=os.path.basename(path).lower(),
+                title_lower=track.title.lower(),
+                artist_lower=track.artist.lower(),
+                album_lower=track.album.lower(),
+                size=512 + index % 997,
+                mtime_ns=1_700_000_000_000_000_000 + index,
+                duration_ms=1000,
+            )
+        )
+    return songs
+
+
+def generate_library(root: str, count: int, seed: int = 42) -> int:
+    """在 root 下写入 count 个文件，已存在且大小非零的文件跳过，返回新写入的文件数。"""
+    written = 0
+    for track in iter_tracks(count, seed=seed):
+        path = os.path.join(root, track.relpath)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        ext = os.path.splitext(path)[1]
+        with open(path, "wb") as file_obj:
+            file_obj.write(WRITERS[ext](track))
+        written += 1
+    return written
+
+
+def _mp3_bytes(track: SyntheticTrack) -> bytes:
+    def frame(frame_id: bytes, text: str) -> bytes:
+        # ID3v2.4 文本帧，编码字节 3 表示 UTF-8
+        body = b"\x03" + text.encode("utf-8")
+        return frame_id + _synchsafe(len(body)) + b"\x00\x00" + body
+
+    frames = frame(b"TIT2", track.title) + frame(b"TPE1", track.artist) + frame(b"TALB", track.album)
+    tag = b"ID3\x04\x00\x00" + _synchsafe(len(frames)) + frames
+    # MPEG-1 Layer III 128kbps 44.1kHz 单声道静音帧，每帧 417 字节
+    mpeg_frame = b"\xff\xfb\x90\xc4" + b"\x00" * 413
+    return tag + mpeg_frame * 2
+
+
+def _synchsafe(value: int) -> bytes:
+    return bytes(((value >> shift) & 0x7F) for shift in (21, 14, 7, 0))
+
+
+def _flac_bytes(track: SyntheticTrack) -> bytes:
+    sample_rate = 44100
+    total_samples = 4410
+    # STREAMINFO: 块大小、帧大小、采样率(20bit)/声道-1(3bit)/位深-1(5bit)/总采样数(36bit)、MD5
+    packed = (sample_rate << 44) | (0 << 41) | (15 << 36) | total_samples
+    streaminfo = struct.pack(">HH", 4096, 4096) + b"\x00\x00\x00" * 2 + packed.to_bytes(8, "big") + b"\x00" * 16
+    vendor = b"synthetic"
+    comments = [f"TITLE={track.title}", f"ARTIST={track.artist}", f"ALBUM={track.album}"]
+    vorbis = struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", len(comments))
+    for comment in comments:
+        data = comment.encode("utf-8")
+        vorbis += struct.pack("<I", len(data)) + data
+    blocks = b"\x00" + len(streaminfo).to_bytes(3, "big") + streaminfo
+    blocks += b"\x84" + len(vorbis).to_bytes(3, "big") + vorbis
+    return b"fLaC" + blocks
+
+
+def _atom(kind: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I", len(payload) + 8) + kind + payload
+
+
+def _m4a_bytes(track: SyntheticTrack) -> bytes:
+    def item(kind: bytes, text: str) -> bytes:
+        data = _atom(b"data", struct.pack(">II", 1, 0) + text.encode("utf-8"))
+        return _atom(kind, data)
+
+    ftyp = _atom(b"ftyp", b"M4A \x00\x00\x02\x00M4A mp42isom")
+    # mvhd version 0: 时间尺度 1000，时长 100ms，其余为单位矩阵等默认值
+    mvhd = _atom(
+        b"mvhd",
+        b"\x00\x00\x00\x00"
+        + struct.pack(">IIII", 0, 0, 1000, 100)
+        + struct.pack(">IH", 0x00010000, 0x0100)
+        + b"\x00" * 10
+        + struct.pack(">9I", 0x00010000, 0, 0, 0, 0x00010000, 0, 0, 0, 0x40000000)
+        + b"\x00" * 24
+        + struct.pack(">I", 2),
+    )
+    hdlr = _atom(b"hdlr", b"\x00" * 8 + b"mdir" + b"appl" + b"\x00" * 9)
+    ilst = _atom(
+        b"ilst",
+        item(b"\xa9nam", track.title) + item(b"\xa9ART", track.artist) + item(b"\xa9alb", track.album),
+    )
+    meta = _atom(b"meta", b"\x00\x00\x00\x00" + hdlr + ilst)
+    moov = _atom(b"moov", mvhd + _atom(b"udta", meta))
+    return ftyp + moov
+
+
+def _wav_bytes(track: SyntheticTrack) -> bytes:
+    import io
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(8000)
+        wav_file.writeframes(b"\x00\x00" * 80)
+    riff = bytearray(buffer.getvalue())
+
+    def info(kind: bytes, text: str) -> bytes:
+        data = text.encode("utf-8") + b"\x00"
+        if len(data) % 2:
+            data += b"\x00"
+        return kind + struct.pack("<I", len(data)) + data
+
+    payload = b"INFO" + info(b"INAM", track.title) + info(b"IART", track.artist) + info(b"IPRD", track.album)
+    riff += b"LIST" + struct.pack("<I", len(payload)) + payload
+    riff[4:8] = struct.pack("<I", len(riff) - 8)
+    return bytes(riff)
+
+
+WRITERS = {".mp3": _mp3_bytes, ".flac": _flac_bytes, ".m4a": _m4a_bytes, ".wav": _wav_bytes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成曲库")
+    parser.add_argument("root")
+    parser.add_argument("--tracks", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    written = generate_library(args.root, args.tracks, seed=args.seed)
+    result = {
+        "root": os.path.abspath(args.root),
+        "tracks": args.tracks,
+        "written": written,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
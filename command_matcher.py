@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+
+from music_search import normalize_keyword
+
+
+INTENT_STOP = "stop"
+INTENT_REFRESH = "refresh"
+INTENT_RANDOM = "random"
+INTENT_PLAY = "play"
+
+# 精确匹配命令按此顺序判定优先级
+EXACT_INTENTS = (
+    (INTENT_STOP, "stop_keywords"),
+    (INTENT_REFRESH, "refresh_keywords"),
+    (INTENT_RANDOM, "random_play_keywords"),
+)
+
+
+@dataclass(frozen=True)
+class CommandMatch:
+    intent: str | None = None
+    argument: str = ""
+    whitelisted: bool = False
+
+
+def compact_text(text: str) -> str:
+    return normalize_keyword(text).replace(" ", "")
+
+
+def _compile_alternation(keywords: list[str], anchored: bool) -> re.Pattern | None:
+    # 关键词字符之间允许任意空格，免去逐字符去空格后再映射回原文位置
+    alternatives = [" *".join(re.escape(char) for char in keyword) for keyword in keywords]
+    if not alternatives:
+        return None
+    prefix = "^" if anchored else ""
+    return re.compile(prefix + "(?:" + "|".join(alternatives) + ")")
+
+
+class CommandMatcher:
+    def __init__(self, command_config: dict | None = None):
+        command_config = command_config or {}
+        self._exact: dict[str, str] = {}
+        for intent, key in EXACT_INTENTS:
+            for keyword in command_config.get(key, []) or []:
+                compact = compact_text(str(keyword))
+                if compact:
+                    self._exact.setdefault(compact, intent)
+
+        # 正则分支按书写顺序尝试，保持“配置中靠前的播放前缀优先”
+        play_prefixes = [compact_text(str(item)) for item in command_config.get("play_keywords", []) or []]
+        whitelist = {compact_text(str(item)) for item in command_config.get("interrupt_whitelist_keywords", []) or []}
+        self._play_pattern = _compile_alternation([item for item in play_prefixes if item], anchored=True)
+        self._whitelist_pattern = _compile_alternation(sorted(item for item in whitelist if item), anchored=False)
+
+    def match(self, text: str) -> CommandMatch:
+        stripped = normalize_keyword(text or "")
+        if not stripped:
+            return CommandMatch()
+
+        whitelisted = self._whitelist_pattern is not None and self._whitelist_pattern.search(stripped) is not None
+        intent = self._exact.get(stripped.replace(" ", ""))
+        if intent:
+            return CommandMatch(intent=intent, whitelisted=whitelisted)
+
+        if self._play_pattern is not None:
+            found = self._play_pattern.match(stripped)
+            if found:
+                argument = normalize_keyword(stripped[found.end() :])
+                if argument:
+                    return CommandMatch(intent=INTENT_PLAY, argument=argument, whitelisted=whitelisted)
+        return CommandMatch(whitelisted=whitelisted)
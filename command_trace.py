@@ -0,0 +1,163 @@
+"""语音命令的端到端耗时追踪。
+
+ASR 最终文本到达时创建追踪，经 contextvars 随 asyncio 任务及执行器线程传递；
+搜索、时长探测、音箱 RPC 等环节各记一段，音箱首次请求本次签发的播放链接时结束。
+每条命令输出一行分段耗时，超过阈值的命令另写入滚动的慢命令日志。
+"""
+
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+# 音箱迟迟不请求链接（如播放失败）时，超过该时长的追踪按超时结束
+PENDING_TIMEOUT_SEC = 60.0
+
+_current: contextvars.ContextVar["CommandTrace | None"] = contextvars.ContextVar("command_trace", default=None)
+_ids = itertools.count(1)
+
+
+class CommandTrace:
+    def __init__(self, text: str, device: str):
+        self.trace_id = next(_ids)
+        self.text = text
+        self.device = device
+        self.started_at = time.monotonic()
+        self.spans: list[tuple[str, float, float]] = []
+        self.tokens: list[str] = []
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, end: float):
+        with self._lock:
+            self.spans.append((name, start - self.started_at, end - self.started_at))
+
+    def to_dict(self, outcome: str, total_sec: float) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda item: item[1])
+        return {
+            "trace_id": self.trace_id,
+            "device": self.device,
+            "text": self.text,
+            "outcome": outcome,
+            "total_ms": round(total_sec * 1000, 1),
+            "spans": [
+                {"name": name, "start_ms": round(start * 1000, 1), "ms": round((end - start) * 1000, 1)}
+                for name, start, end in spans
+            ],
+        }
+
+
+class CommandTracer:
+    def __init__(self, slow_ms: float = 3000, keep: int = 50, slow_log_file: str = ""):
+        self._pending: dict[str, CommandTrace] = {}
+        self._lock = threading.Lock()
+        self.configure(slow_ms, keep, slow_log_file)
+
+    def configure(self, slow_ms: float, keep: int, slow_log_file: str):
+        self.slow_sec = max(float(slow_ms), 0) / 1000
+        self.recent_slow: deque[dict] = deque(maxlen=max(int(keep), 1))
+        self._slow_logger = self._build_slow_logger(slow_log_file)
+
+    def _build_slow_logger(self, slow_log_file: str) -> logging.Logger | None:
+        if not slow_log_file:
+            return None
+        slow_logger = logging.getLogger(f"{__name__}.slow")
+        slow_logger.propagate = False
+        if not slow_logger.handlers:
+            os.makedirs(os.path.dirname(os.path.abspath(slow_log_file)), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                slow_log_file,
+                maxBytes=1024 * 1024,
+                backupCount=3,
+                encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            slow_logger.addHandler(handler)
+        return slow_logger
+
+    def start(self, text: str, device: str) -> CommandTrace:
+        """创建追踪并设为当前上下文，之后创建的任务和提交到执行器的调用都会继承。"""
+        trace = CommandTrace(text, device)
+        _current.set(trace)
+        return trace
+
+    def expect_request(self, token: str):
+        """当前命令签发了播放链接，首次请求该链接时结束追踪。"""
+        trace = _current.get()
+        if trace is None or trace.finished:
+            return
+        with self._lock:
+            trace.tokens.append(token)
+            self._pending[token] = trace
+
+    def on_request(self, token: str):
+        with self._lock:
+            trace = self._pending.get(token)
+        if trace is not None:
+            self.finish(trace, "首次请求")
+
+    def settle(self, trace: CommandTrace):
+        """命令处理完毕；未签发链接（停止、刷新、音频流播放等）时在此结束，否则等待音箱请求。"""
+        if not trace.tokens:
+            self.finish(trace, "完成")
+        self._expire_pending()
+
+    def finish(self, trace: CommandTrace, outcome: str):
+        now = time.monotonic()
+        with self._lock:
+            if trace.finished:
+                return
+            trace.finished = True
+            for token in trace.tokens:
+                self._pending.pop(token, None)
+        if trace.tokens and outcome == "首次请求":
+            last_end = max((end for _, _, end in trace.spans), default=0.0)
+            trace.add_span("wait_first_request", trace.started_at + last_end, now)
+        total_sec = now - trace.started_at
+        record = trace.to_dict(outcome, total_sec)
+        logger.info("命令耗时: %s", json.dumps(record, ensure_ascii=False))
+        if self.slow_sec > 0 and total_sec >= self.slow_sec:
+            self.recent_slow.append(record)
+            logger.warning("慢命令: 设备=%s 文本=%s 总耗时=%.1f毫秒", trace.device, trace.text, total_sec * 1000)
+            if self._slow_logger is not None:
+                self._slow_logger.info(json.dumps(record, ensure_ascii=False))
+
+    def _expire_pending(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = {
+                trace for trace in self._pending.values() if now - trace.started_at >= PENDING_TIMEOUT_SEC
+            }
+        for trace in expired:
+            self.finish(trace, "未收到请求")
+
+
+def current_trace() -> CommandTrace | None:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str):
+    """在当前追踪中记录一段耗时；不在追踪上下文中时不做任何事。"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.monotonic())
+
+
+TRACER = CommandTracer()
@@ -18,8 +18,20 @@ MUSIC_CONFIG = {
         "max_results": 20,
         # 曲库索引定时刷新间隔（秒）；设置为 0 表示禁用定时刷新
         "refresh_interval_sec": 0,
-        # 索引文件保存路径（包含歌曲路径、歌名、歌手、专辑）
+        # 按目录覆盖刷新间隔（秒），例如网络挂载目录刷新得慢一些: {"/mnt/nas/music": 3600}
+        "root_refresh_interval_sec": {},
+        # 索引文件保存路径（包含歌曲路径、歌名、歌手、专辑），每个音乐目录保存为一个分片 music_index.<目录哈希>.json
         "index_file": "cache/music_index.json",
+        # 快速启动: 先用已保存的索引响应语音命令，启动刷新在后台完成后再替换
+        "fast_start": True,
+        # 首次扫描大曲库时，每解析 N 个文件或每隔 T 秒发布一次部分索引（未解析的歌曲先按文件名可搜）
+        "partial_publish_files": 500,
+        "partial_publish_sec": 5,
+        # 多个目录中的同一首歌（大小、时长相同且抽样内容一致）只在搜索和随机播放中出现一次
+        "dedup": True,
+        # 同一台机器运行多个实例（每台音箱一个）时共享一份索引:
+        # 一个实例设为 writer 负责刷新并发布到 file，其余设为 reader 只读映射该文件，不再各自扫描和占用内存
+        "shared_index": {"mode": "off", "file": "cache/music_index.shared"},
     },
     "commands": {
         # 触发播放命令的前缀
@@ -57,11 +69,88 @@ MUSIC_CONFIG = {
         ],
         # 自动恢复延迟秒数
         "auto_resume_delay_sec": 1.8,
+        # 检查 config.py 变更并热加载命令配置的间隔（秒）；设置为 0 表示禁用
+        "config_watch_interval_sec": 5,
     },
     "http": {
         "port": 18080,
         # 小爱可访问到的服务地址
         "base_url": "http://192.168.11.18:18080",
+        # 播放链接令牌有效期（秒），超时未访问的令牌会被回收
+        "token_ttl_sec": 43200,
+        # 最多同时保留的播放链接令牌数，超出后按最久未使用淘汰
+        "max_tokens": 1024,
+        # 已打开文件句柄及 stat 结果的缓存数量
+        "file_cache_size": 32,
+        # 缓存句柄复核文件修改时间的间隔（秒）
+        "file_cache_revalidate_sec": 5,
+    },
+    "tracing": {
+        # 语音命令从 ASR 最终文本到音箱首次请求播放链接的总耗时超过该值（毫秒）时记为慢命令
+        "slow_ms": 3000,
+        # 内存中保留最近的慢命令条数，命令行输入 slow 查看
+        "keep": 50,
+        # 慢命令的分段耗时按行写入该文件（按 1MB 滚动，保留 3 份），留空则不写文件
+        "slow_log_file": "logs/slow_commands.jsonl",
+    },
+    "sync": {
+        # 上游节点的 HTTP 服务地址（如 "http://192.168.1.10:18080"），留空表示不同步；
+        # 配置后启动时及每隔 interval_sec 秒从上游 /index/changes 拉取压缩的索引增量，本机不再重复解析元信息
+        "upstream": "",
+        "interval_sec": 60,
+        # 上游与本机音乐目录挂载路径不同时做前缀映射: {"/mnt/nas/music": "/volume1/music"}
+        "path_map": {},
+        # 本机作为上游时开启，在 HTTP 服务上提供 /index/snapshot 与 /index/changes；
+        # 这两个接口无鉴权且包含曲库的完整路径，只在可信网络中开启
+        "serve": False,
+    },
+    "prefetch": {
+        # 播放当前歌曲时预读队列中后续歌曲的开头，唤醒休眠磁盘/网络存储
+        "enabled": True,
+        # 预读后续几首
+        "tracks": 2,
+        # 每首预读的字节数
+        "bytes_per_track": 4194304,
+    },
+    "transcode": {
+        # 是否对大体积无损格式实时转码（需要安装 ffmpeg）
+        "enabled": False,
+        # 需要转码的音频后缀
+        "extensions": [".flac", ".wav"],
+        # 目标格式：mp3 / aac
+        "codec": "mp3",
+        "bitrate": "192k",
+        # 转码结果缓存目录及容量上限（字节），超出后按最久未使用淘汰
+        "cache_dir": "cache/transcode",
+        "cache_max_bytes": 2147483648,
+        # 后台提前转码下一首时最多同时运行的 ffmpeg 进程数，0 表示不提前转码
+        "max_background_jobs": 1,
+        # 转码失败后多少秒内不再重试，期间直接推送原文件
+        "failure_ttl_sec": 300,
+    },
+    "stream_playback": {
+        # 是否改为通过 WebSocket 推送解码后的 PCM 播放（需要安装 ffmpeg），音箱无需访问 base_url
+        "enabled": False,
+        # PCM 参数需与音箱端 client 的播放参数一致
+        "sample_rate": 16000,
+        "channels": 1,
+        # 每块时长及最多超前发送的时长（毫秒）
+        "chunk_ms": 100,
+        "window_ms": 600,
+        # 后台解码最多领先的时长（毫秒），同时用于提前解码下一首
+        "decode_ahead_ms": 3000,
+    },
+    "shell_session": {
+        # 复用音箱端常驻 shell 执行播放控制命令，client 不支持时自动改用一次性 run_shell
+        "enabled": True,
+    },
+    "executors": {
+        # 各线程池的线程数与优先级（Linux 线程 nice 值，越大越让步）；
+        # search 为语音搜索与构建队列，probe/refresh 为曲库刷新，console 为命令行输入
+        "search": {"workers": 2, "nice": 0},
+        "probe": {"workers": 8, "nice": 10},
+        "refresh": {"workers": 4, "nice": 10},
+        "console": {"workers": 1, "nice": 0},
     },
     "logging": {
         "level": "INFO",
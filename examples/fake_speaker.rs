@@ -0,0 +1,187 @@
+//! 在本机模拟音箱端 client，用于联调 run_shell 与常驻 shell 会话
+//!
+//! ```bash
+//! cargo run --example fake_speaker -- ws://127.0.0.1:4399
+//! # 模拟不支持 shell_session 的旧版 client
+//! cargo run --example fake_speaker -- ws://127.0.0.1:4399 --no-session
+//! ```
+//!
+//! 脚本在本机 `/bin/sh` 中执行，音箱上的 tts_play.sh、ubus 等命令不存在时会返回非零退出码，
+//! 但 RPC 往返、会话复用与回退逻辑与真机一致。
+
+use futures::{SinkExt, StreamExt};
+use serde_json::{json, Value};
+use std::collections::HashMap;
+use std::process::Stdio;
+use std::sync::Arc;
+use std::time::Instant;
+use tokio::io::{AsyncBufReadExt, AsyncWriteExt, BufReader, Lines};
+use tokio::process::{Child, ChildStderr, ChildStdin, ChildStdout, Command};
+use tokio::sync::{mpsc, Mutex};
+use tokio_tungstenite::connect_async;
+use tokio_tungstenite::tungstenite::Message;
+use uuid::Uuid;
+
+/// 常驻 `/bin/sh`，每条脚本在子 shell 中执行（与 run_shell 一样互不影响），
+/// 其后写入带随机串的结束标记，按标记切分输出
+struct ShellProcess {
+    _child: Child,
+    stdin: ChildStdin,
+    stdout: Lines<BufReader<ChildStdout>>,
+    stderr: Lines<BufReader<ChildStderr>>,
+}
+
+impl ShellProcess {
+    fn spawn() -> std::io::Result<Self> {
+        let mut child = Command::new("/bin/sh")
+            .stdin(Stdio::piped())
+            .stdout(Stdio::piped())
+            .stderr(Stdio::piped())
+            .kill_on_drop(true)
+            .spawn()?;
+        Ok(Self {
+            stdin: child.stdin.take().unwrap(),
+            stdout: BufReader::new(child.stdout.take().unwrap()).lines(),
+            stderr: BufReader::new(child.stderr.take().unwrap()).lines(),
+            _child: child,
+        })
+    }
+
+    async fn exec(&mut self, script: &str) -> Result<Value, String> {
+        let marker = format!("__OXS_{}", Uuid::new_v4().simple());
+        let line = format!(
+            "(\n{script}\n)\n__oxs_code=$?; printf '\\n%s %s\\n' '{marker}' \"$__oxs_code\"; printf '\\n%s\\n' '{marker}' >&2\n"
+        );
+        self.stdin
+            .write_all(line.as_bytes())
+            .await
+            // 写入失败说明脚本未开始执行，服务端据此判断可以改用 run_shell 重跑
+            .map_err(|e| format!("shell session write failed: {}", e))?;
+        let (stdout, stderr) = tokio::join!(
+            read_until_marker(&mut self.stdout, &marker),
+            read_until_marker(&mut self.stderr, &marker)
+        );
+        let ((stdout, code), (stderr, _)) = (stdout?, stderr?);
+        let exit_code = code.parse::<i64>().map(Value::from).unwrap_or(Value::Null);
+        Ok(json!({ "stdout": stdout, "stderr": stderr, "exit_code": exit_code }))
+    }
+}
+
+/// 读到标记行为止，返回标记前的输出（去掉 printf 补的换行）及标记后的内容
+async fn read_until_marker<R>(lines: &mut Lines<R>, marker: &str) -> Result<(String, String), String>
+where
+    R: tokio::io::AsyncBufRead + Unpin,
+{
+    let mut output = String::new();
+    loop {
+        let Some(line) = lines.next_line().await.map_err(|e| e.to_string())? else {
+            return Err("shell session exited".to_string());
+        };
+        if let Some(rest) = line.strip_prefix(marker) {
+            output.pop();
+            return Ok((output, rest.trim().to_string()));
+        }
+        output.push_str(&line);
+        output.push('\n');
+    }
+}
+
+async fn run_once(script: &str) -> Result<Value, String> {
+    let output = Command::new("/bin/sh")
+        .arg("-c")
+        .arg(script)
+        .output()
+        .await
+        .map_err(|e| e.to_string())?;
+    Ok(json!({
+        "stdout": String::from_utf8_lossy(&output.stdout),
+        "stderr": String::from_utf8_lossy(&output.stderr),
+        "exit_code": output.status.code(),
+    }))
+}
+
+type Sessions = Arc<Mutex<HashMap<String, Arc<Mutex<ShellProcess>>>>>;
+
+async fn shell_session(sessions: &Sessions, payload: &Value) -> Result<Value, String> {
+    let action = payload.get("action").and_then(Value::as_str).unwrap_or("");
+    let session = payload.get("session").and_then(Value::as_str).unwrap_or("");
+    match action {
+        "open" => {
+            let id = Uuid::new_v4().simple().to_string();
+            let shell = ShellProcess::spawn().map_err(|e| e.to_string())?;
+            sessions.lock().await.insert(id.clone(), Arc::new(Mutex::new(shell)));
+            Ok(json!({ "session": id }))
+        }
+        "exec" => {
+            let Some(shell) = sessions.lock().await.get(session).cloned() else {
+                return Err(format!("session not found: {}", session));
+            };
+            let script = payload.get("script").and_then(Value::as_str).unwrap_or("");
+            let result = shell.lock().await.exec(script).await;
+            if result.is_err() {
+                sessions.lock().await.remove(session);
+            }
+            result
+        }
+        "close" => {
+            sessions.lock().await.remove(session);
+            Ok(Value::Null)
+        }
+        _ => Err(format!("unknown action: {}", action)),
+    }
+}
+
+async fn handle_request(request: Value, sessions: Sessions, session_enabled: bool) -> Value {
+    let id = request.get("id").cloned().unwrap_or(Value::Null);
+    let command = request.get("command").and_then(Value::as_str).unwrap_or("");
+    let payload = request.get("payload").cloned().unwrap_or(Value::Null);
+    let started = Instant::now();
+    let result = match command {
+        "run_shell" => run_once(payload.as_str().unwrap_or("")).await,
+        "shell_session" if session_enabled => shell_session(&sessions, &payload).await,
+        _ => Err("command not found".to_string()),
+    };
+    println!("{} {:.1}ms ok={}", command, started.elapsed().as_secs_f64() * 1000.0, result.is_ok());
+    match result {
+        Ok(data) => json!({ "Response": { "id": id, "data": data } }),
+        Err(e) => json!({ "Response": { "id": id, "code": -1, "msg": e } }),
+    }
+}
+
+#[tokio::main]
+async fn main() -> Result<(), Box<dyn std::error::Error>> {
+    let args: Vec<String> = std::env::args().skip(1).collect();
+    let url = args
+        .iter()
+        .find(|arg| !arg.starts_with("--"))
+        .cloned()
+        .unwrap_or_else(|| "ws://127.0.0.1:4399".to_string());
+    let session_enabled = !args.iter().any(|arg| arg == "--no-session");
+
+    let (ws, _) = connect_async(url.as_str()).await?;
+    println!("已连接: {} shell_session={}", url, session_enabled);
+    let (mut writer, mut reader) = ws.split();
+
+    let (tx, mut rx) = mpsc::unbounded_channel::<String>();
+    tokio::spawn(async move {
+        while let Some(text) = rx.recv().await {
+            if writer.send(Message::Text(text.into())).await.is_err() {
+                break;
+            }
+        }
+    });
+
+    let sessions: Sessions = Arc::new(Mutex::new(HashMap::new()));
+    while let Some(msg) = reader.next().await {
+        let Message::Text(text) = msg? else { continue };
+        let Ok(value) = serde_json::from_str::<Value>(&text) else { continue };
+        let Some(request) = value.get("Request").cloned() else { continue };
+        let tx = tx.clone();
+        let sessions = Arc::clone(&sessions);
+        tokio::spawn(async move {
+            let response = handle_request(request, sessions, session_enabled).await;
+            let _ = tx.send(response.to_string());
+        });
+    }
+    Ok(())
+}
@@ -0,0 +1,59 @@
+import gzip
+import json
+import logging
+import time
+import urllib.request
+from urllib.parse import urlencode
+
+from music_search import MusicSearcher
+
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSyncClient:
+    """从上游节点的 /index/changes 拉取索引变化并导入本地 MusicSearcher。
+
+    首次或上游重启后拉取全量快照，之后只拉取上次同步代数之后的增量。
+    """
+
+    def __init__(
+        self,
+        upstream: str,
+        searcher: MusicSearcher,
+        path_map: dict[str, str] | None = None,
+        timeout_sec: float = 30.0,
+    ):
+        self.upstream = upstream.rstrip("/")
+        self.searcher = searcher
+        self.path_map = dict(path_map or {})
+        self.timeout_sec = timeout_sec
+        self.epoch = ""
+        self.generation = 0
+
+    def pull(self) -> int:
+        start_time = time.monotonic()
+        query = urlencode({"since": self.generation, "epoch": self.epoch})
+        request = urllib.request.Request(
+            f"{self.upstream}/index/changes?{query}",
+            headers={"Accept-Encoding": "gzip"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout_sec) as response:
+            body = response.read()
+            received = len(body)
+            if response.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+        payload = json.loads(body)
+        changed = self.searcher.import_changes(payload, self.path_map)
+        self.epoch = str(payload.get("epoch", ""))
+        self.generation = int(payload.get("generation", 0))
+        logger.info(
+            "索引同步完成: 上游=%s 全量=%s 代数=%d 变化=%d 接收字节=%d 耗时=%.1f毫秒",
+            self.upstream,
+            bool(payload.get("full")),
+            self.generation,
+            changed,
+            received,
+            (time.monotonic() - start_time) * 1000,
+        )
+        return changed
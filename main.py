@@ -1,9 +1,10 @@
 import asyncio
+import importlib
 import json
 import logging
 import os
-import shutil
 import shlex
+import shutil
 import subprocess
 import sys
 import time
@@ -13,17 +14,37 @@ from typing import Any
 
 import open_xiaoai_server
 
+import config
+import metrics
+from command_matcher import INTENT_PLAY
+from command_matcher import INTENT_RANDOM
+from command_matcher import INTENT_REFRESH
+from command_matcher import INTENT_STOP
+from command_matcher import CommandMatch
+from command_matcher import CommandMatcher
+from command_matcher import compact_text
+from command_trace import TRACER
+from command_trace import CommandTrace
+from command_trace import span
 from config import MUSIC_CONFIG
+from index_sync import IndexSyncClient
 from music_search import MusicSearcher
-from music_search import extract_play_keyword
-from music_search import is_stop_play_command
-from music_search import normalize_keyword
+from music_search import SharedMusicSearcher
+from music_search_core import IndexBuildCancelled
+from music_search_core import IndexProgress
 from music_service import LocalMusicHttpServer
 from music_service import build_music_server
+from music_transcode import build_transcode_cache
 from player_control import ask_xiaoai
 from player_control import play_music_url
 from player_control import speak_text
+from player_control import stop_and_speak
 from player_control import stop_playback
+from player_control import stop_speak_and_play
+from stream_player import build_stream_player
+from task_executors import NamedExecutor
+from task_executors import build_executors
+from track_prefetch import TrackPrefetcher
 
 
 LOG_LEVEL = str((MUSIC_CONFIG.get("logging") or {}).get("level", "INFO")).upper()
@@ -34,6 +55,61 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+REPLY_NAMESPACE_HINTS = ("tts", "speechsynthesizer", "nlp", "dialog", "assistant")
+REPLY_NAME_HINTS = ("reply", "respond", "speak")
+REPLY_PAYLOAD_TEXT_KEYS = ("text", "tts", "reply_text", "nlp_reply", "reply", "answer")
+REPLY_DIRECT_TEXT_KEYS = frozenset(
+    {
+        "text",
+        "reply",
+        "answer",
+        "content",
+        "tts",
+        "say",
+        "speech",
+        "nlp_reply",
+        "reply_text",
+        "display_text",
+    }
+)
+REPLY_NESTED_KEYS = frozenset({"payload", "data", "results", "result", "instruction", "directives", "cards"})
+
+
+def process_started_at() -> float:
+    """返回进程启动时刻（time.monotonic 时间轴），导入阶段的耗时也计入启动统计。
+
+    Linux 下根据 /proc/self/stat 的启动时刻换算，其他平台退回当前时刻。
+    """
+    try:
+        with open("/proc/self/stat", "r", encoding="utf-8") as file_obj:
+            fields = file_obj.read().rsplit(")", 1)[1].split()
+        # 第 22 个字段为进程启动时刻（开机后的时钟滴答数），")" 之后从第 3 个字段开始
+        started_ticks = int(fields[19])
+        elapsed = time.clock_gettime(time.CLOCK_BOOTTIME) - started_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.monotonic()
+    return time.monotonic() - max(elapsed, 0.0)
+
+
+class StartupTimer:
+    """启动阶段计时: 导入、索引加载、服务就绪、启动刷新。"""
+
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        self.last_at = started_at
+
+    def mark(self, phase: str, detail: str = ""):
+        now = time.monotonic()
+        logger.info(
+            "启动阶段: %s 阶段耗时=%.1f毫秒 累计=%.1f毫秒%s",
+            phase,
+            (now - self.last_at) * 1000,
+            (now - self.started_at) * 1000,
+            f" {detail}" if detail else "",
+        )
+        self.last_at = now
+
+
 @dataclass
 class SongItem:
     index: int
@@ -43,11 +119,15 @@ class SongItem:
     duration_sec: float
 
 
-async def on_event(event: str):
-    try:
-        event_json = json.loads(event)
-    except Exception:
-        return
+async def on_event(event: str | dict):
+    # 注册事件过滤后 Rust 侧直接传入 dict，且 NewLine 已解析
+    if isinstance(event, dict):
+        event_json = event
+    else:
+        try:
+            event_json = json.loads(event)
+        except Exception:
+            return
 
     if event_json.get("event") != "instruction":
         return
@@ -56,14 +136,19 @@ async def on_event(event: str):
     if not raw_line:
         return
 
-    try:
-        line = json.loads(raw_line)
-    except Exception:
-        return
+    if isinstance(raw_line, dict):
+        line = raw_line
+    else:
+        try:
+            line = json.loads(raw_line)
+        except Exception:
+            return
 
+    # Rust 侧为每个事件附带来源音箱的 device_id
+    session = App.session_for(event_json.get("device_id"))
     header = line.get("header", {})
     payload = line.get("payload", {})
-    App.try_capture_reply_text(header=header, payload=payload, line=line)
+    session.try_capture_reply_text(header=header, payload=payload, line=line)
 
     if (
         header.get("namespace") != "SpeechRecognizer"
@@ -78,58 +163,441 @@ async def on_event(event: str):
     if not text:
         return
 
-    logger.info("ASR 最终文本: %s", text)
-    await App.handle_user_speech_interrupt(text)
-
-    if is_stop_play_command(text, App.stop_keywords):
-        App.disarm_reply_interrupt("收到停止命令")
-        asyncio.create_task(App.stop_music())
+    received_at = time.monotonic()
+    logger.info("ASR 最终文本: 设备=%s %s", session.label, text)
+    match = App.command_matcher.match(text)
+    # 只追踪识别出的命令；之后创建的任务与执行器调用都继承该追踪
+    trace = TRACER.start(text, session.label) if match.intent else None
+    with span("interrupt"):
+        await session.handle_user_speech_interrupt(text, match)
+
+    if match.intent == INTENT_STOP:
+        session.disarm_reply_interrupt("收到停止命令")
+        asyncio.create_task(run_traced(trace, session.stop_music()))
         return
 
-    if App._is_refresh_index_command(text):
-        App.arm_reply_interrupt("语音刷新")
-        asyncio.create_task(App.refresh_music_index_and_reply("语音刷新"))
+    if match.intent == INTENT_REFRESH:
+        session.arm_reply_interrupt("语音刷新")
+        asyncio.create_task(run_traced(trace, session.refresh_music_index_and_reply("语音刷新")))
         return
 
-    if App._is_random_play_command(text):
-        App.arm_reply_interrupt("语音随机播放")
-        asyncio.create_task(App.play_random_music())
+    if match.intent == INTENT_RANDOM:
+        session.arm_reply_interrupt("语音随机播放")
+        asyncio.create_task(run_traced(trace, session.play_random_music(received_at)))
         return
 
-    keyword = extract_play_keyword(text, App.play_keywords)
-    if keyword:
-        App.arm_reply_interrupt(f"语音搜索播放:{keyword}")
-        asyncio.create_task(App.play_local_music_by_keyword(keyword))
+    if match.intent == INTENT_PLAY:
+        keyword = match.argument
+        session.arm_reply_interrupt(f"语音搜索播放:{keyword}")
+        asyncio.create_task(run_traced(trace, session.play_local_music_by_keyword(keyword, received_at)))
 
 
-def on_event_callback(event: str):
+async def run_traced(trace: CommandTrace, coro):
+    try:
+        await coro
+    finally:
+        TRACER.settle(trace)
+
+
+def on_event_callback(event: str | dict):
     asyncio.run_coroutine_threadsafe(on_event(event), App.loop)
 
 
+class SpeakerSession:
+    """单台音箱的播放队列、定时器与回复拦截状态，各音箱之间互不干扰。"""
+
+    def __init__(self, device_id: str | None):
+        self.device_id = device_id
+        self.label = device_id or "默认"
+        self.local_music_lock = asyncio.Lock()
+        self.play_queue: list[SongItem] = []
+        self.current_song: SongItem | None = None
+        self.timer_task: asyncio.Task | None = None
+        self.last_reply_text = ""
+        self.reply_interrupt_armed = False
+        self.reply_interrupt_armed_at = 0.0
+        self.reply_interrupt_reason = ""
+        self.reply_interrupt_lock = asyncio.Lock()
+        self.reply_interrupt_last_stop_at = 0.0
+        self.whitelist_resume_task: asyncio.Task | None = None
+        self.whitelist_resume_seq = 0
+        self.prefetcher = TrackPrefetcher(bytes_per_track=App.prefetch_bytes_per_track)
+        # 开启音频流播放时通过 WebSocket 推送 PCM，不再让音箱拉取 HTTP 链接
+        self.stream_player = build_stream_player(App.stream_playback_config, device_id=device_id)
+
+    def arm_reply_interrupt(self, reason: str):
+        self.reply_interrupt_armed = True
+        self.reply_interrupt_armed_at = time.monotonic()
+        self.reply_interrupt_reason = reason
+        logger.info("回复拦截窗口已开启: 设备=%s 原因=%s", self.label, reason)
+
+    def disarm_reply_interrupt(self, reason: str):
+        if not self.reply_interrupt_armed:
+            return
+        self.reply_interrupt_armed = False
+        logger.info(
+            "回复拦截窗口已关闭: 设备=%s 原因=%s 触发=%s",
+            self.label,
+            self.reply_interrupt_reason,
+            reason,
+        )
+        self.reply_interrupt_reason = ""
+
+    def _is_reply_interrupt_armed(self) -> bool:
+        if not self.reply_interrupt_armed:
+            return False
+        now = time.monotonic()
+        if now - self.reply_interrupt_armed_at > App.reply_interrupt_timeout_sec:
+            self.disarm_reply_interrupt("超时")
+            return False
+        return True
+
+    async def handle_user_speech_interrupt(self, text: str, match: CommandMatch | None = None):
+        if match is None:
+            match = App.command_matcher.match(text)
+        if match.whitelisted:
+            self.disarm_reply_interrupt("用户语音白名单命中")
+            logger.info("用户语音命中打断白名单，不清空队列: 设备=%s %s", self.label, text)
+            await self._schedule_auto_resume_after_whitelist(compact_text(text), text)
+            return
+        cleared_count = await self.clear_queue(stop_device=True)
+        self.disarm_reply_interrupt("用户语音打断")
+        logger.info(
+            "用户语音打断，已清空队列并停播: 设备=%s 文本=%s 清空数量=%d",
+            self.label,
+            text,
+            cleared_count,
+        )
+
+    def try_capture_reply_text(self, header: dict[str, Any], payload: dict[str, Any], line: dict[str, Any]):
+        namespace = str(header.get("namespace") or "")
+        name = str(header.get("name") or "")
+        maybe_reply_event, is_speak_event = App._classify_reply_event(namespace, name)
+        if not maybe_reply_event:
+            App.reply_events_skipped += 1
+            return
+        App.reply_events_processed += 1
+
+        text = App._first_reply_text(payload, line)
+        if not text:
+            return
+
+        self.last_reply_text = text
+        logger.info(
+            "小爱回复捕获: 设备=%s namespace=%s name=%s text=%s",
+            self.label,
+            namespace or "-",
+            name or "-",
+            self.last_reply_text,
+        )
+        if self._is_reply_interrupt_armed():
+            if is_speak_event:
+                now = time.monotonic()
+                if now - self.reply_interrupt_last_stop_at >= App.reply_interrupt_cooldown_sec:
+                    self.reply_interrupt_last_stop_at = now
+                    asyncio.create_task(self._interrupt_reply_playback())
+
+    async def _interrupt_reply_playback(self):
+        async with self.reply_interrupt_lock:
+            if not self._is_reply_interrupt_armed():
+                return
+            logger.info("命中回复拦截窗口，立即停止小爱当前播报: 设备=%s", self.label)
+            await stop_playback(device_id=self.device_id)
+
+    async def _speak_text(self, text: str, stop_first: bool = False):
+        self.disarm_reply_interrupt("即将发送播报")
+        if stop_first:
+            return await stop_and_speak(text, device_id=self.device_id)
+        return await speak_text(text, device_id=self.device_id)
+
+    async def _ask_xiaoai(self, text: str):
+        self.disarm_reply_interrupt("即将发送问答请求")
+        return await ask_xiaoai(text, device_id=self.device_id)
+
+    async def _play_music_url(self, url: str):
+        self.disarm_reply_interrupt("即将发送播放请求")
+        return await play_music_url(url, device_id=self.device_id)
+
+    async def _announce_and_play_url(self, text: str, url: str):
+        # 停播、播报、播放合并为一次往返，音箱端按顺序执行
+        self.disarm_reply_interrupt("即将发送播报与播放请求")
+        return await stop_speak_and_play(text, url, device_id=self.device_id)
+
+    async def _schedule_auto_resume_after_whitelist(self, normalized_text: str, raw_text: str):
+        if self.current_song is None:
+            return
+        self.whitelist_resume_seq += 1
+        seq = self.whitelist_resume_seq
+        if self.whitelist_resume_task and not self.whitelist_resume_task.done():
+            self.whitelist_resume_task.cancel()
+        logger.info(
+            "白名单语音触发自动恢复计划: 设备=%s 文本=%s 延迟=%.1fs",
+            self.label,
+            raw_text,
+            App.auto_resume_delay_sec,
+        )
+        self.whitelist_resume_task = asyncio.create_task(self._auto_resume_after_whitelist(seq))
+
+    async def _auto_resume_after_whitelist(self, seq: int):
+        try:
+            await asyncio.sleep(max(App.auto_resume_delay_sec, 0.1))
+        except asyncio.CancelledError:
+            return
+        if seq != self.whitelist_resume_seq:
+            return
+        async with self.local_music_lock:
+            if self.current_song is None:
+                return
+            song = self.current_song
+            logger.info("执行白名单自动恢复播放: 设备=%s %s", self.label, song.name)
+            await self._cancel_timer_unlocked()
+            await self._start_song_unlocked(song, trigger="白名单自动恢复")
+
+    async def _cancel_timer_unlocked(self):
+        task = self.timer_task
+        self.timer_task = None
+        if not task or task is asyncio.current_task():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _clear_queue_unlocked(self, stop_device: bool) -> int:
+        queued_count = len(self.play_queue) + (1 if self.current_song else 0)
+        await self._cancel_timer_unlocked()
+        self.prefetcher.cancel()
+        if self.stream_player is not None:
+            await self.stream_player.stop()
+        self.play_queue.clear()
+        self.current_song = None
+        if stop_device:
+            await stop_playback(device_id=self.device_id)
+        return queued_count
+
+    async def clear_queue(self, stop_device: bool = True) -> int:
+        async with self.local_music_lock:
+            return await self._clear_queue_unlocked(stop_device=stop_device)
+
+    def _log_queue(self, songs: list[SongItem]):
+        logger.info("播放队列已更新: 设备=%s 共%d首", self.label, len(songs))
+        for song in songs:
+            logger.info("队列[%d] %s", song.index, song.name)
+
+    def _schedule_timer_unlocked(self, duration_sec: float):
+        wait_sec = max(duration_sec, 0.1) + App.timer_buffer_sec
+        self.timer_task = asyncio.create_task(self._on_song_timer(wait_sec))
+
+    async def _start_song_unlocked(self, song: SongItem, trigger: str, announce: str | None = None):
+        self.current_song = song
+        if self.stream_player is not None:
+            if announce:
+                await self._speak_text(announce, stop_first=True)
+            self.disarm_reply_interrupt("即将推送音频流")
+            await self.stream_player.play(song.path, on_finished=lambda: self._on_stream_finished(song))
+            result = "stream"
+        elif announce:
+            result = await self._announce_and_play_url(announce, song.url)
+        else:
+            result = await self._play_music_url(song.url)
+        logger.info(
+            "开始播放: 设备=%s 来源=%s 第%d首 %s 时长=%.1f秒 剩余队列=%d 路径=%s",
+            self.label,
+            trigger,
+            song.index,
+            song.name,
+            song.duration_sec,
+            len(self.play_queue),
+            song.path,
+        )
+        logger.debug("播放接口返回: %s", result)
+        if self.stream_player is None:
+            # 音频流模式由播放器在推送完毕后回调切歌，无需按时长定时
+            self._schedule_timer_unlocked(song.duration_sec)
+        self._prefetch_upcoming_unlocked()
+
+    def _prefetch_upcoming_unlocked(self):
+        if not App.prefetch_enabled or App.prefetch_tracks <= 0:
+            return
+        upcoming = [song.path for song in self.play_queue[: App.prefetch_tracks]]
+        self.prefetcher.schedule(upcoming)
+        if self.stream_player is not None:
+            self.stream_player.prepare(upcoming[0] if upcoming else None)
+        elif App.music_server is not None and upcoming:
+            # stat 与缓存检查可能碰到休眠的网络存储，不在事件循环中执行
+            App.executors["search"].submit(App.music_server.prepare_tracks, upcoming[:1])
+
+    async def _on_song_timer(self, wait_sec: float):
+        try:
+            await asyncio.sleep(wait_sec)
+        except asyncio.CancelledError:
+            return
+
+        async with self.local_music_lock:
+            self.timer_task = None
+            await self._advance_queue_unlocked()
+
+    async def _on_stream_finished(self, song: SongItem):
+        async with self.local_music_lock:
+            # 回调排队期间用户可能已切换队列
+            if self.current_song is not song:
+                return
+            await self._advance_queue_unlocked()
+
+    async def _advance_queue_unlocked(self):
+        if not self.play_queue:
+            self.current_song = None
+            return
+        next_song = self.play_queue.pop(0)
+        logger.info(
+            "自动切歌: 设备=%s 第%d首 %s，剩余队列=%d",
+            self.label,
+            next_song.index,
+            next_song.name,
+            len(self.play_queue),
+        )
+        await self._start_song_unlocked(next_song, trigger="自动切歌")
+
+    async def refresh_music_index_and_reply(self, reason: str):
+        try:
+            if App.searcher.read_only:
+                total = await App.executors["search"].run(App.searcher.load)
+                await self._speak_text(f"曲库由索引实例负责刷新，当前共{total}首")
+                return
+            progress = App.searcher.refresh_progress()
+            if progress is not None:
+                # 以最新一次刷新为准: 播报当前进度后重新开始，已解析的结果会被复用
+                await self._speak_text(f"曲库正在刷新，{App.describe_refresh_progress(progress)}，将重新开始刷新")
+            else:
+                await self._speak_text("正在刷新曲库，请稍候")
+            result = await App.refresh_music_index(reason)
+            if result is None:
+                return
+            total, cost_ms = result
+            await self._speak_text(f"曲库刷新完成，共{total}首，耗时{cost_ms / 1000:.1f}秒")
+        except Exception as exc:
+            logger.exception("曲库索引刷新失败: 原因=%s 错误=%s", reason, exc)
+            await self._speak_text("曲库刷新失败，请稍后重试")
+
+    async def play_local_music_by_keyword(self, keyword: str, received_at: float | None = None):
+        if not App.searcher.has_dirs():
+            await self._speak_text("本地音乐目录还没有配置")
+            return
+
+        logger.info("收到搜索请求: 设备=%s 关键词=%s", self.label, keyword)
+        with span("search"):
+            files = await App.executors["search"].run(App.searcher.find, keyword)
+        count = len(files)
+        if count == 0:
+            await self._speak_text(f"没有找到包含{keyword}的歌曲")
+            logger.info("未找到匹配歌曲: 关键词=%s", keyword)
+            return
+
+        with span("build_items"):
+            songs = await App.executors["search"].run(App._build_song_items, files, App.music_server)
+        if not songs:
+            await self._speak_text("没有可播放的歌曲，无法解析音频时长")
+            logger.warning("搜索结果存在但无可播放歌曲: 关键词=%s", keyword)
+            return
+        # 停播与播报、播放一起发送
+        cleared_count = await self.clear_queue(stop_device=False)
+        logger.info(
+            "搜索命中并替换队列: 设备=%s 关键词=%s 命中=%d 清空旧队列=%d",
+            self.label,
+            keyword,
+            count,
+            cleared_count,
+        )
+        self._log_queue(songs)
+
+        async with self.local_music_lock:
+            self.play_queue = songs
+            first_song = self.play_queue.pop(0)
+            logger.info(
+                "开始播放搜索结果首曲: 第%d首 %s，剩余队列=%d",
+                first_song.index,
+                first_song.name,
+                len(self.play_queue),
+            )
+            await self._start_song_unlocked(first_song, trigger="搜索播放", announce=f"好的，找到{count}首歌曲")
+        if received_at is not None:
+            metrics.VOICE_TO_PLAY_SECONDS.labels("play").observe(time.monotonic() - received_at)
+
+    async def play_random_music(self, received_at: float | None = None):
+        if not App.searcher.has_dirs():
+            await self._speak_text("本地音乐目录还没有配置")
+            return
+
+        logger.info("收到随机播放请求: 设备=%s", self.label)
+        with span("random_pick"):
+            files = await App.executors["search"].run(App.searcher.random_pick)
+        count = len(files)
+        if count == 0:
+            await self._speak_text("曲库为空，无法随机播放")
+            logger.info("随机播放失败: 曲库为空")
+            return
+
+        with span("build_items"):
+            songs = await App.executors["search"].run(App._build_song_items, files, App.music_server)
+        if not songs:
+            await self._speak_text("没有可播放的歌曲，无法解析音频时长")
+            logger.warning("随机结果存在但无可播放歌曲")
+            return
+        cleared_count = await self.clear_queue(stop_device=False)
+        logger.info("随机选歌并替换队列: 设备=%s 命中=%d 清空旧队列=%d", self.label, count, cleared_count)
+        self._log_queue(songs)
+
+        async with self.local_music_lock:
+            self.play_queue = songs
+            first_song = self.play_queue.pop(0)
+            logger.info(
+                "开始播放随机队列首曲: 第%d首 %s，剩余队列=%d",
+                first_song.index,
+                first_song.name,
+                len(self.play_queue),
+            )
+            await self._start_song_unlocked(first_song, trigger="随机播放", announce=f"好的，随机播放{count}首歌曲")
+        if received_at is not None:
+            metrics.VOICE_TO_PLAY_SECONDS.labels("random").observe(time.monotonic() - received_at)
+
+    async def stop_music(self):
+        count = await self.clear_queue(stop_device=True)
+        logger.info("已停止播放并清空队列: 设备=%s 数量=%d", self.label, count)
+
+    async def close(self):
+        async with self.local_music_lock:
+            await self._cancel_timer_unlocked()
+            if self.stream_player is not None:
+                await self.stream_player.stop()
+        self.prefetcher.cancel()
+        if self.whitelist_resume_task and not self.whitelist_resume_task.done():
+            self.whitelist_resume_task.cancel()
+
+
 class App:
     loop: asyncio.AbstractEventLoop | None = None
     music_server: LocalMusicHttpServer | None = None
-    local_music_lock = asyncio.Lock()
-    play_queue: list[SongItem] = []
-    current_song: SongItem | None = None
-    timer_task: asyncio.Task | None = None
-    index_refresh_task: asyncio.Task | None = None
-    index_refresh_lock = asyncio.Lock()
-    last_reply_text: str = ""
-    reply_interrupt_armed = False
-    reply_interrupt_armed_at = 0.0
-    reply_interrupt_reason = ""
-    reply_interrupt_lock = asyncio.Lock()
-    reply_interrupt_last_stop_at = 0.0
-    whitelist_resume_task: asyncio.Task | None = None
-    whitelist_resume_seq = 0
+    sessions: dict[str | None, SpeakerSession] = {}
+    last_device_id: str | None = None
+    index_refresh_tasks: list[asyncio.Task] = []
+    # 每个音乐目录一把刷新锁，各目录的刷新互不等待
+    root_refresh_locks: dict[str, asyncio.Lock] = {}
+    startup_timer = StartupTimer(process_started_at())
+    startup_refresh_task: asyncio.Task | None = None
+    reply_event_classes: dict[tuple[str, str], tuple[bool, bool]] = {}
+    reply_events_processed = 0
+    reply_events_skipped = 0
 
     timer_buffer_sec = float(MUSIC_CONFIG.get("timer_buffer_sec", 1.5))
 
     search_config = MUSIC_CONFIG.get("search", {}) or {}
     max_results = int(search_config.get("max_results", MUSIC_CONFIG.get("max_results", 50)))
     refresh_interval_sec = float(search_config.get("refresh_interval_sec", 300))
+    root_refresh_interval_sec = search_config.get("root_refresh_interval_sec", {}) or {}
     search_index_file = str(search_config.get("index_file", ".cache/music_index.json"))
+    shared_index_config = search_config.get("shared_index", {}) or {}
+    fast_start = bool(search_config.get("fast_start", True))
     audio_extensions = {
         str(ext).strip().lower()
         for ext in MUSIC_CONFIG.get("supported_audio_extensions", [])
@@ -137,221 +605,162 @@ class App:
     }
 
     command_config = MUSIC_CONFIG.get("commands", {}) or {}
-    play_keywords = list(command_config.get("play_keywords", []))
-    stop_keywords = set(command_config.get("stop_keywords", []))
-    refresh_keywords = {
-        normalize_keyword(keyword).replace(" ", "")
-        for keyword in command_config.get("refresh_keywords", [])
-        if normalize_keyword(keyword)
-    }
-    random_play_keywords = {
-        normalize_keyword(keyword).replace(" ", "")
-        for keyword in command_config.get("random_play_keywords", [])
-        if normalize_keyword(keyword)
-    }
-    interrupt_whitelist_keywords = {
-        normalize_keyword(keyword).replace(" ", "")
-        for keyword in command_config.get("interrupt_whitelist_keywords", [])
-        if normalize_keyword(keyword)
-    }
+    command_matcher = CommandMatcher(command_config)
+    config_watch_interval_sec = float(command_config.get("config_watch_interval_sec", 5))
+    config_watch_task: asyncio.Task | None = None
+    sync_config = MUSIC_CONFIG.get("sync", {}) or {}
+    index_sync: IndexSyncClient | None = None
+    index_sync_task: asyncio.Task | None = None
     reply_interrupt_timeout_sec = float(command_config.get("reply_interrupt_timeout_sec", 20))
     reply_interrupt_cooldown_sec = float(command_config.get("reply_interrupt_cooldown_sec", 1.2))
     auto_resume_delay_sec = float(command_config.get("auto_resume_delay_sec", 1.8))
 
-    searcher = MusicSearcher(
-        music_dirs=MUSIC_CONFIG.get("music_dirs", []) or [],
-        max_results=max_results,
-        extensions=audio_extensions,
-        index_file=search_index_file,
-    )
+    prefetch_config = MUSIC_CONFIG.get("prefetch", {}) or {}
+    prefetch_enabled = bool(prefetch_config.get("enabled", True))
+    prefetch_tracks = int(prefetch_config.get("tracks", 2))
+    prefetch_bytes_per_track = int(prefetch_config.get("bytes_per_track", 4 * 1024 * 1024))
+    stream_playback_config = MUSIC_CONFIG.get("stream_playback", {}) or {}
+
+    # 在 start() 中创建，导入 main 时不读取索引
+    searcher: MusicSearcher | SharedMusicSearcher | None = None
+    # 交互操作（search/console）与后台维护（probe/refresh）使用各自的线程池，互不抢占
+    executors: dict[str, NamedExecutor] = {}
     ffprobe_path = shutil.which("ffprobe")
 
     @classmethod
-    def arm_reply_interrupt(cls, reason: str):
-        cls.reply_interrupt_armed = True
-        cls.reply_interrupt_armed_at = time.monotonic()
-        cls.reply_interrupt_reason = reason
-        logger.info("回复拦截窗口已开启: 原因=%s", reason)
+    def session_for(cls, device_id: str | None) -> SpeakerSession:
+        if device_id:
+            device_id = str(device_id)
+            cls.last_device_id = device_id
+        else:
+            # 命令行或未携带设备号的事件交给最近活跃的音箱
+            device_id = cls.last_device_id
+        session = cls.sessions.get(device_id)
+        if session is None:
+            session = SpeakerSession(device_id)
+            cls.sessions[device_id] = session
+            logger.info("创建音箱会话: 设备=%s", session.label)
+        return session
 
     @classmethod
-    def disarm_reply_interrupt(cls, reason: str):
-        if not cls.reply_interrupt_armed:
-            return
-        cls.reply_interrupt_armed = False
-        logger.info("回复拦截窗口已关闭: 原因=%s 触发=%s", cls.reply_interrupt_reason, reason)
-        cls.reply_interrupt_reason = ""
+    def reload_command_config(cls) -> bool:
+        try:
+            command_config = importlib.reload(config).MUSIC_CONFIG.get("commands", {}) or {}
+            matcher = CommandMatcher(command_config)
+        except Exception as exc:
+            logger.warning("命令配置重新加载失败，继续使用旧配置: %s", exc)
+            return False
+        cls.command_config = command_config
+        cls.command_matcher = matcher
+        cls.reply_interrupt_timeout_sec = float(command_config.get("reply_interrupt_timeout_sec", 20))
+        cls.reply_interrupt_cooldown_sec = float(command_config.get("reply_interrupt_cooldown_sec", 1.2))
+        cls.auto_resume_delay_sec = float(command_config.get("auto_resume_delay_sec", 1.8))
+        logger.info("命令配置已重新加载")
+        return True
 
     @classmethod
-    def _is_reply_interrupt_armed(cls) -> bool:
-        if not cls.reply_interrupt_armed:
+    async def sync_music_index(cls, reason: str) -> bool:
+        if cls.index_sync is None:
             return False
-        now = time.monotonic()
-        if now - cls.reply_interrupt_armed_at > cls.reply_interrupt_timeout_sec:
-            cls.disarm_reply_interrupt("超时")
+        try:
+            await cls.executors["refresh"].run(cls.index_sync.pull)
+            return True
+        except Exception as exc:
+            logger.warning("索引同步失败: 原因=%s 上游=%s 错误=%s", reason, cls.index_sync.upstream, exc)
             return False
-        return True
 
     @classmethod
-    def _is_user_interrupt_whitelisted(cls, text: str) -> bool:
-        normalized = normalize_keyword(text).replace(" ", "")
-        return cls._matches_any_keyword(normalized, cls.interrupt_whitelist_keywords)
+    async def run_index_sync_loop(cls, interval_sec: float):
+        logger.info("索引同步已启动: 上游=%s 间隔=%.1f秒", cls.index_sync.upstream, interval_sec)
+        while True:
+            try:
+                await asyncio.sleep(max(interval_sec, 1))
+                await cls.sync_music_index("定时同步")
+            except asyncio.CancelledError:
+                logger.info("索引同步已停止")
+                return
 
     @classmethod
-    def _matches_any_keyword(cls, normalized_text: str, keywords: set[str]) -> bool:
-        if not normalized_text:
-            return False
-        for keyword in keywords:
-            if not keyword:
-                continue
-            if normalized_text == keyword or keyword in normalized_text:
-                return True
-        return False
+    async def run_config_watch_loop(cls):
+        config_path = os.path.abspath(config.__file__)
+        try:
+            last_mtime_ns = os.stat(config_path).st_mtime_ns
+        except OSError:
+            last_mtime_ns = 0
+        while True:
+            try:
+                await asyncio.sleep(max(cls.config_watch_interval_sec, 1))
+                mtime_ns = os.stat(config_path).st_mtime_ns
+                if mtime_ns == last_mtime_ns:
+                    continue
+                last_mtime_ns = mtime_ns
+                logger.info("检测到配置文件变更: %s", config_path)
+                cls.reload_command_config()
+            except asyncio.CancelledError:
+                return
+            except OSError as exc:
+                logger.warning("检查配置文件失败: %s", exc)
 
     @classmethod
-    async def handle_user_speech_interrupt(cls, text: str):
-        normalized = normalize_keyword(text).replace(" ", "")
-        if cls._is_user_interrupt_whitelisted(text):
-            cls.disarm_reply_interrupt("用户语音白名单命中")
-            logger.info("用户语音命中打断白名单，不清空队列: %s", text)
-            await cls._schedule_auto_resume_after_whitelist(normalized, text)
-            return
-        cleared_count = await cls.clear_queue(stop_device=True)
-        cls.disarm_reply_interrupt("用户语音打断")
-        logger.info("用户语音打断，已清空队列并停播: 文本=%s 清空数量=%d", text, cleared_count)
+    def _classify_reply_event(cls, namespace: str, name: str) -> tuple[bool, bool]:
+        key = (namespace, name)
+        cached = cls.reply_event_classes.get(key)
+        if cached is not None:
+            return cached
+        namespace_lower = namespace.lower()
+        name_lower = name.lower()
+        if namespace == "SpeechRecognizer" and name == "RecognizeResult":
+            result = (False, False)
+        else:
+            maybe_reply_event = any(hint in namespace_lower for hint in REPLY_NAMESPACE_HINTS) or any(
+                hint in name_lower for hint in REPLY_NAME_HINTS
+            )
+            is_speak_event = "speechsynthesizer" in namespace_lower and "speak" in name_lower
+            result = (maybe_reply_event, is_speak_event)
+        if len(cls.reply_event_classes) < 1024:
+            cls.reply_event_classes[key] = result
+        return result
 
     @classmethod
-    def try_capture_reply_text(cls, header: dict[str, Any], payload: dict[str, Any], line: dict[str, Any]):
-        namespace = str(header.get("namespace") or "")
-        name = str(header.get("name") or "")
-        if namespace == "SpeechRecognizer" and name == "RecognizeResult":
-            return
+    def reply_capture_stats(cls) -> dict[str, int]:
+        return {
+            "processed": cls.reply_events_processed,
+            "skipped": cls.reply_events_skipped,
+        }
 
-        texts: list[str] = []
+    @classmethod
+    def _first_reply_text(cls, payload: Any, line: Any) -> str:
+        # SpeechSynthesizer/Dialog 指令的文本通常直接位于 payload 顶层
+        if isinstance(payload, dict):
+            for key in REPLY_PAYLOAD_TEXT_KEYS:
+                item = payload.get(key)
+                if isinstance(item, str) and item.strip():
+                    return item.strip()
         for source in (payload, line):
-            texts.extend(cls._extract_candidate_texts(source))
-        unique_texts = [item for item in dict.fromkeys(texts) if item]
-        if not unique_texts:
-            return
-
-        namespace_lower = namespace.lower()
-        name_lower = name.lower()
-        maybe_reply_event = (
-            "tts" in namespace_lower
-            or "speechsynthesizer" in namespace_lower
-            or "nlp" in namespace_lower
-            or "dialog" in namespace_lower
-            or "assistant" in namespace_lower
-            or "reply" in name_lower
-            or "respond" in name_lower
-            or "speak" in name_lower
-        )
-        if not maybe_reply_event:
-            return
-
-        cls.last_reply_text = unique_texts[0]
-        logger.info(
-            "小爱回复捕获: namespace=%s name=%s text=%s",
-            namespace or "-",
-            name or "-",
-            cls.last_reply_text,
-        )
-        if cls._is_reply_interrupt_armed():
-            is_speak_event = "speechsynthesizer" in namespace_lower and "speak" in name_lower
-            if is_speak_event:
-                now = time.monotonic()
-                if now - cls.reply_interrupt_last_stop_at >= cls.reply_interrupt_cooldown_sec:
-                    cls.reply_interrupt_last_stop_at = now
-                    asyncio.create_task(cls._interrupt_reply_playback())
+            for text in cls._iter_candidate_texts(source):
+                return text
+        return ""
 
     @classmethod
-    def _extract_candidate_texts(cls, value: Any) -> list[str]:
-        candidates: list[str] = []
+    def _iter_candidate_texts(cls, value: Any):
         if isinstance(value, str):
             text = value.strip()
             if text:
-                candidates.append(text)
-            return candidates
+                yield text
+            return
         if isinstance(value, list):
             for item in value:
-                candidates.extend(cls._extract_candidate_texts(item))
-            return candidates
+                yield from cls._iter_candidate_texts(item)
+            return
         if isinstance(value, dict):
-            direct_keys = {
-                "text",
-                "reply",
-                "answer",
-                "content",
-                "tts",
-                "say",
-                "speech",
-                "nlp_reply",
-                "reply_text",
-                "display_text",
-            }
             for key, item in value.items():
                 key_lower = str(key).lower()
-                if key_lower in direct_keys and isinstance(item, str):
+                if key_lower in REPLY_DIRECT_TEXT_KEYS and isinstance(item, str):
                     text = item.strip()
                     if text:
-                        candidates.append(text)
-                if key_lower in {"payload", "data", "results", "result", "instruction", "directives", "cards"}:
-                    candidates.extend(cls._extract_candidate_texts(item))
-            return candidates
-        return candidates
-
-    @classmethod
-    async def _interrupt_reply_playback(cls):
-        async with cls.reply_interrupt_lock:
-            if not cls._is_reply_interrupt_armed():
-                return
-            logger.info("命中回复拦截窗口，立即停止小爱当前播报")
-            await stop_playback()
-
-    @classmethod
-    async def _speak_text(cls, text: str):
-        cls.disarm_reply_interrupt("即将发送播报")
-        return await speak_text(text)
-
-    @classmethod
-    async def _ask_xiaoai(cls, text: str):
-        cls.disarm_reply_interrupt("即将发送问答请求")
-        return await ask_xiaoai(text)
-
-    @classmethod
-    async def _play_music_url(cls, url: str):
-        cls.disarm_reply_interrupt("即将发送播放请求")
-        return await play_music_url(url)
-
-    @classmethod
-    async def _schedule_auto_resume_after_whitelist(cls, normalized_text: str, raw_text: str):
-        if cls.current_song is None:
-            return
-        cls.whitelist_resume_seq += 1
-        seq = cls.whitelist_resume_seq
-        if cls.whitelist_resume_task and not cls.whitelist_resume_task.done():
-            cls.whitelist_resume_task.cancel()
-        logger.info(
-            "白名单语音触发自动恢复计划: 文本=%s 延迟=%.1fs",
-            raw_text,
-            cls.auto_resume_delay_sec,
-        )
-        cls.whitelist_resume_task = asyncio.create_task(cls._auto_resume_after_whitelist(seq))
-
-    @classmethod
-    async def _auto_resume_after_whitelist(cls, seq: int):
-        try:
-            await asyncio.sleep(max(cls.auto_resume_delay_sec, 0.1))
-        except asyncio.CancelledError:
-            return
-        if seq != cls.whitelist_resume_seq:
-            return
-        async with cls.local_music_lock:
-            if cls.current_song is None:
-                return
-            song = cls.current_song
-            logger.info("执行白名单自动恢复播放: %s", song.name)
-            await cls._cancel_timer_unlocked()
-            await cls._start_song_unlocked(song, trigger="白名单自动恢复")
+                        yield text
+                if key_lower in REPLY_NESTED_KEYS:
+                    yield from cls._iter_candidate_texts(item)
 
     @staticmethod
     def _safe_read_command_line(prompt: str = ">>> ") -> str:
@@ -436,228 +845,147 @@ class App:
     ) -> list[SongItem]:
         songs: list[SongItem] = []
         for idx, file_path in enumerate(files, start=1):
-            duration = cls._get_track_duration_sec(file_path)
+            with span("probe_duration"):
+                duration = cls._get_track_duration_sec(file_path)
             if duration is None:
                 logger.warning("跳过无法探测时长的歌曲: %s", file_path)
                 continue
+            try:
+                url = music_server.create_file_url(file_path)
+            except OSError as exc:
+                logger.warning("跳过无法访问的歌曲: %s 错误=%s", file_path, exc)
+                continue
             songs.append(
                 SongItem(
                     index=idx,
                     path=file_path,
                     name=os.path.basename(file_path),
-                    url=music_server.create_file_url(file_path),
+                    url=url,
                     duration_sec=duration,
                 )
             )
         return songs
 
-    @classmethod
-    async def _cancel_timer_unlocked(cls):
-        task = cls.timer_task
-        cls.timer_task = None
-        if not task or task is asyncio.current_task():
-            return
-        task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
-
-    @classmethod
-    async def _clear_queue_unlocked(cls, stop_device: bool) -> int:
-        queued_count = len(cls.play_queue) + (1 if cls.current_song else 0)
-        await cls._cancel_timer_unlocked()
-        cls.play_queue.clear()
-        cls.current_song = None
-        if stop_device:
-            await stop_playback()
-        return queued_count
-
-    @classmethod
-    async def clear_queue(cls, stop_device: bool = True) -> int:
-        async with cls.local_music_lock:
-            return await cls._clear_queue_unlocked(stop_device=stop_device)
-
-    @classmethod
-    def _log_queue(cls, songs: list[SongItem]):
-        logger.info("播放队列已更新: 共%d首", len(songs))
-        for song in songs:
-            logger.info("队列[%d] %s", song.index, song.name)
+    @staticmethod
+    def describe_refresh_progress(progress: IndexProgress) -> str:
+        if progress.walking:
+            return f"已扫描{progress.scanned}个文件"
+        return f"共{progress.scanned}个文件，已解析{progress.probed}/{progress.total}首"
 
     @classmethod
-    def _schedule_timer_unlocked(cls, duration_sec: float):
-        wait_sec = max(duration_sec, 0.1) + cls.timer_buffer_sec
-        cls.timer_task = asyncio.create_task(cls._on_song_timer(wait_sec))
+    def _root_refresh_lock(cls, root: str) -> asyncio.Lock:
+        return cls.root_refresh_locks.setdefault(root, asyncio.Lock())
 
     @classmethod
-    async def _start_song_unlocked(cls, song: SongItem, trigger: str):
-        cls.current_song = song
-        result = await cls._play_music_url(song.url)
+    async def refresh_music_index(cls, reason: str, roots: list[str] | None = None) -> tuple[int, float] | None:
+        """并行刷新各目录分片，返回 (合并后歌曲数, 耗时毫秒)；任一目录被之后发起的刷新取代时返回 None。"""
+        if cls.searcher.read_only:
+            logger.info("只读实例不刷新曲库，使用共享索引: 原因=%s 歌曲数=%d", reason, cls.searcher.index_size())
+            return cls.searcher.index_size(), 0.0
+        roots = list(roots if roots is not None else cls.searcher.music_dirs)
+        start_time = time.monotonic()
+        results = await asyncio.gather(*(cls._refresh_root(root, reason) for root in roots))
+        if any(result is None for result in results):
+            return None
+        total = cls.searcher.index_size()
+        cost_ms = (time.monotonic() - start_time) * 1000
         logger.info(
-            "开始播放: 来源=%s 第%d首 %s 时长=%.1f秒 剩余队列=%d 路径=%s",
-            trigger,
-            song.index,
-            song.name,
-            song.duration_sec,
-            len(cls.play_queue),
-            song.path,
+            "曲库索引刷新完成: 原因=%s 目录数=%d 总数=%d 耗时=%.1f毫秒",
+            reason,
+            len(roots),
+            total,
+            cost_ms,
         )
-        logger.debug("播放接口返回: %s", result)
-        cls._schedule_timer_unlocked(song.duration_sec)
+        return total, cost_ms
 
     @classmethod
-    async def _on_song_timer(cls, wait_sec: float):
-        try:
-            await asyncio.sleep(wait_sec)
-        except asyncio.CancelledError:
-            return
-
-        async with cls.local_music_lock:
-            cls.timer_task = None
-            if not cls.play_queue:
-                cls.current_song = None
-                return
-            next_song = cls.play_queue.pop(0)
-            logger.info(
-                "自动切歌: 第%d首 %s，剩余队列=%d",
-                next_song.index,
-                next_song.name,
-                len(cls.play_queue),
-            )
-            await cls._start_song_unlocked(next_song, trigger="自动切歌")
-
-    @classmethod
-    async def refresh_music_index(cls, reason: str):
-        async with cls.index_refresh_lock:
+    async def _refresh_root(cls, root: str, reason: str) -> int | None:
+        # 先取消该目录正在执行的刷新，让其尽快释放锁
+        cls.searcher.cancel_refresh(root)
+        async with cls._root_refresh_lock(root):
             start_time = time.monotonic()
-            total = await asyncio.to_thread(cls.searcher.refresh_index)
-            cost_ms = (time.monotonic() - start_time) * 1000
+            try:
+                total = await cls.executors["refresh"].run(cls.searcher.refresh_root, root)
+            except IndexBuildCancelled:
+                logger.info("曲库索引刷新已被新的刷新取代: 原因=%s 目录=%s", reason, root)
+                return None
             logger.info(
-                "曲库索引刷新完成: 原因=%s 总数=%d 耗时=%.1f毫秒",
+                "目录索引刷新完成: 原因=%s 目录=%s 歌曲数=%d 耗时=%.1f毫秒",
                 reason,
+                root,
                 total,
-                cost_ms,
+                (time.monotonic() - start_time) * 1000,
             )
-            return total, cost_ms
+            return total
 
     @classmethod
-    def _is_refresh_index_command(cls, text: str) -> bool:
-        normalized = normalize_keyword(text).replace(" ", "")
-        return bool(normalized) and normalized in cls.refresh_keywords
+    def build_searcher(cls) -> MusicSearcher | SharedMusicSearcher:
+        shared_mode = str(cls.shared_index_config.get("mode", "off")).lower()
+        shared_file = str(cls.shared_index_config.get("file", ".cache/music_index.shared"))
+        if shared_mode == "reader":
+            logger.info("共享索引只读模式: 文件=%s", shared_file)
+            return SharedMusicSearcher(
+                shared_file,
+                music_dirs=MUSIC_CONFIG.get("music_dirs", []) or [],
+                max_results=cls.max_results,
+            )
+        if shared_mode == "writer":
+            logger.info("共享索引写入模式: 文件=%s", shared_file)
+        return MusicSearcher(
+            music_dirs=MUSIC_CONFIG.get("music_dirs", []) or [],
+            max_results=cls.max_results,
+            extensions=cls.audio_extensions,
+            index_file=cls.search_index_file,
+            publish_every=int(cls.search_config.get("partial_publish_files", 500)),
+            publish_interval_sec=float(cls.search_config.get("partial_publish_sec", 5)),
+            probe_executor=cls.executors["probe"],
+            probe_workers=cls.executors["probe"].workers,
+            dedup=bool(cls.search_config.get("dedup", True)),
+            shared_index_file=shared_file if shared_mode == "writer" else "",
+        )
 
     @classmethod
-    def _is_random_play_command(cls, text: str) -> bool:
-        normalized = normalize_keyword(text).replace(" ", "")
-        return bool(normalized) and normalized in cls.random_play_keywords
+    async def load_music_index(cls):
+        total = await cls.executors["search"].run(cls.searcher.load)
+        cls.startup_timer.mark("索引加载完成", f"歌曲数={total}")
 
     @classmethod
-    async def refresh_music_index_and_reply(cls, reason: str):
+    async def run_startup_refresh(cls, load_task: asyncio.Task):
+        # 先用持久化索引提供服务，刷新在后台完成后整体替换
         try:
-            if cls.index_refresh_lock.locked():
-                await cls._speak_text("曲库正在刷新，请稍候")
-                return
-            await cls._speak_text("正在刷新曲库，请稍候")
-            total, cost_ms = await cls.refresh_music_index(reason)
-            await cls._speak_text(f"曲库刷新完成，共{total}首，耗时{cost_ms / 1000:.1f}秒")
+            await load_task
+            # 先从上游导入元信息，随后的本地刷新只需比对文件大小与修改时间
+            await cls.sync_music_index("启动同步")
+            result = await cls.refresh_music_index("启动刷新")
+            if result is not None:
+                cls.startup_timer.mark("启动刷新完成", f"歌曲数={result[0]}")
+        except asyncio.CancelledError:
+            raise
         except Exception as exc:
-            logger.exception("曲库索引刷新失败: 原因=%s 错误=%s", reason, exc)
-            await cls._speak_text("曲库刷新失败，请稍后重试")
+            logger.exception("启动刷新失败: %s", exc)
 
     @classmethod
-    async def run_index_refresh_loop(cls):
-        logger.info("曲库索引定时刷新已启动: 间隔=%.1f秒", cls.refresh_interval_sec)
+    def refresh_interval_for(cls, root: str) -> float:
+        for path, interval in cls.root_refresh_interval_sec.items():
+            if os.path.abspath(os.path.expanduser(path)) == root:
+                return float(interval)
+        return cls.refresh_interval_sec
+
+    @classmethod
+    async def run_index_refresh_loop(cls, root: str, interval_sec: float):
+        logger.info("曲库索引定时刷新已启动: 目录=%s 间隔=%.1f秒", root, interval_sec)
         while True:
             try:
-                await asyncio.sleep(max(cls.refresh_interval_sec, 1))
-                if cls.index_refresh_lock.locked():
-                    logger.info("跳过本次定时刷新: 当前已有刷新任务在执行")
+                await asyncio.sleep(max(interval_sec, 1))
+                if cls._root_refresh_lock(root).locked():
+                    logger.info("跳过本次定时刷新: 目录=%s 当前已有刷新任务在执行", root)
                     continue
-                await cls.refresh_music_index("定时刷新")
+                await cls.refresh_music_index("定时刷新", roots=[root])
             except asyncio.CancelledError:
-                logger.info("曲库索引定时刷新已停止")
+                logger.info("曲库索引定时刷新已停止: 目录=%s", root)
                 return
             except Exception as exc:
-                logger.exception("曲库索引定时刷新异常: %s", exc)
-
-    @classmethod
-    async def play_local_music_by_keyword(cls, keyword: str):
-        if not cls.searcher.has_dirs():
-            await cls._speak_text("本地音乐目录还没有配置")
-            return
-
-        logger.info("收到搜索请求: 关键词=%s", keyword)
-        files = await asyncio.to_thread(cls.searcher.find, keyword)
-        count = len(files)
-        if count == 0:
-            await cls._speak_text(f"没有找到包含{keyword}的歌曲")
-            logger.info("未找到匹配歌曲: 关键词=%s", keyword)
-            return
-
-        songs = await asyncio.to_thread(cls._build_song_items, files, cls.music_server)
-        if not songs:
-            await cls._speak_text("没有可播放的歌曲，无法解析音频时长")
-            logger.warning("搜索结果存在但无可播放歌曲: 关键词=%s", keyword)
-            return
-        cleared_count = await cls.clear_queue(stop_device=True)
-        logger.info(
-            "搜索命中并替换队列: 关键词=%s 命中=%d 清空旧队列=%d",
-            keyword,
-            count,
-            cleared_count,
-        )
-        cls._log_queue(songs)
-        await cls._speak_text(f"好的，找到{count}首歌曲")
-
-        async with cls.local_music_lock:
-            cls.play_queue = songs
-            first_song = cls.play_queue.pop(0)
-            logger.info(
-                "开始播放搜索结果首曲: 第%d首 %s，剩余队列=%d",
-                first_song.index,
-                first_song.name,
-                len(cls.play_queue),
-            )
-            await cls._start_song_unlocked(first_song, trigger="搜索播放")
-
-    @classmethod
-    async def play_random_music(cls):
-        if not cls.searcher.has_dirs():
-            await cls._speak_text("本地音乐目录还没有配置")
-            return
-
-        logger.info("收到随机播放请求")
-        files = await asyncio.to_thread(cls.searcher.random_pick)
-        count = len(files)
-        if count == 0:
-            await cls._speak_text("曲库为空，无法随机播放")
-            logger.info("随机播放失败: 曲库为空")
-            return
-
-        songs = await asyncio.to_thread(cls._build_song_items, files, cls.music_server)
-        if not songs:
-            await cls._speak_text("没有可播放的歌曲，无法解析音频时长")
-            logger.warning("随机结果存在但无可播放歌曲")
-            return
-        cleared_count = await cls.clear_queue(stop_device=True)
-        logger.info("随机选歌并替换队列: 命中=%d 清空旧队列=%d", count, cleared_count)
-        cls._log_queue(songs)
-        await cls._speak_text(f"好的，随机播放{count}首歌曲")
-
-        async with cls.local_music_lock:
-            cls.play_queue = songs
-            first_song = cls.play_queue.pop(0)
-            logger.info(
-                "开始播放随机队列首曲: 第%d首 %s，剩余队列=%d",
-                first_song.index,
-                first_song.name,
-                len(cls.play_queue),
-            )
-            await cls._start_song_unlocked(first_song, trigger="随机播放")
-
-    @classmethod
-    async def stop_music(cls):
-        count = await cls.clear_queue(stop_device=True)
-        logger.info("已停止播放并清空队列: 数量=%d", count)
+                logger.exception("曲库索引定时刷新异常: 目录=%s 错误=%s", root, exc)
 
     @classmethod
     async def command_loop(cls):
@@ -669,12 +997,16 @@ class App:
             "  local <kw>   - 搜索本地目录并播放匹配歌曲\n"
             "  stop         - 暂停当前播放\n"
             "  refresh      - 手动刷新曲库索引\n"
+            "  reload       - 重新加载命令配置\n"
+            "  devices      - 查看已连接的音箱\n"
+            "  slow         - 查看最近的慢命令耗时分段\n"
+            "  use <device> - 切换命令行操作的音箱\n"
             "  quit         - 退出\n"
         )
 
         while True:
             try:
-                line = await asyncio.to_thread(cls._safe_read_command_line, ">>> ")
+                line = await cls.executors["console"].run(cls._safe_read_command_line, ">>> ")
             except EOFError:
                 logger.info("检测到 stdin 关闭，退出命令循环")
                 break
@@ -687,27 +1019,49 @@ class App:
             if cmd in {"quit", "exit"}:
                 break
 
+            session = cls.session_for(None)
             if cmd == "stop":
-                await cls.stop_music()
+                await session.stop_music()
                 continue
 
             if cmd == "refresh":
                 await cls.refresh_music_index("手动刷新")
                 continue
 
+            if cmd == "reload":
+                cls.reload_command_config()
+                continue
+
+            if cmd == "slow":
+                for record in TRACER.recent_slow:
+                    logger.info("慢命令: %s", json.dumps(record, ensure_ascii=False))
+                continue
+
+            if cmd == "devices":
+                logger.info(
+                    "已连接音箱: %s 当前=%s",
+                    open_xiaoai_server.list_devices(),
+                    session.label,
+                )
+                for device_id, stats in open_xiaoai_server.message_stats().items():
+                    logger.info("消息队列统计: 设备=%s %s", device_id, stats)
+                continue
+
             if len(args) < 2:
                 print("参数不足")
                 continue
 
             content = " ".join(args[1:])
-            if cmd == "say":
-                logger.info("[say] 返回=%s", await cls._speak_text(content))
+            if cmd == "use":
+                logger.info("命令行已切换到音箱: %s", cls.session_for(content).label)
+            elif cmd == "say":
+                logger.info("[say] 返回=%s", await session._speak_text(content))
             elif cmd == "ask":
-                logger.info("[ask] 返回=%s", await cls._ask_xiaoai(content))
+                logger.info("[ask] 返回=%s", await session._ask_xiaoai(content))
             elif cmd == "music":
-                logger.info("[music] 返回=%s", await cls._play_music_url(content))
+                logger.info("[music] 返回=%s", await session._play_music_url(content))
             elif cmd == "local":
-                await cls.play_local_music_by_keyword(content)
+                await session.play_local_music_by_keyword(content)
             else:
                 logger.warning("未知命令: %s", cmd)
 
@@ -715,21 +1069,81 @@ class App:
     async def start(cls):
         server_task = None
         command_task = None
+        load_task = None
         cls.loop = asyncio.get_running_loop()
+        cls.startup_timer.mark("导入完成")
+        cls.executors = build_executors(MUSIC_CONFIG.get("executors", {}) or {})
+        tracing_config = MUSIC_CONFIG.get("tracing", {}) or {}
+        TRACER.configure(
+            slow_ms=float(tracing_config.get("slow_ms", 3000)),
+            keep=int(tracing_config.get("keep", 50)),
+            slow_log_file=str(tracing_config.get("slow_log_file", "") or ""),
+        )
+        cls.searcher = cls.build_searcher()
+        # 回调型指标在 /metrics 抓取时取值
+        metrics.INDEX_SONGS.set_function(cls.searcher.index_size)
+        for name, executor in cls.executors.items():
+            metrics.EXECUTOR_QUEUE_LENGTH.labels(name).set_function(lambda executor=executor: executor.stats()["queued"])
+        upstream = str(cls.sync_config.get("upstream") or "").strip()
+        if upstream and not cls.searcher.read_only:
+            cls.index_sync = IndexSyncClient(
+                upstream,
+                cls.searcher,
+                path_map=cls.sync_config.get("path_map", {}) or {},
+            )
         cls._ensure_ffprobe_available()
-        cls.music_server = build_music_server(MUSIC_CONFIG.get("http", {}) or {})
+        # 索引接口会暴露曲库的完整路径，只在显式开启时提供
+        serve_index = bool(cls.sync_config.get("serve", False)) and not cls.searcher.read_only
+        cls.music_server = build_music_server(
+            MUSIC_CONFIG.get("http", {}) or {},
+            transcoder=build_transcode_cache(MUSIC_CONFIG.get("transcode", {}) or {}),
+            index_source=cls.searcher if serve_index else None,
+        )
         cls.music_server.start()
         logger.info("音乐 HTTP 服务已启动: %s", cls.music_server.base_url)
-
-        await cls.refresh_music_index("启动刷新")
-        if cls.refresh_interval_sec > 0:
-            cls.index_refresh_task = asyncio.create_task(cls.run_index_refresh_loop())
+        file_cache_stats = cls.music_server.file_cache_stats
+        metrics.FILE_CACHE_LOOKUPS.labels("hit").set_function(lambda: file_cache_stats()["hits"])
+        metrics.FILE_CACHE_LOOKUPS.labels("miss").set_function(lambda: file_cache_stats()["misses"])
+        metrics.FILE_CACHE_DISCARDS.labels("invalidation").set_function(lambda: file_cache_stats()["invalidations"])
+        metrics.FILE_CACHE_DISCARDS.labels("eviction").set_function(lambda: file_cache_stats()["evictions"])
+        metrics.FILE_CACHE_ENTRIES.set_function(lambda: file_cache_stats()["entries"])
+
+        if cls.fast_start:
+            load_task = asyncio.create_task(cls.load_music_index())
         else:
-            logger.info("曲库索引定时刷新已禁用: refresh_interval_sec=%.1f", cls.refresh_interval_sec)
+            await cls.load_music_index()
+            await cls.sync_music_index("启动同步")
+            result = await cls.refresh_music_index("启动刷新")
+            if result is not None:
+                cls.startup_timer.mark("启动刷新完成", f"歌曲数={result[0]}")
+        # 只读实例的索引由写入实例刷新
+        for root in [] if cls.searcher.read_only else cls.searcher.music_dirs:
+            interval_sec = cls.refresh_interval_for(root)
+            if interval_sec > 0:
+                cls.index_refresh_tasks.append(asyncio.create_task(cls.run_index_refresh_loop(root, interval_sec)))
+            else:
+                logger.info("曲库索引定时刷新已禁用: 目录=%s refresh_interval_sec=%.1f", root, interval_sec)
+        if cls.config_watch_interval_sec > 0:
+            cls.config_watch_task = asyncio.create_task(cls.run_config_watch_loop())
+        sync_interval_sec = float(cls.sync_config.get("interval_sec", 60))
+        if cls.index_sync is not None and sync_interval_sec > 0:
+            cls.index_sync_task = asyncio.create_task(cls.run_index_sync_loop(sync_interval_sec))
 
         try:
+            open_xiaoai_server.set_event_filter(
+                events=["instruction"],
+                namespace_hints=[*REPLY_NAMESPACE_HINTS, "speechrecognizer"],
+                name_hints=[*REPLY_NAME_HINTS, "recognizeresult"],
+                parse_new_line=True,
+            )
             open_xiaoai_server.register_fn("on_event", on_event_callback)
+            open_xiaoai_server.set_shell_session(
+                bool((MUSIC_CONFIG.get("shell_session", {}) or {}).get("enabled", True))
+            )
             server_task = open_xiaoai_server.start_server()
+            cls.startup_timer.mark("服务就绪", f"快速启动={cls.fast_start}")
+            if cls.fast_start:
+                cls.startup_refresh_task = asyncio.create_task(cls.run_startup_refresh(load_task))
             if sys.stdin.isatty():
                 command_task = asyncio.create_task(cls.command_loop())
                 done, pending = await asyncio.wait(
@@ -751,13 +1165,31 @@ class App:
                 server_task.cancel()
             if command_task:
                 command_task.cancel()
-            if cls.index_refresh_task:
-                cls.index_refresh_task.cancel()
+            if cls.config_watch_task:
+                cls.config_watch_task.cancel()
+            if cls.startup_refresh_task:
+                cls.startup_refresh_task.cancel()
+            if cls.index_sync_task:
+                cls.index_sync_task.cancel()
+            for task in cls.index_refresh_tasks:
+                task.cancel()
                 try:
-                    await cls.index_refresh_task
+                    await task
                 except asyncio.CancelledError:
                     pass
+            for session in list(cls.sessions.values()):
+                await session.close()
+            passed, dropped = open_xiaoai_server.event_filter_stats()
+            logger.info(
+                "事件统计: 回复捕获=%s Rust过滤 通过=%d 丢弃=%d",
+                cls.reply_capture_stats(),
+                passed,
+                dropped,
+            )
             cls.music_server.stop()
+            for executor in cls.executors.values():
+                logger.info("执行器统计: %s %s", executor.name, executor.stats())
+                executor.shutdown(wait=False, cancel_futures=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,257 @@
+"""进程内指标，按 Prometheus 文本格式导出（/metrics）。
+
+记录操作只做一次 bisect 和几次加法，可以放在搜索、解析、HTTP 发送等热路径上；
+回调型 Gauge 在抓取时才取值，平时没有开销。
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections.abc import Callable
+import math
+import threading
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+VOICE_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+BYTES_BUCKETS = (4 * 1024, 64 * 1024, 256 * 1024, 1024**2, 4 * 1024**2, 16 * 1024**2, 64 * 1024**2)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        # 无标签的指标预先创建唯一的子项，记录时不必查表
+        self._unlabeled = self.labels() if not self.labelnames else None
+        REGISTRY.register(self)
+
+    def labels(self, *values: object):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        if self._unlabeled is None:
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+        return self._unlabeled
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key: tuple[str, ...], child) -> list[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _render_child(self, key, child) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Callable[[], float] | None = None
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self.value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            return float(self.function())
+        return self.value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self._default().set_function(function)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def _render_child(self, key, child) -> list[str]:
+        try:
+            value = child.get()
+        except Exception:
+            return []
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        # 每个桶只记本桶的次数，导出时再累加
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, key, child) -> list[str]:
+        with child._lock:
+            counts = list(child.counts)
+            total_sum = child.sum
+            total_count = child.count
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total_sum)}")
+        lines.append(f"{self.name}_count{labels} {total_count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标重复注册: {metric.name}")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+VOICE_TO_PLAY_SECONDS = Histogram(
+    "xiaoai_voice_to_play_seconds",
+    "从 ASR 最终文本到首曲播放命令返回的耗时",
+    ("intent",),
+    buckets=VOICE_BUCKETS,
+)
+SEARCH_SECONDS = Histogram("xiaoai_search_seconds", "内存索引查询耗时", ("kind",))
+PROBE_SECONDS = Histogram("xiaoai_probe_seconds", "单个文件元信息解析耗时")
+RUN_SHELL_SECONDS = Histogram("xiaoai_run_shell_seconds", "音箱端 shell 命令往返耗时", ("command",))
+HTTP_RESPONSE_BYTES = Histogram(
+    "xiaoai_http_response_bytes",
+    "每次音频 HTTP 请求发送的字节数",
+    buckets=BYTES_BUCKETS,
+)
+HTTP_BYTES_SERVED = Counter("xiaoai_http_bytes_served_total", "音频 HTTP 服务累计发送字节数")
+HTTP_ACTIVE_STREAMS = Gauge("xiaoai_http_active_streams", "正在发送的音频 HTTP 请求数")
+INDEX_SONGS = Gauge("xiaoai_index_songs", "当前可搜索的歌曲数（去重后）")
+EXECUTOR_QUEUE_LENGTH = Gauge("xiaoai_executor_queue_length", "执行器中排队等待的任务数", ("executor",))
+INDEX_REFRESH_SECONDS = Gauge("xiaoai_index_refresh_seconds", "各目录最近一次索引刷新耗时", ("root",))
+FILE_CACHE_LOOKUPS = Gauge("xiaoai_file_cache_lookups", "音频文件句柄缓存累计查找次数", ("result",))
+FILE_CACHE_DISCARDS = Gauge("xiaoai_file_cache_discards", "音频文件句柄缓存累计移除条目数", ("reason",))
+FILE_CACHE_ENTRIES = Gauge("xiaoai_file_cache_entries", "音频文件句柄缓存当前条目数")
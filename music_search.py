@@ -3,14 +3,30 @@ from __future__ import annotations
 import logging
 import os
 import threading
+import time
+from concurrent.futures import Executor
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 
+import metrics
+from music_search_core import IndexBuildCancelled
+from music_search_core import IndexChangeLog
+from music_search_core import IndexProgress
 from music_search_core import MusicIndexer
 from music_search_core import MusicIndexStore
+from music_search_core import MusicRootUnavailable
 from music_search_core import MusicSearchEngine
+from music_search_core import SharedIndexReader
+from music_search_core import SharedIndexWriter
+from music_search_core import shard_index_file
+from music_search_core.models import IndexedSong
 
 
 logger = logging.getLogger(__name__)
 
+FIND_SECONDS = metrics.SEARCH_SECONDS.labels("find")
+RANDOM_PICK_SECONDS = metrics.SEARCH_SECONDS.labels("random")
+
 
 def normalize_keyword(text: str) -> str:
     return text.strip().strip("：:，,。！？!？")
@@ -33,23 +49,56 @@ def is_stop_play_command(text: str, stop_keywords: set[str] | list[str] | None =
 
 
 class MusicSearcher:
+    """按音乐目录分片的内存索引；各目录独立刷新与保存，查询时合并所有分片。"""
+
+    read_only = False
+
     def __init__(
         self,
         music_dirs: list[str] | None = None,
         max_results: int = 50,
         extensions: set[str] | None = None,
         index_file: str = "",
+        publish_every: int = 500,
+        publish_interval_sec: float = 5.0,
+        probe_executor: Executor | None = None,
+        probe_workers: int | None = None,
+        dedup: bool = True,
+        shared_index_file: str = "",
     ):
-        self.music_dirs = music_dirs or []
+        self.music_dirs = list(dict.fromkeys(os.path.abspath(os.path.expanduser(d)) for d in (music_dirs or [])))
         self.max_results = max_results
         self.extensions = set(extensions or set())
+        # 刷新过程中每解析 N 个文件或每隔 T 秒发布一次部分索引，0 表示只在完成时替换
+        self.publish_every = max(0, int(publish_every))
+        self.publish_interval_sec = max(0.0, float(publish_interval_sec))
+        # 多个目录中内容相同的歌曲在搜索和随机播放时只保留一首
+        self.dedup = dedup
+        self._shards: dict[str, list[IndexedSong]] = {root: [] for root in self.music_dirs}
         self._songs = []
+        self._loaded = False
         self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._refresh_cancel: dict[str, threading.Event] = {}
+        self._refresh_progress: dict[str, IndexProgress] = {}
+        # 各分片刷新或导入后的变化，供 /index/changes 增量同步；
+        # 变化相对各分片最后一次记录的内容计算，被取消的刷新发布的部分快照不作为比较基准
+        self._changes = IndexChangeLog()
+        self._recorded: dict[str, list[IndexedSong]] = {root: [] for root in self.music_dirs}
 
-        self._indexer = MusicIndexer(extensions=self.extensions)
+        self._indexer = MusicIndexer(
+            extensions=self.extensions,
+            metadata_workers=probe_workers,
+            executor=probe_executor,
+            on_probe=metrics.PROBE_SECONDS.observe,
+        )
         self._search_engine = MusicSearchEngine()
-        self._store = MusicIndexStore(index_file=os.path.abspath(index_file) if index_file else "")
-        self._load_from_file()
+        # 索引文件在首次查询或显式调用 load() 时才读取，构造本身不做 I/O
+        index_file = os.path.abspath(index_file) if index_file else ""
+        self._legacy_store = MusicIndexStore(index_file=index_file)
+        self._stores = {root: MusicIndexStore(shard_index_file(index_file, root)) for root in self.music_dirs}
+        # 配置共享索引文件时，本实例负责刷新并把合并结果发布给只读实例
+        self._shared_writer = SharedIndexWriter(shared_index_file) if shared_index_file else None
 
     def has_dirs(self) -> bool:
         return len(self.music_dirs) > 0
@@ -58,26 +107,224 @@ class MusicSearcher:
         with self._lock:
             return len(self._songs)
 
+    def shard_sizes(self) -> dict[str, int]:
+        with self._lock:
+            return {root: len(songs) for root, songs in self._shards.items()}
+
+    def load(self) -> int:
+        self._snapshot()
+        self._dedup()
+        self._publish_shared()
+        return self.index_size()
+
+    def refresh_progress(self) -> IndexProgress | None:
+        """正在刷新时返回各目录进度之和，空闲时返回 None。"""
+        with self._lock:
+            if not self._refresh_progress:
+                return None
+            total = IndexProgress(walking=False)
+            for progress in self._refresh_progress.values():
+                total.scanned += progress.scanned
+                total.probed += progress.probed
+                total.total += progress.total
+                total.reused += progress.reused
+                total.walking = total.walking or progress.walking
+            return total
+
+    def cancel_refresh(self, root: str | None = None) -> None:
+        with self._lock:
+            for item_root, cancel_event in self._refresh_cancel.items():
+                if root is None or item_root == root:
+                    cancel_event.set()
+
     def refresh_index(self) -> int:
+        """并行刷新所有目录，返回合并后的歌曲数。"""
+        if self.music_dirs:
+            with ThreadPoolExecutor(max_workers=len(self.music_dirs), thread_name_prefix="refresh-root") as pool:
+                list(pool.map(self.refresh_root, self.music_dirs))
+        return self.index_size()
+
+    def refresh_root(self, root: str) -> int:
+        """刷新单个目录的分片；同一目录新的刷新会取消进行中的刷新，被取消的一方抛出 IndexBuildCancelled。
+
+        目录不可访问时保留上一次的分片并返回其歌曲数。
+        """
+        cancel_event = threading.Event()
+        progress = IndexProgress()
+        start_time = time.monotonic()
         with self._lock:
-            previous = self._songs[:]
-        songs = self._indexer.build(self.music_dirs, previous_songs=previous)
+            if root in self._refresh_cancel:
+                self._refresh_cancel[root].set()
+            self._refresh_cancel[root] = cancel_event
+            self._refresh_progress[root] = progress
+        try:
+            self._snapshot()
+            with self._lock:
+                previous = self._shards.get(root, [])
+            songs = []
+            snapshots = self._indexer.iter_build(
+                [root],
+                previous_songs=previous,
+                progress=progress,
+                publish_every=self.publish_every,
+                publish_interval_sec=self.publish_interval_sec,
+                cancel_event=cancel_event,
+                require_dirs=True,
+            )
+            try:
+                for snapshot in snapshots:
+                    # 刷新期间查询使用最近一次发布的快照，发布即整体替换该分片
+                    with self._lock:
+                        if cancel_event.is_set():
+                            raise IndexBuildCancelled()
+                        self._publish_unlocked(root, snapshot.songs)
+                    songs = snapshot.songs
+                    if not snapshot.done:
+                        logger.info(
+                            "已发布部分索引: 目录=%s 歌曲数=%d 已扫描=%d 已解析=%d/%d",
+                            root,
+                            len(songs),
+                            progress.scanned,
+                            progress.probed,
+                            progress.total,
+                        )
+            except MusicRootUnavailable as exc:
+                with self._lock:
+                    self._publish_unlocked(root, previous)
+                logger.warning("音乐目录不可用，继续使用上次的索引分片: 目录=%s 歌曲数=%d 错误=%s", root, len(previous), exc)
+                return len(previous)
+            with self._lock:
+                self._changes.record(self._recorded.get(root, []), songs)
+                self._recorded[root] = songs
+            self._dedup()
+            with self._save_lock:
+                if cancel_event.is_set():
+                    raise IndexBuildCancelled()
+                self._stores[root].save(self._indexer.attach_sample_hashes(songs))
+            self._publish_shared()
+            metrics.INDEX_REFRESH_SECONDS.labels(root).set(time.monotonic() - start_time)
+            return len(songs)
+        finally:
+            with self._lock:
+                if self._refresh_cancel.get(root) is cancel_event:
+                    del self._refresh_cancel[root]
+                    del self._refresh_progress[root]
+
+    def export_snapshot(self) -> dict:
+        """导出全部分片（未去重，附带已计算的抽样哈希），供其他节点全量导入。"""
+        self._snapshot()
         with self._lock:
-            self._songs = songs
-        self._store.save(songs)
-        return len(songs)
+            songs = [song for shard in self._shards.values() for song in shard]
+            header = {"epoch": self._changes.epoch, "generation": self._changes.generation, "full": True}
+        return {**header, "songs": [song.to_dict() for song in self._indexer.attach_sample_hashes(songs)]}
+
+    def export_changes(self, epoch: str, since: int) -> dict:
+        """导出 since 之后的变化；epoch 不符或变化已不在保留范围内时退回全量快照。"""
+        self._snapshot()
+        with self._lock:
+            changes = self._changes.changes_since(epoch, since)
+            header = {"epoch": self._changes.epoch, "generation": self._changes.generation, "full": False}
+        if changes is None:
+            return self.export_snapshot()
+        upserts = [song for song in changes.values() if song is not None]
+        return {
+            **header,
+            "upserts": [song.to_dict() for song in self._indexer.attach_sample_hashes(upserts)],
+            "removed": [path for path, song in changes.items() if song is None],
+        }
+
+    def import_changes(self, payload: dict, path_map: dict[str, str] | None = None) -> int:
+        """导入其他节点导出的快照或增量，只接收落在本机音乐目录下的歌曲，返回变化条目数。
+
+        path_map 将对方的目录前缀映射为本机路径；导入的条目大小与修改时间和本地文件一致时，
+        之后的本地刷新会直接复用其元信息，不再调用 ffprobe。
+        """
+        path_map = path_map or {}
+
+        def local_path(path: str) -> str:
+            for remote, local in path_map.items():
+                remote = remote.rstrip("/") + "/"
+                if path.startswith(remote):
+                    return os.path.join(local, path[len(remote) :])
+            return path
+
+        def to_song(item: dict) -> IndexedSong:
+            song = IndexedSong.from_dict(item)
+            return replace(song, path=local_path(song.path))
+
+        self._snapshot()
+        changed = 0
+        touched = []
+        with self._lock:
+            if payload.get("full"):
+                incoming = [to_song(item) for item in payload.get("songs", []) if isinstance(item, dict)]
+                updates = {root: [] for root in self.music_dirs}
+                for song in incoming:
+                    root = self._root_of(song.path)
+                    if root is not None:
+                        updates[root].append(song)
+                # 对方没有任何歌曲的目录保持不变，避免对方未挂载该目录时清空本地分片
+                updates = {root: songs for root, songs in updates.items() if songs}
+            else:
+                upserts = [to_song(item) for item in payload.get("upserts", []) if isinstance(item, dict)]
+                removed = {local_path(str(path)) for path in payload.get("removed", [])}
+                updates = {}
+                for root in self.music_dirs:
+                    shard = {song.path: song for song in self._shards.get(root, [])}
+                    before = len(shard)
+                    dirty = False
+                    for path in removed:
+                        if shard.pop(path, None) is not None:
+                            dirty = True
+                    for song in upserts:
+                        if self._root_of(song.path) == root:
+                            shard[song.path] = song
+                            dirty = True
+                    if dirty or len(shard) != before:
+                        updates[root] = sorted(shard.values(), key=lambda item: item.path)
+            for root, songs in updates.items():
+                count = self._changes.record(self._recorded.get(root, []), songs)
+                self._recorded[root] = songs
+                if count:
+                    changed += count
+                    touched.append(root)
+                    self._shards[root] = songs
+            self._merge_unlocked()
+        if touched:
+            self._dedup()
+            with self._save_lock:
+                for root in touched:
+                    with self._lock:
+                        songs = self._shards[root]
+                    self._stores[root].save(self._indexer.attach_sample_hashes(songs))
+            self._publish_shared()
+        logger.info(
+            "已导入索引: 全量=%s 对方代数=%s 变化=%d 目录=%s",
+            bool(payload.get("full")),
+            payload.get("generation"),
+            changed,
+            touched,
+        )
+        return changed
+
+    def _root_of(self, path: str) -> str | None:
+        for root in self.music_dirs:
+            if path.startswith(root.rstrip(os.sep) + os.sep):
+                return root
+        return None
 
     def find(self, keyword: str) -> list[str]:
         keyword_lower = normalize_keyword(keyword).lower()
         if not keyword_lower:
             return []
-        with self._lock:
-            snapshot = self._songs[:]
+        snapshot = self._snapshot()
+        start_time = time.perf_counter()
         total_matches, selected = self._search_engine.search_with_count(
             snapshot,
             keyword_lower,
             self.max_results,
         )
+        FIND_SECONDS.observe(time.perf_counter() - start_time)
         logger.info(
             "内存搜索完成: 关键词=%s 总索引=%d 总匹配=%d 返回=%d 返回上限=%d",
             keyword,
@@ -89,9 +336,10 @@ class MusicSearcher:
         return selected
 
     def random_pick(self) -> list[str]:
-        with self._lock:
-            snapshot = self._songs[:]
+        snapshot = self._snapshot()
+        start_time = time.perf_counter()
         selected = self._search_engine.random_pick(snapshot, self.max_results)
+        RANDOM_PICK_SECONDS.observe(time.perf_counter() - start_time)
         logger.info(
             "随机选歌完成: 曲库总数=%d 返回=%d 返回上限=%d",
             len(snapshot),
@@ -100,9 +348,126 @@ class MusicSearcher:
         )
         return selected
 
-    def _load_from_file(self) -> None:
-        songs = self._store.load()
-        if not songs:
+    def _publish_unlocked(self, root: str, songs: list[IndexedSong]) -> None:
+        self._shards[root] = songs
+        self._merge_unlocked()
+
+    def _merge_unlocked(self) -> None:
+        songs = [song for shard in self._shards.values() for song in shard]
+        if self.dedup:
+            # 只用已缓存的哈希，发布时不读取文件
+            songs = self._indexer.collapse_duplicates(songs)
+        self._songs = songs
+
+    def _publish_shared(self) -> None:
+        if self._shared_writer is None:
+            return
+        with self._lock:
+            songs = self._songs
+        try:
+            self._shared_writer.publish(songs)
+        except OSError as exc:
+            logger.warning("发布共享索引失败: %s", exc)
+
+    def _dedup(self) -> None:
+        """在锁外为疑似重复的歌曲计算抽样哈希，有新结果时重新合并分片。"""
+        if not self.dedup:
             return
         with self._lock:
-            self._songs = songs
+            songs = [song for shard in self._shards.values() for song in shard]
+        if self._indexer.hash_duplicate_candidates(songs) == 0:
+            return
+        with self._lock:
+            before = len(self._songs)
+            self._merge_unlocked()
+            total = sum(len(shard) for shard in self._shards.values())
+            if len(self._songs) != before:
+                logger.info("重复歌曲已合并: 文件数=%d 去重后=%d", total, len(self._songs))
+
+    def _snapshot(self) -> list:
+        with self._lock:
+            if not self._loaded:
+                # 后台加载尚未完成时，先到的查询在锁上等待加载结果
+                self._load_from_file()
+            return self._songs[:]
+
+    def _load_from_file(self) -> None:
+        self._loaded = True
+        legacy: list[IndexedSong] | None = None
+        for root in self.music_dirs:
+            store = self._stores[root]
+            if store.exists():
+                self._shards[root] = store.load()
+                continue
+            # 升级前的单文件索引按目录拆分，下次刷新时写入各自的分片
+            if legacy is None:
+                legacy = self._legacy_store.load()
+            prefix = root.rstrip(os.sep) + os.sep
+            self._shards[root] = [song for song in legacy if song.path.startswith(prefix)]
+        self._recorded = dict(self._shards)
+        self._merge_unlocked()
+
+
+class SharedMusicSearcher:
+    """只读实例: 映射写入实例发布的共享索引文件查询，不扫描目录、不刷新、不在内存中保存歌曲。"""
+
+    read_only = True
+
+    def __init__(self, shared_index_file: str, music_dirs: list[str] | None = None, max_results: int = 50):
+        self.music_dirs = list(dict.fromkeys(os.path.abspath(os.path.expanduser(d)) for d in (music_dirs or [])))
+        self.max_results = max_results
+        self._reader = SharedIndexReader(shared_index_file)
+
+    @property
+    def generation(self) -> int:
+        return self._reader.generation
+
+    def has_dirs(self) -> bool:
+        return len(self.music_dirs) > 0
+
+    def index_size(self) -> int:
+        return self._reader.size()
+
+    def shard_sizes(self) -> dict[str, int]:
+        return {}
+
+    def load(self) -> int:
+        total = self._reader.size()
+        if self._reader.generation == 0:
+            logger.warning("共享索引尚未发布，等待写入实例完成刷新: 文件=%s", self._reader.index_file)
+        return total
+
+    def refresh_progress(self) -> IndexProgress | None:
+        return None
+
+    def cancel_refresh(self, root: str | None = None) -> None:
+        return None
+
+    def find(self, keyword: str) -> list[str]:
+        keyword_lower = normalize_keyword(keyword).lower()
+        if not keyword_lower:
+            return []
+        start_time = time.perf_counter()
+        total_matches, selected = self._reader.search_with_count(keyword_lower, self.max_results)
+        FIND_SECONDS.observe(time.perf_counter() - start_time)
+        logger.info(
+            "共享索引搜索完成: 关键词=%s 代数=%d 总匹配=%d 返回=%d 返回上限=%d",
+            keyword,
+            self._reader.generation,
+            total_matches,
+            len(selected),
+            self.max_results,
+        )
+        return selected
+
+    def random_pick(self) -> list[str]:
+        start_time = time.perf_counter()
+        selected = self._reader.random_pick(self.max_results)
+        RANDOM_PICK_SECONDS.observe(time.perf_counter() - start_time)
+        logger.info(
+            "随机选歌完成: 曲库总数=%d 返回=%d 返回上限=%d",
+            self._reader.size(),
+            len(selected),
+            self.max_results,
+        )
+        return selected
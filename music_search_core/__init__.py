@@ -1,9 +1,23 @@
+from .changelog import IndexChangeLog
+from .indexer import IndexBuildCancelled
 from .indexer import MusicIndexer
+from .indexer import MusicRootUnavailable
+from .models import IndexProgress
 from .search_engine import MusicSearchEngine
+from .shared_index import SharedIndexReader
+from .shared_index import SharedIndexWriter
 from .store import MusicIndexStore
+from .store import shard_index_file
 
 __all__ = [
+    "IndexBuildCancelled",
+    "IndexChangeLog",
+    "IndexProgress",
     "MusicIndexer",
+    "MusicRootUnavailable",
     "MusicSearchEngine",
     "MusicIndexStore",
+    "SharedIndexReader",
+    "SharedIndexWriter",
+    "shard_index_file",
 ]
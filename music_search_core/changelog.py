@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from collections import deque
+import secrets
+
+from music_search_core.models import IndexedSong
+
+
+class IndexChangeLog:
+    """记录索引每一代相对上一代的变化，供其他节点按代数增量同步。
+
+    epoch 每次进程启动随机生成，对方持有的代数来自其他 epoch 或早于保留范围时需要全量同步。
+    调用方负责加锁。
+    """
+
+    def __init__(self, max_generations: int = 64):
+        self.epoch = secrets.token_hex(4)
+        self.generation = 0
+        # 日志覆盖 (base, generation] 区间的变化
+        self._base = 0
+        self._entries: deque[tuple[int, dict[str, IndexedSong | None]]] = deque()
+        self._max_generations = max(int(max_generations), 1)
+
+    def record(self, old_songs: list[IndexedSong], new_songs: list[IndexedSong]) -> int:
+        """比较同一分片的新旧内容，有变化时生成新一代，返回变化条目数。"""
+        old_map = {song.path: song for song in old_songs}
+        changes: dict[str, IndexedSong | None] = {}
+        for song in new_songs:
+            if old_map.pop(song.path, None) != song:
+                changes[song.path] = song
+        for path in old_map:
+            changes[path] = None
+        if not changes:
+            return 0
+        self.generation += 1
+        self._entries.append((self.generation, changes))
+        while len(self._entries) > self._max_generations:
+            self._base = self._entries.popleft()[0]
+        return len(changes)
+
+    def changes_since(self, epoch: str, since: int) -> dict[str, IndexedSong | None] | None:
+        """返回 since 之后合并的变化（None 表示删除）；无法增量时返回 None。
+
+        epoch 一致说明对方已拿到本进程某一代的快照，since == generation 时返回空的变化，
+        即使本进程启动后索引从未变化（代数仍为 0）也不必重复传输全量。
+        """
+        if epoch != self.epoch or since < self._base or since > self.generation:
+            return None
+        merged: dict[str, IndexedSong | None] = {}
+        for generation, changes in self._entries:
+            if generation > since:
+                merged.update(changes)
+        return merged
@@ -1,18 +1,40 @@
 from __future__ import annotations
 
+from collections.abc import Callable
+from collections.abc import Iterator
+from concurrent.futures import Executor
+from concurrent.futures import FIRST_COMPLETED
 from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from dataclasses import replace
+import hashlib
 import json
 import logging
 import os
 import shutil
 import subprocess
+import threading
+import time
 
 from music_search_core.models import IndexedSong
+from music_search_core.models import IndexProgress
+from music_search_core.models import IndexSnapshot
 from music_search_core.models import SongMetadata
 
 
 logger = logging.getLogger(__name__)
 
+# 抽样哈希在文件头、中、尾各读取的字节数
+SAMPLE_BYTES = 16 * 1024
+
+
+class IndexBuildCancelled(Exception):
+    """刷新被更新的一次刷新取代。"""
+
+
+class MusicRootUnavailable(Exception):
+    """音乐目录不存在或遍历时出错（如网络挂载断开）。"""
+
 
 class MusicMetadataExtractor:
     def __init__(self):
@@ -21,11 +43,19 @@ class MusicMetadataExtractor:
     def extract(self, file_path: str) -> SongMetadata:
         if not self.ffprobe_path:
             raise RuntimeError("未检测到 ffprobe，无法解析音乐元信息")
-        tags = self._extract_by_ffprobe(file_path)
+        info = self._extract_by_ffprobe(file_path)
+        tags = info.get("tags", {})
+        if not isinstance(tags, dict):
+            tags = {}
+        try:
+            duration_ms = int(float(info.get("duration") or 0) * 1000)
+        except (TypeError, ValueError):
+            duration_ms = 0
         return SongMetadata(
             title=self._clean(tags.get("title")),
             artist=self._clean(tags.get("artist")),
             album=self._clean(tags.get("album")),
+            duration_ms=duration_ms,
         )
 
     def _extract_by_ffprobe(self, file_path: str) -> dict:
@@ -34,7 +64,7 @@ class MusicMetadataExtractor:
             "-v",
             "error",
             "-show_entries",
-            "format_tags=title,artist,album",
+            "format=duration:format_tags=title,artist,album",
             "-of",
             "json",
             file_path,
@@ -52,34 +82,78 @@ class MusicMetadataExtractor:
             payload = json.loads(result.stdout or "{}")
         except Exception:
             return {}
-        tags = payload.get("format", {}).get("tags", {})
-        return tags if isinstance(tags, dict) else {}
+        info = payload.get("format", {})
+        return info if isinstance(info, dict) else {}
 
     def _clean(self, value: object) -> str:
         return str(value or "").strip()
 
 
 class MusicIndexer:
-    def __init__(self, extensions: set[str] | None = None, metadata_workers: int | None = None):
+    def __init__(
+        self,
+        extensions: set[str] | None = None,
+        metadata_workers: int | None = None,
+        executor: Executor | None = None,
+        on_probe: Callable[[float], None] | None = None,
+    ):
         self.extensions = {str(ext).strip().lower() for ext in (extensions or set()) if str(ext).strip()}
         cpu_count = os.cpu_count() or 4
         default_workers = min(8, cpu_count)
         self.metadata_workers = max(1, int(metadata_workers or default_workers))
+        # 传入共享执行器时解析任务在其中运行，否则每次刷新临时创建线程池
+        self.executor = executor
+        # 每解析完一个文件回调一次耗时（秒），用于统计
+        self.on_probe = on_probe
         self._metadata_extractor = MusicMetadataExtractor()
+        # 抽样哈希缓存: (路径, 大小, 修改时间) -> 哈希，文件未变化时不再读取
+        self._hash_cache: dict[tuple[str, int, int], str] = {}
+        self._hash_lock = threading.Lock()
 
     def build(
         self,
         music_dirs: list[str],
         previous_songs: list[IndexedSong] | None = None,
     ) -> list[IndexedSong]:
+        songs: list[IndexedSong] = []
+        for snapshot in self.iter_build(music_dirs, previous_songs=previous_songs):
+            songs = snapshot.songs
+        return songs
+
+    def iter_build(
+        self,
+        music_dirs: list[str],
+        previous_songs: list[IndexedSong] | None = None,
+        progress: IndexProgress | None = None,
+        publish_every: int = 0,
+        publish_interval_sec: float = 0,
+        cancel_event: threading.Event | None = None,
+        require_dirs: bool = False,
+    ) -> Iterator[IndexSnapshot]:
+        """逐步产出索引快照，最后一个快照 done=True 为完整结果。
+
+        publish_every / publish_interval_sec 大于 0 时，遍历完成后先产出一次仅含文件名的快照，
+        之后每解析 N 个文件或每隔 T 秒产出一次部分快照；cancel_event 置位后抛出 IndexBuildCancelled。
+        require_dirs 为 True 时，目录不可访问或遍历出错会抛出 MusicRootUnavailable，而不是跳过。
+        """
+        progress = progress or IndexProgress()
+        partial = publish_every > 0 or publish_interval_sec > 0
         candidates: list[tuple[str, str, int, int]] = []
         logger.info("开始刷新曲库索引: 目录=%s", music_dirs)
+        def on_walk_error(exc: OSError):
+            # 子目录无权限照常跳过，其余错误说明目录整体不可靠，保留上次的结果
+            if require_dirs and not isinstance(exc, PermissionError):
+                raise MusicRootUnavailable(f"{exc.filename}: {exc.strerror or exc}") from exc
+
         for directory in music_dirs:
             directory = os.path.abspath(os.path.expanduser(directory))
             if not os.path.isdir(directory):
+                if require_dirs:
+                    raise MusicRootUnavailable(directory)
                 logger.warning("跳过无效音乐目录: %s", directory)
                 continue
-            for root, _, files in os.walk(directory):
+            for root, _, files in os.walk(directory, onerror=on_walk_error):
+                self._check_cancelled(cancel_event)
                 for name in files:
                     ext = os.path.splitext(name)[1].lower()
                     if self.extensions and ext not in self.extensions:
@@ -90,10 +164,13 @@ class MusicIndexer:
                     except Exception:
                         continue
                     candidates.append((path, name, int(stat_result.st_size), int(stat_result.st_mtime_ns)))
+                    progress.scanned += 1
 
+        progress.walking = False
         if not candidates:
             logger.info("曲库索引刷新完成: 总数=0")
-            return []
+            yield IndexSnapshot(songs=[], done=True)
+            return
 
         previous_map = {item.path: item for item in (previous_songs or [])}
         reused: list[IndexedSong] = []
@@ -105,23 +182,161 @@ class MusicIndexer:
                 reused.append(prev)
             else:
                 pending.append(item)
+        progress.reused = len(reused)
+        progress.total = len(pending)
 
-        if not pending:
-            songs = reused
-        elif self.metadata_workers <= 1:
-            songs = reused + [self._build_indexed_song(item) for item in pending]
-        else:
-            with ThreadPoolExecutor(max_workers=self.metadata_workers) as pool:
-                songs = reused + list(pool.map(self._build_indexed_song, pending))
-        songs.sort(key=lambda item: item.path)
+        # 尚未解析的文件先沿用旧条目，新文件只按文件名可搜；
+        # 占位条目 size/mtime 为 0，刷新被取消后下次不会误复用
+        entries: dict[str, IndexedSong] = {item.path: item for item in reused}
+        for path, name, _, _ in pending:
+            entries[path] = previous_map.get(path) or IndexedSong(path=path, name_lower=name.lower())
+
+        def snapshot(done: bool) -> IndexSnapshot:
+            songs = list(entries.values())
+            if done:
+                songs.sort(key=lambda item: item.path)
+            return IndexSnapshot(songs=songs, done=done)
+
+        if partial and pending:
+            yield snapshot(done=False)
+
+        last_count = 0
+        last_at = time.monotonic()
+        for song in self._probe_pending(pending, cancel_event):
+            entries[song.path] = song
+            progress.probed += 1
+            if not partial:
+                continue
+            now = time.monotonic()
+            if (publish_every > 0 and progress.probed - last_count >= publish_every) or (
+                publish_interval_sec > 0 and now - last_at >= publish_interval_sec
+            ):
+                last_count = progress.probed
+                last_at = now
+                yield snapshot(done=False)
+
+        result = snapshot(done=True)
         logger.info(
             "曲库索引刷新完成: 总数=%d 复用=%d 更新=%d 并行度=%d",
-            len(songs),
+            len(result.songs),
             len(reused),
             len(pending),
             self.metadata_workers,
         )
-        return songs
+        yield result
+
+    def _probe_pending(
+        self,
+        pending: list[tuple[str, str, int, int]],
+        cancel_event: threading.Event | None,
+    ) -> Iterator[IndexedSong]:
+        if self.metadata_workers <= 1:
+            for item in pending:
+                self._check_cancelled(cancel_event)
+                yield self._build_indexed_song(item)
+            return
+        if self.executor is not None:
+            yield from self._probe_with(self.executor, pending, cancel_event)
+            return
+        with ThreadPoolExecutor(max_workers=self.metadata_workers) as pool:
+            yield from self._probe_with(pool, pending, cancel_event)
+
+    def _probe_with(
+        self,
+        pool: Executor,
+        pending: list[tuple[str, str, int, int]],
+        cancel_event: threading.Event | None,
+    ) -> Iterator[IndexedSong]:
+        # 限制在途任务数，取消时不必等待全部已提交的解析完成
+        max_in_flight = self.metadata_workers * 4
+        items = iter(pending)
+        in_flight = set()
+        try:
+            while True:
+                self._check_cancelled(cancel_event)
+                for item in items:
+                    in_flight.add(pool.submit(self._build_indexed_song, item))
+                    if len(in_flight) >= max_in_flight:
+                        break
+                if not in_flight:
+                    return
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def hash_duplicate_candidates(self, songs: list[IndexedSong]) -> int:
+        """为大小与时长都相同的候选计算抽样哈希并缓存，返回本次新计算的文件数。
+
+        绝大多数歌曲的 (大小, 时长) 是唯一的，不会被读取。
+        """
+        buckets: dict[tuple[int, int], list[IndexedSong]] = {}
+        for song in songs:
+            self._seed_hash(song)
+            if song.size > 0:
+                buckets.setdefault((song.size, song.duration_ms), []).append(song)
+        computed = 0
+        for bucket in buckets.values():
+            if len(bucket) < 2:
+                continue
+            for song in bucket:
+                key = (song.path, song.size, song.mtime_ns)
+                with self._hash_lock:
+                    if key in self._hash_cache:
+                        continue
+                try:
+                    digest = sample_hash(song.path, song.size)
+                except OSError as exc:
+                    logger.debug("计算抽样哈希失败: 文件=%s 错误=%s", song.path, exc)
+                    continue
+                with self._hash_lock:
+                    self._hash_cache[key] = digest
+                computed += 1
+        # 只保留仍在索引中的路径，避免改名、删除后缓存无限增长；
+        # 按路径而非完整键判断，其他目录并发刷新时刚算出的哈希不会被误删
+        live_paths = {song.path for song in songs}
+        with self._hash_lock:
+            for key in [key for key in self._hash_cache if key[0] not in live_paths]:
+                del self._hash_cache[key]
+        if computed:
+            logger.info("重复歌曲检测: 新计算抽样哈希=%d", computed)
+        return computed
+
+    def collapse_duplicates(self, songs: list[IndexedSong]) -> list[IndexedSong]:
+        """按 (大小, 时长, 抽样哈希) 去重，保留先出现的一首；只使用已缓存的哈希，不读取文件。"""
+        seen: set[tuple[int, int, str]] = set()
+        unique: list[IndexedSong] = []
+        with self._hash_lock:
+            for song in songs:
+                # 索引文件中保存的哈希与条目的大小、修改时间对应，可直接使用
+                digest = self._hash_cache.get((song.path, song.size, song.mtime_ns)) or song.sample_hash
+                if digest:
+                    key = (song.size, song.duration_ms, digest)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                unique.append(song)
+        return unique
+
+    def attach_sample_hashes(self, songs: list[IndexedSong]) -> list[IndexedSong]:
+        """把缓存的哈希写回歌曲条目，随索引文件保存，重启后无需重新读取。"""
+        result = []
+        with self._hash_lock:
+            for song in songs:
+                digest = self._hash_cache.get((song.path, song.size, song.mtime_ns), "")
+                result.append(song if song.sample_hash == digest else replace(song, sample_hash=digest))
+        return result
+
+    def _seed_hash(self, song: IndexedSong):
+        if song.sample_hash and song.size > 0:
+            with self._hash_lock:
+                self._hash_cache.setdefault((song.path, song.size, song.mtime_ns), song.sample_hash)
+
+    def _check_cancelled(self, cancel_event: threading.Event | None):
+        if cancel_event is not None and cancel_event.is_set():
+            raise IndexBuildCancelled()
 
     def _safe_extract_metadata(self, file_path: str) -> SongMetadata:
         try:
@@ -131,7 +346,10 @@ class MusicIndexer:
 
     def _build_indexed_song(self, file_item: tuple[str, str, int, int]) -> IndexedSong:
         path, name, size, mtime_ns = file_item
+        start_time = time.perf_counter()
         metadata = self._safe_extract_metadata(path)
+        if self.on_probe is not None:
+            self.on_probe(time.perf_counter() - start_time)
         return IndexedSong(
             path=path,
             name_lower=name.lower(),
@@ -140,4 +358,18 @@ class MusicIndexer:
             album_lower=metadata.album.lower(),
             size=size,
             mtime_ns=mtime_ns,
+            duration_ms=metadata.duration_ms,
         )
+
+
+def sample_hash(path: str, size: int) -> str:
+    """读取文件头、中、尾各 SAMPLE_BYTES 字节计算哈希；小文件整体参与计算。"""
+    digest = hashlib.blake2b(str(size).encode("ascii"), digest_size=16)
+    with open(path, "rb") as file_obj:
+        if size <= SAMPLE_BYTES * 3:
+            digest.update(file_obj.read())
+        else:
+            for offset in (0, (size - SAMPLE_BYTES) // 2, size - SAMPLE_BYTES):
+                file_obj.seek(offset)
+                digest.update(file_obj.read(SAMPLE_BYTES))
+    return digest.hexdigest()
@@ -9,6 +9,7 @@ class SongMetadata:
     title: str = ""
     artist: str = ""
     album: str = ""
+    duration_ms: int = 0
 
 
 @dataclass(frozen=True)
@@ -20,6 +21,9 @@ class IndexedSong:
     album_lower: str = ""
     size: int = 0
     mtime_ns: int = 0
+    duration_ms: int = 0
+    # 仅对大小与时长相同的候选计算的抽样内容哈希，空串表示尚未计算
+    sample_hash: str = ""
 
     def to_dict(self) -> dict:
         return asdict(self)
@@ -28,6 +32,7 @@ class IndexedSong:
     def from_dict(data: dict) -> "IndexedSong":
         size = data.get("size", 0)
         mtime_ns = data.get("mtime_ns", 0)
+        duration_ms = data.get("duration_ms", 0)
         try:
             size = int(size)
         except Exception:
@@ -36,6 +41,10 @@ class IndexedSong:
             mtime_ns = int(mtime_ns)
         except Exception:
             mtime_ns = 0
+        try:
+            duration_ms = int(duration_ms)
+        except Exception:
+            duration_ms = 0
         return IndexedSong(
             path=str(data.get("path", "")),
             name_lower=str(data.get("name_lower", "")),
@@ -44,4 +53,23 @@ class IndexedSong:
             album_lower=str(data.get("album_lower", "")),
             size=size,
             mtime_ns=mtime_ns,
+            duration_ms=duration_ms,
+            sample_hash=str(data.get("sample_hash", "")),
         )
+
+
+@dataclass
+class IndexProgress:
+    # 已遍历到的音频文件数
+    scanned: int = 0
+    # 已解析元信息的文件数 / 需要解析的文件总数（遍历完成前为 0）
+    probed: int = 0
+    total: int = 0
+    reused: int = 0
+    walking: bool = True
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    songs: list[IndexedSong]
+    done: bool = False
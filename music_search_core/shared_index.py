@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+import logging
+import mmap
+import os
+import random
+import struct
+import threading
+
+from music_search_core.models import IndexedSong
+
+
+logger = logging.getLogger(__name__)
+
+
+# 文件布局: 头部 | 记录偏移表 (count + 1 个 uint64) | 记录数据
+# 每条记录为 "歌名\n标题\n歌手\n专辑\0路径"，搜索文本已转小写，可直接在映射上查找子串
+MAGIC = b"XAMIDX01"
+HEADER = struct.Struct("<8sQQ")
+HEADER_SIZE = 64
+
+
+def _clean_field(value: str) -> str:
+    return value.replace("\0", " ").replace("\n", " ")
+
+
+def read_generation(index_file: str) -> int:
+    """读取共享索引文件的代数，文件不存在或格式不符时返回 0。"""
+    try:
+        with open(index_file, "rb") as file_obj:
+            magic, generation, _ = HEADER.unpack(file_obj.read(HEADER.size))
+    except (OSError, struct.error):
+        return 0
+    return generation if magic == MAGIC else 0
+
+
+class SharedIndexWriter:
+    """把合并后的索引写成可被多个进程只读映射的文件，每次发布代数加一。"""
+
+    def __init__(self, index_file: str):
+        self.index_file = os.path.abspath(index_file)
+        self._lock = threading.Lock()
+        self.generation = read_generation(self.index_file)
+
+    def publish(self, songs: list[IndexedSong]) -> int:
+        with self._lock:
+            generation = self.generation + 1
+            offsets = [0]
+            chunks = []
+            position = 0
+            for song in songs:
+                text = "\n".join(
+                    _clean_field(field)
+                    for field in (song.name_lower, song.title_lower, song.artist_lower, song.album_lower)
+                )
+                chunk = f"{text}\0{song.path}".encode("utf-8", "surrogateescape")
+                chunks.append(chunk)
+                position += len(chunk)
+                offsets.append(position)
+
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            # 写临时文件后整体替换，已映射旧文件的读取方不受影响，下次检查时切换到新文件
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, "wb") as file_obj:
+                file_obj.write(HEADER.pack(MAGIC, generation, len(songs)).ljust(HEADER_SIZE, b"\0"))
+                file_obj.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+                for chunk in chunks:
+                    file_obj.write(chunk)
+            os.replace(tmp_file, self.index_file)
+            self.generation = generation
+        logger.info("共享索引已发布: 代数=%d 歌曲数=%d 文件=%s", generation, len(songs), self.index_file)
+        return generation
+
+
+class _MappedIndex:
+    def __init__(self, file_obj, stat_key: tuple[int, int, int]):
+        self.stat_key = stat_key
+        self.mm = mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.generation, self.count = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError("共享索引文件格式不符")
+        self.data_start = HEADER_SIZE + (self.count + 1) * 8
+        self.offsets = memoryview(self.mm)[HEADER_SIZE : self.data_start].cast("Q")
+
+    def record(self, index: int) -> tuple[int, int]:
+        return self.data_start + self.offsets[index], self.data_start + self.offsets[index + 1]
+
+    def path(self, index: int) -> str:
+        start, end = self.record(index)
+        split = self.mm.find(b"\0", start, end)
+        return self.mm[split + 1 : end].decode("utf-8", "surrogateescape")
+
+
+class SharedIndexReader:
+    """只读映射共享索引文件；查询前检查文件是否被替换，新一代无需解析即可使用。
+
+    多个进程映射同一文件时共享页缓存，实例增加不会增加索引占用的内存。
+    """
+
+    def __init__(self, index_file: str):
+        self.index_file = os.path.abspath(index_file)
+        self._lock = threading.Lock()
+        self._current: _MappedIndex | None = None
+
+    @property
+    def generation(self) -> int:
+        current = self._mapped()
+        return current.generation if current else 0
+
+    def size(self) -> int:
+        current = self._mapped()
+        return current.count if current else 0
+
+    def search_with_count(self, keyword_lower: str, limit: int) -> tuple[int, list[str]]:
+        current = self._mapped()
+        # 字段中的换行与 \0 在写入时已替换为空格，含分隔符的关键词只会跨字段误中
+        if current is None or not keyword_lower or "\n" in keyword_lower or "\0" in keyword_lower:
+            return 0, []
+        needle = keyword_lower.encode("utf-8")
+        mm = current.mm
+        matched: list[int] = []
+        position = current.data_start
+        while True:
+            hit = mm.find(needle, position)
+            if hit < 0:
+                break
+            index = bisect_right(current.offsets, hit - current.data_start) - 1
+            start, end = current.record(index)
+            # 命中位置在 \0 之后说明落在路径里，路径不参与搜索
+            if hit + len(needle) <= mm.find(b"\0", start, end):
+                matched.append(index)
+            position = end
+        total = len(matched)
+        if limit <= 0:
+            return total, []
+        random.shuffle(matched)
+        return total, [current.path(index) for index in matched[:limit]]
+
+    def random_pick(self, limit: int) -> list[str]:
+        current = self._mapped()
+        if current is None or limit <= 0 or current.count == 0:
+            return []
+        indexes = random.sample(range(current.count), min(limit, current.count))
+        return [current.path(index) for index in indexes]
+
+    def _mapped(self) -> _MappedIndex | None:
+        try:
+            stat_result = os.stat(self.index_file)
+        except OSError:
+            return self._current
+        stat_key = (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+        current = self._current
+        if current is not None and current.stat_key == stat_key:
+            return current
+        with self._lock:
+            current = self._current
+            if current is not None and current.stat_key == stat_key:
+                return current
+            try:
+                with open(self.index_file, "rb") as file_obj:
+                    mapped = _MappedIndex(file_obj, stat_key)
+            except (OSError, ValueError, struct.error) as exc:
+                logger.warning("映射共享索引失败，继续使用当前版本: 文件=%s 错误=%s", self.index_file, exc)
+                return current
+            # 旧映射在正在进行的查询结束、引用释放后自动关闭
+            self._current = mapped
+        logger.info("已映射共享索引: 代数=%d 歌曲数=%d", mapped.generation, mapped.count)
+        return mapped
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import logging
 import os
@@ -10,12 +11,24 @@ from music_search_core.models import IndexedSong
 logger = logging.getLogger(__name__)
 
 
+def shard_index_file(index_file: str, root: str) -> str:
+    """每个音乐目录一个分片文件: music_index.json -> music_index.<目录哈希>.json"""
+    if not index_file:
+        return ""
+    base, ext = os.path.splitext(index_file)
+    digest = hashlib.sha1(root.encode("utf-8")).hexdigest()[:12]
+    return f"{base}.{digest}{ext or '.json'}"
+
+
 class MusicIndexStore:
     def __init__(self, index_file: str):
         self.index_file = (index_file or "").strip()
 
+    def exists(self) -> bool:
+        return bool(self.index_file) and os.path.isfile(self.index_file)
+
     def load(self) -> list[IndexedSong]:
-        if not self.index_file or not os.path.isfile(self.index_file):
+        if not self.exists():
             return []
         try:
             with open(self.index_file, "r", encoding="utf-8") as file_obj:
@@ -29,7 +42,7 @@ class MusicIndexStore:
         for item in data:
             if isinstance(item, dict):
                 songs.append(IndexedSong.from_dict(item))
-        logger.info("已从索引文件加载歌曲: %d", len(songs))
+        logger.info("已从索引文件加载歌曲: %d 文件=%s", len(songs), self.index_file)
         return songs
 
     def save(self, songs: list[IndexedSong]) -> None:
@@ -38,7 +51,10 @@ class MusicIndexStore:
         try:
             os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
             payload = [item.to_dict() for item in songs]
-            with open(self.index_file, "w", encoding="utf-8") as file_obj:
+            # 先写临时文件再替换，写入中断时保留上一次完整的索引
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as file_obj:
                 json.dump(payload, file_obj, ensure_ascii=False)
+            os.replace(tmp_file, self.index_file)
         except Exception as exc:
             logger.warning("写入索引文件失败: %s", exc)
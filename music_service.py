@@ -1,14 +1,28 @@
+import gzip
+import json
 import logging
 import mimetypes
 import os
+import secrets
 import socket
 import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate
+from email.utils import parsedate_to_datetime
 from http.server import BaseHTTPRequestHandler
 from http.server import ThreadingHTTPServer
-from urllib.parse import quote
+from urllib.parse import parse_qs
 from urllib.parse import unquote
 from urllib.parse import urlparse
 
+import metrics
+from command_trace import TRACER
+from music_search import MusicSearcher
+from music_transcode import TranscodeCache
+from music_transcode import TranscodeJob
+
 
 logger = logging.getLogger(__name__)
 
@@ -24,13 +38,269 @@ def guess_local_ip() -> str:
         sock.close()
 
 
+def guess_content_type(file_path: str) -> str:
+    return mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+
+
+@dataclass
+class CachedFile:
+    path: str
+    fd: int
+    size: int
+    mtime_ns: int
+    ino: int
+    content_type: str
+    checked_at: float
+    refs: int = 0
+    evicted: bool = False
+
+
+class FileHandleCache:
+    def __init__(self, max_entries: int = 32, revalidate_sec: float = 5.0):
+        self.max_entries = max(int(max_entries), 1)
+        self.revalidate_sec = max(float(revalidate_sec), 0.0)
+        self._entries: OrderedDict[str, CachedFile] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def acquire(self, file_path: str) -> CachedFile:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry is not None and now - entry.checked_at < self.revalidate_sec:
+                self._entries.move_to_end(file_path)
+                entry.refs += 1
+                self.hits += 1
+                return entry
+
+        if entry is not None:
+            # 超过复核间隔，按路径重新 stat，文件被替换或修改后作废旧句柄
+            try:
+                stat_result = os.stat(file_path)
+            except OSError:
+                stat_result = None
+            with self._lock:
+                if self._entries.get(file_path) is entry:
+                    if (
+                        stat_result is not None
+                        and stat_result.st_mtime_ns == entry.mtime_ns
+                        and stat_result.st_size == entry.size
+                        and stat_result.st_ino == entry.ino
+                    ):
+                        entry.checked_at = now
+                        self._entries.move_to_end(file_path)
+                        entry.refs += 1
+                        self.hits += 1
+                        return entry
+                    self.invalidations += 1
+                    self._discard_unlocked(file_path)
+
+        fd = os.open(file_path, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+        try:
+            stat_result = os.fstat(fd)
+        except OSError:
+            os.close(fd)
+            raise
+        fresh = CachedFile(
+            path=file_path,
+            fd=fd,
+            size=int(stat_result.st_size),
+            mtime_ns=int(stat_result.st_mtime_ns),
+            ino=int(stat_result.st_ino),
+            content_type=guess_content_type(file_path),
+            checked_at=now,
+            refs=1,
+        )
+        with self._lock:
+            self.misses += 1
+            if file_path in self._entries:
+                self._discard_unlocked(file_path)
+            self._entries[file_path] = fresh
+            while len(self._entries) > self.max_entries:
+                self.evictions += 1
+                self._discard_unlocked(next(iter(self._entries)))
+        return fresh
+
+    def release(self, entry: CachedFile):
+        with self._lock:
+            entry.refs -= 1
+            if entry.evicted and entry.refs <= 0:
+                self._close(entry)
+
+    def clear(self):
+        with self._lock:
+            for path in list(self._entries):
+                self._discard_unlocked(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def _discard_unlocked(self, file_path: str):
+        entry = self._entries.pop(file_path, None)
+        if entry is None:
+            return
+        entry.evicted = True
+        # 仍有请求线程在读取时延迟关闭，避免 fd 被复用后读到其他文件
+        if entry.refs <= 0:
+            self._close(entry)
+
+    def _close(self, entry: CachedFile):
+        if entry.fd < 0:
+            return
+        try:
+            os.close(entry.fd)
+        except OSError:
+            pass
+        entry.fd = -1
+
+
+@dataclass(frozen=True)
+class PlayToken:
+    token: str
+    path: str
+    size: int
+    mtime_ns: int
+    content_type: str
+    transcode: bool = False
+
+
+class PlayTokenTable:
+    def __init__(self, ttl_sec: float = 12 * 3600, max_entries: int = 1024, token_bytes: int = 6):
+        self.ttl_sec = max(float(ttl_sec), 1.0)
+        self.max_entries = max(int(max_entries), 1)
+        self.token_bytes = max(int(token_bytes), 4)
+        # token -> (PlayToken, 过期时间)，按最近使用排序
+        self._entries: OrderedDict[str, tuple[PlayToken, float]] = OrderedDict()
+        self._tokens_by_path: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def issue(
+        self,
+        file_path: str,
+        size: int,
+        mtime_ns: int,
+        content_type: str,
+        transcode: bool = False,
+    ) -> PlayToken:
+        now = time.monotonic()
+        with self._lock:
+            token = self._tokens_by_path.get(file_path)
+            if token is None or token not in self._entries:
+                token = self._new_token_unlocked()
+            entry = PlayToken(
+                token=token,
+                path=file_path,
+                size=size,
+                mtime_ns=mtime_ns,
+                content_type=content_type,
+                transcode=transcode,
+            )
+            self._entries[token] = (entry, now + self.ttl_sec)
+            self._entries.move_to_end(token)
+            self._tokens_by_path[file_path] = token
+            self._evict_unlocked(now)
+        return entry
+
+    def lookup(self, token: str) -> PlayToken | None:
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(token)
+            if item is None:
+                return None
+            entry, expires_at = item
+            if expires_at <= now:
+                self._remove_unlocked(token)
+                return None
+            self._entries[token] = (entry, now + self.ttl_sec)
+            self._entries.move_to_end(token)
+            return entry
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _new_token_unlocked(self) -> str:
+        while True:
+            token = secrets.token_urlsafe(self.token_bytes)
+            if token not in self._entries:
+                return token
+
+    def _remove_unlocked(self, token: str):
+        item = self._entries.pop(token, None)
+        if item is None:
+            return
+        path = item[0].path
+        if self._tokens_by_path.get(path) == token:
+            del self._tokens_by_path[path]
+
+    def _evict_unlocked(self, now: float):
+        while len(self._entries) > self.max_entries:
+            self._remove_unlocked(next(iter(self._entries)))
+        # 最久未使用的排在前面，遇到未过期的即可停止
+        while self._entries:
+            token, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._remove_unlocked(token)
+
+
+class _CountingWriter:
+    """包装请求的 wfile，统计实际写出的字节数。"""
+
+    __slots__ = ("_raw", "written")
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.written = 0
+
+    def write(self, data) -> int:
+        result = self._raw.write(data)
+        self.written += len(data)
+        return result
+
+    def __getattr__(self, name: str):
+        return getattr(self._raw, name)
+
+
 class LocalMusicHttpServer:
-    def __init__(self, host: str, port: int, base_url: str):
+    CACHE_CONTROL = "private, no-cache"
+    MAX_RANGES = 16
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        base_url: str,
+        token_ttl_sec: float = 12 * 3600,
+        max_tokens: int = 1024,
+        file_cache_size: int = 32,
+        file_cache_revalidate_sec: float = 5.0,
+        transcoder: TranscodeCache | None = None,
+        index_source: MusicSearcher | None = None,
+    ):
         self.host = host
         self.port = port
         self.base_url = base_url.rstrip("/")
-        self._allowed_files: set[str] = set()
-        self._lock = threading.Lock()
+        self._tokens = PlayTokenTable(ttl_sec=token_ttl_sec, max_entries=max_tokens)
+        self._files = FileHandleCache(
+            max_entries=file_cache_size,
+            revalidate_sec=file_cache_revalidate_sec,
+        )
+        self._transcoder = transcoder
+        # 提供 /index/snapshot 与 /index/changes，其他节点据此同步索引而不必自己解析元信息
+        self._index_source = index_source
         self._server = ThreadingHTTPServer((self.host, self.port), self._build_handler())
         self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
 
@@ -43,8 +313,15 @@ class LocalMusicHttpServer:
                 path = unquote(parsed.path)
 
                 if path.startswith("/file/"):
-                    encoded = path.split("/", 3)[2] if len(path.split("/", 3)) >= 3 else ""
-                    server_ref._serve_file(self, encoded)
+                    server_ref._serve_file(self, server_ref._parse_token(path))
+                    return
+
+                if path == "/metrics":
+                    server_ref._serve_metrics(self)
+                    return
+
+                if path.startswith("/index/"):
+                    server_ref._serve_index(self, path, parse_qs(parsed.query))
                     return
 
                 self.send_response(404)
@@ -54,8 +331,7 @@ class LocalMusicHttpServer:
                 parsed = urlparse(self.path)
                 path = unquote(parsed.path)
                 if path.startswith("/file/"):
-                    encoded = path.split("/", 3)[2] if len(path.split("/", 3)) >= 3 else ""
-                    server_ref._serve_file(self, encoded, head_only=True)
+                    server_ref._serve_file(self, server_ref._parse_token(path), head_only=True)
                     return
                 self.send_response(404)
                 self.end_headers()
@@ -65,50 +341,178 @@ class LocalMusicHttpServer:
 
         return Handler
 
-    def _encode_path(self, path: str) -> str:
-        return path.encode("utf-8").hex()
+    def _parse_token(self, path: str) -> str:
+        # /file/<token>.<ext>，扩展名仅用于帮助播放器识别格式
+        segment = path.split("/", 3)[2] if len(path.split("/", 3)) >= 3 else ""
+        return segment.split(".", 1)[0]
 
-    def _decode_path(self, encoded: str) -> str:
-        return bytes.fromhex(encoded).decode("utf-8")
+    def _serve_metrics(self, handler: BaseHTTPRequestHandler):
+        body = metrics.REGISTRY.render().encode("utf-8")
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
 
-    def _serve_file(self, handler: BaseHTTPRequestHandler, encoded: str, head_only: bool = False):
+    def _serve_index(self, handler: BaseHTTPRequestHandler, path: str, query: dict[str, list[str]]):
+        if self._index_source is None or path not in {"/index/snapshot", "/index/changes"}:
+            handler.send_response(404)
+            handler.end_headers()
+            return
         try:
-            file_path = self._decode_path(encoded)
-        except Exception:
+            if path == "/index/snapshot":
+                payload = self._index_source.export_snapshot()
+            else:
+                since = int((query.get("since") or ["0"])[0])
+                epoch = (query.get("epoch") or [""])[0]
+                payload = self._index_source.export_changes(epoch, since)
+        except ValueError:
             handler.send_response(400)
             handler.end_headers()
             return
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        raw_size = len(body)
+        gzipped = "gzip" in (handler.headers.get("Accept-Encoding") or "")
+        if gzipped:
+            body = gzip.compress(body, compresslevel=6)
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.send_header("Cache-Control", "no-store")
+        if gzipped:
+            handler.send_header("Content-Encoding", "gzip")
+        handler.end_headers()
+        handler.wfile.write(body)
+        logger.info(
+            "已导出索引: 路径=%s 全量=%s 代数=%s 原始字节=%d 发送字节=%d",
+            path,
+            payload.get("full"),
+            payload.get("generation"),
+            raw_size,
+            len(body),
+        )
 
-        with self._lock:
-            is_allowed = file_path in self._allowed_files
-        if not is_allowed:
-            handler.send_response(403)
+    def _serve_file(self, handler: BaseHTTPRequestHandler, token: str, head_only: bool = False):
+        writer = _CountingWriter(handler.wfile)
+        handler.wfile = writer
+        metrics.HTTP_ACTIVE_STREAMS.inc()
+        try:
+            self._serve_file_inner(handler, token, head_only)
+        finally:
+            metrics.HTTP_ACTIVE_STREAMS.dec()
+            metrics.HTTP_RESPONSE_BYTES.observe(writer.written)
+            metrics.HTTP_BYTES_SERVED.inc(writer.written)
+
+    def _serve_file_inner(self, handler: BaseHTTPRequestHandler, token: str, head_only: bool):
+        entry = self._tokens.lookup(token) if token else None
+        if entry is None:
+            handler.send_response(404)
             handler.end_headers()
             return
+        # 音箱首次请求命令签发的链接，结束该命令的耗时追踪
+        TRACER.on_request(entry.token)
 
-        if not os.path.isfile(file_path):
+        try:
+            cached = self._files.acquire(entry.path)
+        except OSError:
             handler.send_response(404)
             handler.end_headers()
             return
+        try:
+            if cached.size != entry.size or cached.mtime_ns != entry.mtime_ns:
+                # 令牌签发后文件有变动，以当前文件为准
+                entry = self._tokens.issue(
+                    entry.path,
+                    cached.size,
+                    cached.mtime_ns,
+                    cached.content_type,
+                    transcode=entry.transcode,
+                )
+            if entry.transcode and self._transcoder is not None:
+                if self._serve_transcoded(handler, entry, head_only):
+                    return
+            self._send_file(handler, entry, cached.fd, head_only)
+        finally:
+            self._files.release(cached)
+
+    def _serve_transcoded(self, handler: BaseHTTPRequestHandler, entry: PlayToken, head_only: bool) -> bool:
+        cached_path, job = self._transcoder.get_or_start(entry.path, entry.size, entry.mtime_ns)
+        if cached_path:
+            try:
+                cached = self._files.acquire(cached_path)
+            except OSError:
+                return False
+            try:
+                output = PlayToken(
+                    token=entry.token,
+                    path=cached_path,
+                    size=cached.size,
+                    mtime_ns=cached.mtime_ns,
+                    content_type=self._transcoder.content_type,
+                )
+                self._send_file(handler, output, cached.fd, head_only)
+            finally:
+                self._files.release(cached)
+            return True
+
+        if job is None:
+            # 近期转码失败过，直接回退原文件
+            return False
+        # 转码尚未完成，等到首批数据后边转边发；失败则回退原文件
+        if not job.wait_for_output(timeout_sec=10.0):
+            logger.warning("转码未产出数据，回退原文件: %s", entry.path)
+            return False
+        handler.send_response(200)
+        handler.send_header("Content-Type", self._transcoder.content_type)
+        handler.send_header("Accept-Ranges", "none")
+        handler.send_header("Cache-Control", "no-store")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        if not head_only:
+            self._copy_transcode_output(handler, job)
+        return True
 
-        content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
-        file_size = os.path.getsize(file_path)
-        range_header = handler.headers.get("Range")
-
-        start = 0
-        end = file_size - 1
-        status = 200
+    def _copy_transcode_output(self, handler: BaseHTTPRequestHandler, job: TranscodeJob):
+        try:
+            for chunk in job.iter_chunks():
+                handler.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        except OSError as exc:
+            logger.warning("读取转码输出失败: 路径=%s 错误=%s", job.source_path, exc)
+        finally:
+            handler.close_connection = True
+
+    def _send_file(self, handler: BaseHTTPRequestHandler, entry: PlayToken, fd: int, head_only: bool):
+        content_type = entry.content_type
+        file_size = entry.size
+        mtime_sec = int(entry.mtime_ns // 1_000_000_000)
+        etag = self._build_etag(file_size, entry.mtime_ns)
+
+        if self._is_not_modified(handler, etag, mtime_sec):
+            handler.send_response(304)
+            self._send_validator_headers(handler, etag, mtime_sec)
+            handler.end_headers()
+            return
 
-        if range_header:
+        ranges: list[tuple[int, int]] = []
+        range_header = handler.headers.get("Range")
+        if range_header and self._is_range_applicable(handler.headers.get("If-Range"), etag, mtime_sec):
             parsed = self._parse_range_header(range_header, file_size)
             if parsed is None:
                 handler.send_response(416)
                 handler.send_header("Content-Range", f"bytes */{file_size}")
+                self._send_validator_headers(handler, etag, mtime_sec)
                 handler.end_headers()
                 return
-            start, end = parsed
-            status = 206
+            ranges = parsed
+
+        if len(ranges) > 1:
+            self._send_multipart_ranges(handler, fd, content_type, file_size, ranges, etag, mtime_sec, head_only)
+            return
 
+        start, end = ranges[0] if ranges else (0, file_size - 1)
+        status = 206 if ranges else 200
         content_length = end - start + 1
         handler.send_response(status)
         handler.send_header("Content-Type", content_type)
@@ -116,52 +520,177 @@ class LocalMusicHttpServer:
         handler.send_header("Content-Length", str(content_length))
         if status == 206:
             handler.send_header("Content-Range", f"bytes {start}-{end}/{file_size}")
+        self._send_validator_headers(handler, etag, mtime_sec)
         handler.end_headers()
 
         if head_only:
             return
 
-        with open(file_path, "rb") as file_obj:
-            file_obj.seek(start)
-            remaining = content_length
-            while remaining > 0:
-                chunk = file_obj.read(min(64 * 1024, remaining))
-                if not chunk:
-                    break
-                try:
-                    handler.wfile.write(chunk)
-                except (BrokenPipeError, ConnectionResetError):
-                    break
-                remaining -= len(chunk)
-
-    def _parse_range_header(self, range_header: str, file_size: int) -> tuple[int, int] | None:
+        self._copy_file_range(handler, fd, start, content_length)
+
+    def _send_multipart_ranges(
+        self,
+        handler: BaseHTTPRequestHandler,
+        fd: int,
+        content_type: str,
+        file_size: int,
+        ranges: list[tuple[int, int]],
+        etag: str,
+        mtime_sec: int,
+        head_only: bool,
+    ):
+        boundary = secrets.token_hex(12)
+        part_headers = [
+            (
+                f"\r\n--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+            ).encode("ascii")
+            for start, end in ranges
+        ]
+        closing = f"\r\n--{boundary}--\r\n".encode("ascii")
+        content_length = (
+            sum(len(item) for item in part_headers)
+            + sum(end - start + 1 for start, end in ranges)
+            + len(closing)
+        )
+        handler.send_response(206)
+        handler.send_header("Content-Type", f"multipart/byteranges; boundary={boundary}")
+        handler.send_header("Accept-Ranges", "bytes")
+        handler.send_header("Content-Length", str(content_length))
+        self._send_validator_headers(handler, etag, mtime_sec)
+        handler.end_headers()
+
+        if head_only:
+            return
+
+        for part_header, (start, end) in zip(part_headers, ranges):
+            try:
+                handler.wfile.write(part_header)
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            if not self._copy_file_range(handler, fd, start, end - start + 1):
+                return
+        try:
+            handler.wfile.write(closing)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def _copy_file_range(self, handler: BaseHTTPRequestHandler, fd: int, start: int, length: int) -> bool:
+        # pread 不改变共享 fd 的偏移量，多个请求线程可同时读取同一句柄
+        offset = start
+        remaining = length
+        while remaining > 0:
+            try:
+                chunk = os.pread(fd, min(64 * 1024, remaining), offset)
+            except OSError as exc:
+                logger.warning("读取音乐文件失败: fd=%d error=%s", fd, exc)
+                handler.close_connection = True
+                return False
+            if not chunk:
+                # 文件在发送过程中变短，已发出的 Content-Length 无法满足，关闭连接让客户端感知截断
+                logger.warning("音乐文件提前结束: fd=%d 缺少字节=%d", fd, remaining)
+                handler.close_connection = True
+                return False
+            try:
+                handler.wfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                return False
+            offset += len(chunk)
+            remaining -= len(chunk)
+        return True
+
+    def _build_etag(self, file_size: int, mtime_ns: int) -> str:
+        # 与曲库索引一致，使用 size + mtime_ns 作为强校验值
+        return f'"{file_size:x}-{mtime_ns:x}"'
+
+    def _send_validator_headers(self, handler: BaseHTTPRequestHandler, etag: str, mtime_sec: int):
+        handler.send_header("ETag", etag)
+        handler.send_header("Last-Modified", formatdate(mtime_sec, usegmt=True))
+        handler.send_header("Cache-Control", self.CACHE_CONTROL)
+
+    def _is_not_modified(self, handler: BaseHTTPRequestHandler, etag: str, mtime_sec: int) -> bool:
+        if_none_match = handler.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [item.strip() for item in if_none_match.split(",") if item.strip()]
+            if "*" in tags:
+                return True
+            # If-None-Match 使用弱比较
+            return any(self._strip_weak_prefix(tag) == etag for tag in tags)
+
+        if_modified_since = handler.headers.get("If-Modified-Since")
+        if if_modified_since:
+            since_sec = self._parse_http_date(if_modified_since)
+            return since_sec is not None and mtime_sec <= since_sec
+        return False
+
+    def _is_range_applicable(self, if_range: str | None, etag: str, mtime_sec: int) -> bool:
+        if not if_range:
+            return True
+        value = if_range.strip()
+        if value.startswith('"') or value.startswith("W/"):
+            # If-Range 使用强比较，弱 ETag 永不匹配
+            return value == etag
+        since_sec = self._parse_http_date(value)
+        return since_sec is not None and since_sec == mtime_sec
+
+    def _strip_weak_prefix(self, tag: str) -> str:
+        return tag[2:] if tag.startswith("W/") else tag
+
+    def _parse_http_date(self, value: str) -> int | None:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except Exception:
+            return None
+        if parsed is None:
+            return None
+        return int(parsed.timestamp())
+
+    def _parse_range_header(self, range_header: str, file_size: int) -> list[tuple[int, int]] | None:
         value = range_header.strip().lower()
         if not value.startswith("bytes="):
             return None
 
-        spec = value.split("=", 1)[1].split(",", 1)[0].strip()
-        if "-" not in spec:
+        ranges: list[tuple[int, int]] = []
+        for spec in value.split("=", 1)[1].split(","):
+            spec = spec.strip()
+            if not spec:
+                continue
+            if "-" not in spec:
+                return None
+            start_text, end_text = spec.split("-", 1)
+            try:
+                if start_text == "":
+                    suffix_len = int(end_text)
+                    if suffix_len <= 0:
+                        continue
+                    start = max(file_size - suffix_len, 0)
+                    end = file_size - 1
+                else:
+                    start = int(start_text)
+                    end = file_size - 1 if end_text == "" else int(end_text)
+                    if start < 0 or end < start:
+                        return None
+                    if start >= file_size:
+                        continue
+                    end = min(end, file_size - 1)
+            except Exception:
+                return None
+            if end >= start:
+                ranges.append((start, end))
+
+        if not ranges or len(ranges) > self.MAX_RANGES:
             return None
-        start_text, end_text = spec.split("-", 1)
+        return self._merge_ranges(ranges)
 
-        try:
-            if start_text == "":
-                suffix_len = int(end_text)
-                if suffix_len <= 0:
-                    return None
-                start = max(file_size - suffix_len, 0)
-                end = file_size - 1
+    def _merge_ranges(self, ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        merged: list[tuple[int, int]] = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
             else:
-                start = int(start_text)
-                end = file_size - 1 if end_text == "" else int(end_text)
-                if start < 0 or end < start:
-                    return None
-                if start >= file_size:
-                    return None
-                end = min(end, file_size - 1)
-            return start, end
-        except Exception:
-            return None
+                merged.append((start, end))
+        return merged
 
     def start(self):
         logger.info(
@@ -173,24 +702,67 @@ class LocalMusicHttpServer:
         self._thread.start()
 
     def stop(self):
-        logger.info("HTTP 服务停止")
+        logger.info("HTTP 服务停止: 文件缓存=%s", self._files.stats())
         self._server.shutdown()
         self._server.server_close()
+        self._files.clear()
+
+    def file_cache_stats(self) -> dict:
+        return self._files.stats()
 
     def create_file_url(self, file_path: str) -> str:
         file_path = os.path.abspath(file_path)
-        with self._lock:
-            self._allowed_files.add(file_path)
-        encoded = self._encode_path(file_path)
-        filename = quote(os.path.basename(file_path), safe="")
-        return f"{self.base_url}/file/{encoded}/{filename}"
-
+        transcode = self._transcoder is not None and self._transcoder.should_transcode(file_path)
+        # 签发链接只需 stat，文件句柄在音箱首次请求时才打开
+        stat_result = os.stat(file_path)
+        entry = self._tokens.issue(
+            file_path,
+            int(stat_result.st_size),
+            int(stat_result.st_mtime_ns),
+            guess_content_type(file_path),
+            transcode=transcode,
+        )
+        TRACER.expect_request(entry.token)
+        ext = self._transcoder.ext if transcode else os.path.splitext(file_path)[1].lower()
+        return f"{self.base_url}/file/{entry.token}{ext}"
 
-def build_music_server(http_config: dict) -> LocalMusicHttpServer:
+    def prepare_tracks(self, file_paths: list[str]):
+        if self._transcoder is None:
+            return
+        for file_path in file_paths:
+            file_path = os.path.abspath(file_path)
+            if not self._transcoder.should_transcode(file_path):
+                continue
+            try:
+                stat_result = os.stat(file_path)
+            except OSError:
+                continue
+            self._transcoder.prepare(file_path, int(stat_result.st_size), int(stat_result.st_mtime_ns))
+
+
+def build_music_server(
+    http_config: dict,
+    transcoder: TranscodeCache | None = None,
+    index_source: MusicSearcher | None = None,
+) -> LocalMusicHttpServer:
     port = int(http_config.get("port", 18080))
     base_url = str(http_config.get("base_url") or "").strip()
+    token_ttl_sec = float(http_config.get("token_ttl_sec", 12 * 3600))
+    max_tokens = int(http_config.get("max_tokens", 1024))
+    file_cache_size = int(http_config.get("file_cache_size", 32))
+    file_cache_revalidate_sec = float(http_config.get("file_cache_revalidate_sec", 5.0))
 
     if not base_url:
         base_url = f"http://{guess_local_ip()}:{port}"
 
-    return LocalMusicHttpServer(host="0.0.0.0", port=port, base_url=base_url)
+    return LocalMusicHttpServer(
+        host="0.0.0.0",
+        port=port,
+        base_url=base_url,
+        token_ttl_sec=token_ttl_sec,
+        max_tokens=max_tokens,
+        file_cache_size=file_cache_size,
+        file_cache_revalidate_sec=file_cache_revalidate_sec,
+        transcoder=transcoder,
+        index_source=index_source,
+    )
@@ -0,0 +1,308 @@
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+CODEC_PROFILES = {
+    "mp3": {
+        "args": ["-c:a", "libmp3lame", "-f", "mp3"],
+        "ext": ".mp3",
+        "content_type": "audio/mpeg",
+    },
+    # ADTS 可边转边输出，m4a 容器需要回写 moov，无法流式
+    "aac": {
+        "args": ["-c:a", "aac", "-f", "adts"],
+        "ext": ".aac",
+        "content_type": "audio/aac",
+    },
+}
+
+
+class TranscodeJob:
+    def __init__(self, key: str, source_path: str, part_path: str, final_path: str):
+        self.key = key
+        self.source_path = source_path
+        self.part_path = part_path
+        self.final_path = final_path
+        self.bytes_written = 0
+        self.done = False
+        self.failed = False
+        self.cond = threading.Condition()
+
+    def open_reader(self) -> int:
+        with self.cond:
+            # 完成时会在同一把锁内重命名，这里拿到的路径一定存在
+            path = self.final_path if self.done and not self.failed else self.part_path
+            return os.open(path, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+
+    def wait_for_output(self, timeout_sec: float) -> bool:
+        deadline = time.monotonic() + timeout_sec
+        with self.cond:
+            while self.bytes_written == 0 and not self.done:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            return self.bytes_written > 0
+
+    def iter_chunks(self, chunk_size: int = 64 * 1024):
+        fd = self.open_reader()
+        try:
+            offset = 0
+            while True:
+                with self.cond:
+                    while offset >= self.bytes_written and not self.done:
+                        self.cond.wait(1.0)
+                    available = self.bytes_written
+                    finished = self.done
+                if offset < available:
+                    chunk = os.pread(fd, min(chunk_size, available - offset), offset)
+                    if not chunk:
+                        return
+                    offset += len(chunk)
+                    yield chunk
+                elif finished:
+                    return
+        finally:
+            os.close(fd)
+
+
+class TranscodeCache:
+    def __init__(
+        self,
+        ffmpeg_path: str,
+        cache_dir: str,
+        max_bytes: int = 2 * 1024 * 1024 * 1024,
+        codec: str = "mp3",
+        bitrate: str = "192k",
+        extensions: set[str] | None = None,
+        max_background_jobs: int = 1,
+        failure_ttl_sec: float = 300,
+    ):
+        if codec not in CODEC_PROFILES:
+            raise ValueError(f"不支持的转码格式: {codec}")
+        self.ffmpeg_path = ffmpeg_path
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max(int(max_bytes), 0)
+        self.codec = codec
+        self.bitrate = str(bitrate)
+        self.extensions = {str(ext).strip().lower() for ext in (extensions or set()) if str(ext).strip()}
+        self.max_background_jobs = max(int(max_background_jobs), 0)
+        self.failure_ttl_sec = max(float(failure_ttl_sec), 0.0)
+        self.ext = CODEC_PROFILES[codec]["ext"]
+        self.content_type = CODEC_PROFILES[codec]["content_type"]
+        self._jobs: dict[str, TranscodeJob] = {}
+        # 转码失败的 cache_key -> 过期时间；期间直接回退原文件，不再为重试请求反复启动 ffmpeg
+        self._failed: dict[str, float] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._remove_stale_parts()
+
+    def should_transcode(self, file_path: str) -> bool:
+        return os.path.splitext(file_path)[1].lower() in self.extensions
+
+    def cache_key(self, file_path: str, size: int, mtime_ns: int) -> str:
+        raw = f"{file_path}\0{size}\0{mtime_ns}\0{self.codec}\0{self.bitrate}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def cached_path(self, key: str) -> str | None:
+        path = self._final_path(key)
+        try:
+            # 以 mtime 作为 LRU 访问时间
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def get_or_start(self, file_path: str, size: int, mtime_ns: int) -> tuple[str | None, TranscodeJob | None]:
+        """返回 (缓存文件, None) 或 (None, 转码任务)；近期转码失败过时返回 (None, None)，调用方应使用原文件。"""
+        key = self.cache_key(file_path, size, mtime_ns)
+        cached = self.cached_path(key)
+        if cached:
+            return cached, None
+        if self._recently_failed(key):
+            return None, None
+        return None, self._ensure_job(key, file_path)
+
+    def prepare(self, file_path: str, size: int, mtime_ns: int):
+        key = self.cache_key(file_path, size, mtime_ns)
+        if self.cached_path(key) or self._recently_failed(key):
+            return
+        with self._lock:
+            if key in self._jobs or len(self._jobs) >= self.max_background_jobs:
+                return
+        self._ensure_job(key, file_path)
+        logger.info("预转码下一首: %s", file_path)
+
+    def _recently_failed(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._failed.get(key)
+            if expires_at is None:
+                return False
+            if expires_at > now:
+                return True
+            del self._failed[key]
+            return False
+
+    def _ensure_job(self, key: str, file_path: str) -> TranscodeJob:
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                return job
+            job = TranscodeJob(
+                key=key,
+                source_path=file_path,
+                part_path=self._final_path(key) + ".part",
+                final_path=self._final_path(key),
+            )
+            self._jobs[key] = job
+        threading.Thread(target=self._run_job, args=(job,), name="transcode", daemon=True).start()
+        return job
+
+    def _run_job(self, job: TranscodeJob):
+        start_time = time.monotonic()
+        cmd = [
+            self.ffmpeg_path,
+            "-nostdin",
+            "-v",
+            "error",
+            "-i",
+            job.source_path,
+            "-vn",
+            "-b:a",
+            self.bitrate,
+            *CODEC_PROFILES[self.codec]["args"],
+            "pipe:1",
+        ]
+        ok = False
+        out_fd = -1
+        proc = None
+        # stderr 写入临时文件而不是管道：只读 stdout 时，ffmpeg 输出过多错误信息会写满 stderr 管道而卡住
+        stderr_file = tempfile.TemporaryFile()
+        try:
+            out_fd = os.open(job.part_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+            stdout_fd = proc.stdout.fileno()
+            while True:
+                chunk = os.read(stdout_fd, 64 * 1024)
+                if not chunk:
+                    break
+                os.write(out_fd, chunk)
+                with job.cond:
+                    job.bytes_written += len(chunk)
+                    job.cond.notify_all()
+            ok = proc.wait() == 0 and job.bytes_written > 0
+            if not ok:
+                stderr_file.seek(0)
+                stderr = stderr_file.read(4096).decode("utf-8", errors="replace").strip()
+                logger.warning("转码失败: 路径=%s 错误=%s", job.source_path, stderr or "-")
+        except Exception as exc:
+            logger.warning("转码失败: 路径=%s 错误=%s", job.source_path, exc)
+        finally:
+            if proc is not None and proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            if proc is not None:
+                proc.stdout.close()
+            if out_fd >= 0:
+                os.close(out_fd)
+            stderr_file.close()
+
+        with job.cond:
+            if ok:
+                os.replace(job.part_path, job.final_path)
+            else:
+                job.failed = True
+                self._safe_remove(job.part_path)
+            job.done = True
+            job.cond.notify_all()
+        with self._lock:
+            self._jobs.pop(job.key, None)
+            if not ok and self.failure_ttl_sec > 0:
+                now = time.monotonic()
+                # 顺带清理已过期的记录，避免失败文件很多时无限增长
+                for key in [key for key, expires_at in self._failed.items() if expires_at <= now]:
+                    del self._failed[key]
+                self._failed[job.key] = now + self.failure_ttl_sec
+
+        if ok:
+            logger.info(
+                "转码完成: 路径=%s 大小=%d 耗时=%.1f毫秒",
+                job.source_path,
+                job.bytes_written,
+                (time.monotonic() - start_time) * 1000,
+            )
+            self._enforce_budget()
+
+    def _enforce_budget(self):
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(self.ext):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat_result.st_mtime_ns, stat_result.st_size, path))
+            total += stat_result.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._safe_remove(path)
+            total -= size
+            logger.info("转码缓存淘汰: %s", path)
+
+    def _remove_stale_parts(self):
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith(".part"):
+                self._safe_remove(os.path.join(self.cache_dir, name))
+
+    def _final_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.ext)
+
+    def _safe_remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def build_transcode_cache(transcode_config: dict) -> TranscodeCache | None:
+    if not transcode_config.get("enabled", False):
+        return None
+    ffmpeg_path = shutil.which("ffmpeg")
+    if not ffmpeg_path:
+        logger.warning("已开启转码但未检测到 ffmpeg，转码功能已禁用")
+        return None
+    return TranscodeCache(
+        ffmpeg_path=ffmpeg_path,
+        cache_dir=str(transcode_config.get("cache_dir", "cache/transcode")),
+        max_bytes=int(transcode_config.get("cache_max_bytes", 2 * 1024 * 1024 * 1024)),
+        codec=str(transcode_config.get("codec", "mp3")).lower(),
+        bitrate=str(transcode_config.get("bitrate", "192k")),
+        extensions=set(transcode_config.get("extensions", [".flac", ".wav"])),
+        max_background_jobs=int(transcode_config.get("max_background_jobs", 1)),
+        failure_ttl_sec=float(transcode_config.get("failure_ttl_sec", 300)),
+    )
@@ -1,37 +1,90 @@
 import json
+import time
 
 import open_xiaoai_server
 
+import metrics
+from command_trace import span
+
+
+STOP_SCRIPT = "mphelper pause"
+
 
 def _escape_shell_single_quote(text: str) -> str:
     return text.replace("'", "'\"'\"'")
 
 
-async def run_shell(script: str, timeout_ms: float = 10_000):
-    result = await open_xiaoai_server.run_shell(script, timeout_ms)
+def _speak_script(text: str) -> str:
+    escaped = _escape_shell_single_quote(text)
+    return f"/usr/sbin/tts_play.sh '{escaped}'"
+
+
+def _play_url_script(url: str) -> str:
+    payload = {"url": url, "type": 1}
+    return f"ubus call mediaplayer player_play_url '{json.dumps(payload)}'"
+
+
+async def run_shell(
+    script: str,
+    timeout_ms: float = 10_000,
+    device_id: str | None = None,
+    command: str = "shell",
+):
+    # device_id 为空时发往最近连接的音箱；command 仅用于按命令统计往返耗时
+    start_time = time.perf_counter()
+    try:
+        with span(f"rpc:{command}"):
+            result = await open_xiaoai_server.run_shell(script, timeout_ms, device_id)
+    finally:
+        metrics.RUN_SHELL_SECONDS.labels(command).observe(time.perf_counter() - start_time)
     try:
         return json.loads(result)
     except Exception:
         return {"raw": result}
 
 
-async def speak_text(text: str):
-    escaped = _escape_shell_single_quote(text)
-    script = f"/usr/sbin/tts_play.sh '{escaped}'"
-    return await run_shell(script)
+async def run_shell_batch(
+    scripts: list[str],
+    timeout_ms: float = 10_000,
+    device_id: str | None = None,
+    command: str = "batch",
+):
+    # 多条命令合并为一次往返，按顺序执行并返回各自结果；
+    # timeout_ms 为每条命令的超时，与逐条调用 run_shell 时一致，整批按条数累加
+    start_time = time.perf_counter()
+    try:
+        with span(f"rpc:{command}"):
+            result = await open_xiaoai_server.run_shell_batch(scripts, timeout_ms * max(len(scripts), 1), device_id)
+    finally:
+        metrics.RUN_SHELL_SECONDS.labels(command).observe(time.perf_counter() - start_time)
+    try:
+        return json.loads(result)
+    except Exception:
+        return [{"raw": result} for _ in scripts]
+
+
+async def speak_text(text: str, device_id: str | None = None):
+    return await run_shell(_speak_script(text), device_id=device_id, command="speak")
 
 
-async def ask_xiaoai(text: str):
+async def ask_xiaoai(text: str, device_id: str | None = None):
     payload = {"tts": 1, "nlp": 1, "nlp_text": text}
     script = f"ubus call mibrain ai_service '{json.dumps(payload, ensure_ascii=False)}'"
-    return await run_shell(script)
+    return await run_shell(script, device_id=device_id, command="ask")
 
 
-async def play_music_url(url: str):
-    payload = {"url": url, "type": 1}
-    script = f"ubus call mediaplayer player_play_url '{json.dumps(payload)}'"
-    return await run_shell(script)
+async def play_music_url(url: str, device_id: str | None = None):
+    return await run_shell(_play_url_script(url), device_id=device_id, command="play_url")
+
+
+async def stop_playback(device_id: str | None = None):
+    return await run_shell(STOP_SCRIPT, device_id=device_id, command="stop")
+
+
+async def stop_and_speak(text: str, device_id: str | None = None):
+    return await run_shell_batch([STOP_SCRIPT, _speak_script(text)], device_id=device_id, command="stop_speak")
 
 
-async def stop_playback():
-    return await run_shell("mphelper pause")
+async def stop_speak_and_play(text: str, url: str, device_id: str | None = None):
+    scripts = [STOP_SCRIPT, _speak_script(text), _play_url_script(url)]
+    return await run_shell_batch(scripts, device_id=device_id, command="stop_speak_play")
@@ -0,0 +1,17 @@
+use pyo3::buffer::PyBuffer;
+use pyo3::exceptions::PyBufferError;
+use pyo3::prelude::*;
+
+/// 取出 Python 缓冲区（bytes / bytearray / memoryview）的连续内存，不做拷贝
+///
+/// 返回的切片只在 `buffer` 存活且持有 GIL 期间有效
+pub fn contiguous_bytes<'a>(buffer: &'a PyBuffer<u8>) -> PyResult<&'a [u8]> {
+    if !buffer.is_c_contiguous() {
+        return Err(PyBufferError::new_err("audio buffer must be C-contiguous"));
+    }
+    let len = buffer.len_bytes();
+    if len == 0 {
+        return Ok(&[]);
+    }
+    Ok(unsafe { std::slice::from_raw_parts(buffer.buf_ptr() as *const u8, len) })
+}
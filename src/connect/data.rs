@@ -2,6 +2,9 @@ use serde::{Deserialize, Serialize};
 use serde_json::Value;
 use uuid::Uuid;
 
+use super::frame::{decode_stream_frame, encode_stream_frame};
+use crate::base::AppError;
+
 #[derive(Debug, Serialize, Deserialize)]
 pub enum AppMessage {
     Request(Request),
@@ -28,6 +31,30 @@ impl Stream {
             data,
         }
     }
+
+    pub fn to_binary_frame(&self) -> Vec<u8> {
+        encode_stream_frame(&self.id, &self.tag, self.data.as_ref(), &self.bytes)
+    }
+
+    pub fn from_binary_frame(frame: Vec<u8>) -> Result<Self, AppError> {
+        let (header, bytes) = decode_stream_frame(frame)?;
+        Ok(Self {
+            id: header.id,
+            tag: header.tag,
+            bytes,
+            data: header.data,
+        })
+    }
+}
+
+/// 与 `Stream` 的 JSON 结构一致，但借用音频数据，避免先拷贝成 `Vec`
+#[derive(Debug, Serialize)]
+pub struct StreamRef<'a> {
+    pub id: &'a str,
+    pub tag: &'a str,
+    pub bytes: &'a [u8],
+    #[serde(skip_serializing_if = "Option::is_none")]
+    pub data: Option<&'a Value>,
 }
 
 #[derive(Debug, Clone, Serialize, Deserialize)]
@@ -85,3 +112,41 @@ impl Response {
         }
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use serde_json::json;
+
+    #[test]
+    fn stream_binary_frame_round_trip() {
+        let stream = Stream::new("play", vec![1, 2, 3], Some(json!({ "rate": 16000 })));
+        let decoded = Stream::from_binary_frame(stream.to_binary_frame()).unwrap();
+        assert_eq!(decoded.id, stream.id);
+        assert_eq!(decoded.tag, "play");
+        assert_eq!(decoded.bytes, vec![1, 2, 3]);
+        assert_eq!(decoded.data, stream.data);
+    }
+
+    #[test]
+    fn stream_ref_serializes_like_stream() {
+        let data = json!({ "seq": 1 });
+        let stream = Stream {
+            id: "id".to_string(),
+            tag: "play".to_string(),
+            bytes: vec![0, 128, 255],
+            data: Some(data.clone()),
+        };
+        let borrowed = StreamRef {
+            id: "id",
+            tag: "play",
+            bytes: &[0, 128, 255],
+            data: Some(&data),
+        };
+        assert_eq!(serde_json::to_string(&borrowed).unwrap(), serde_json::to_string(&stream).unwrap());
+        let without_data = StreamRef { data: None, ..borrowed };
+        let parsed: Stream = serde_json::from_slice(&serde_json::to_vec(&without_data).unwrap()).unwrap();
+        assert_eq!(parsed.bytes, vec![0, 128, 255]);
+        assert!(parsed.data.is_none());
+    }
+}
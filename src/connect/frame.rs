@@ -0,0 +1,113 @@
+//! Stream 消息的二进制帧格式
+//!
+//! ```text
+//! | magic "OXS\x01" (4) | header_len u32 BE (4) | header JSON {id, tag, data} | raw bytes |
+//! ```
+//!
+//! 音频数据不再经过 JSON 数字数组编码。本模块只依赖 serde，便于基准测试单独引用。
+
+use serde::{Deserialize, Serialize};
+use serde_json::Value;
+
+pub const STREAM_FRAME_MAGIC: &[u8; 4] = b"OXS\x01";
+const PREFIX_LEN: usize = STREAM_FRAME_MAGIC.len() + 4;
+
+#[derive(Debug, Serialize, Deserialize)]
+pub struct StreamHeader {
+    pub id: String,
+    pub tag: String,
+    #[serde(skip_serializing_if = "Option::is_none", default)]
+    pub data: Option<Value>,
+}
+
+#[derive(Serialize)]
+struct StreamHeaderRef<'a> {
+    id: &'a str,
+    tag: &'a str,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    data: Option<&'a Value>,
+}
+
+pub fn is_stream_frame(buf: &[u8]) -> bool {
+    buf.starts_with(STREAM_FRAME_MAGIC)
+}
+
+pub fn encode_stream_frame(id: &str, tag: &str, data: Option<&Value>, bytes: &[u8]) -> Vec<u8> {
+    let header = serde_json::to_vec(&StreamHeaderRef { id, tag, data }).unwrap();
+    let mut frame = Vec::with_capacity(PREFIX_LEN + header.len() + bytes.len());
+    frame.extend_from_slice(STREAM_FRAME_MAGIC);
+    frame.extend_from_slice(&(header.len() as u32).to_be_bytes());
+    frame.extend_from_slice(&header);
+    frame.extend_from_slice(bytes);
+    frame
+}
+
+/// 解析二进制帧，原地去掉帧头后复用缓冲区作为音频数据，不额外分配
+pub fn decode_stream_frame(
+    mut buf: Vec<u8>,
+) -> Result<(StreamHeader, Vec<u8>), Box<dyn std::error::Error>> {
+    if !is_stream_frame(&buf) || buf.len() < PREFIX_LEN {
+        return Err("invalid stream frame".into());
+    }
+    let mut len_bytes = [0u8; 4];
+    len_bytes.copy_from_slice(&buf[STREAM_FRAME_MAGIC.len()..PREFIX_LEN]);
+    let header_end = PREFIX_LEN + u32::from_be_bytes(len_bytes) as usize;
+    if header_end > buf.len() {
+        return Err("stream frame header is truncated".into());
+    }
+    let header = serde_json::from_slice::<StreamHeader>(&buf[PREFIX_LEN..header_end])?;
+    buf.drain(..header_end);
+    Ok((header, buf))
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use serde_json::json;
+
+    #[test]
+    fn round_trip_keeps_header_and_bytes() {
+        let data = json!({ "seq": 3 });
+        let audio: Vec<u8> = (0..=255).collect();
+        let frame = encode_stream_frame("id-1", "play", Some(&data), &audio);
+        assert!(is_stream_frame(&frame));
+
+        let (header, bytes) = decode_stream_frame(frame).unwrap();
+        assert_eq!(header.id, "id-1");
+        assert_eq!(header.tag, "play");
+        assert_eq!(header.data, Some(data));
+        assert_eq!(bytes, audio);
+    }
+
+    #[test]
+    fn header_without_data_and_empty_payload() {
+        let frame = encode_stream_frame("id-2", "record", None, &[]);
+        let header_len = u32::from_be_bytes(frame[4..8].try_into().unwrap()) as usize;
+        let header = std::str::from_utf8(&frame[PREFIX_LEN..PREFIX_LEN + header_len]).unwrap();
+        assert_eq!(header, r#"{"id":"id-2","tag":"record"}"#);
+
+        let (header, bytes) = decode_stream_frame(frame).unwrap();
+        assert_eq!(header.data, None);
+        assert!(bytes.is_empty());
+    }
+
+    #[test]
+    fn rejects_invalid_frames() {
+        // JSON 编码的 Stream 不是二进制帧
+        assert!(!is_stream_frame(br#"{"id":"1","tag":"record","bytes":[]}"#));
+        assert!(decode_stream_frame(b"OXS".to_vec()).is_err());
+        assert!(decode_stream_frame(b"OXS\x00\x00\x00\x00\x02{}".to_vec()).is_err());
+
+        // 声明的帧头长度超出实际数据
+        let mut truncated = STREAM_FRAME_MAGIC.to_vec();
+        truncated.extend_from_slice(&100u32.to_be_bytes());
+        truncated.extend_from_slice(b"{}");
+        assert!(decode_stream_frame(truncated).is_err());
+
+        // 帧头不是合法 JSON
+        let mut garbage = STREAM_FRAME_MAGIC.to_vec();
+        garbage.extend_from_slice(&2u32.to_be_bytes());
+        garbage.extend_from_slice(b"{x");
+        assert!(decode_stream_frame(garbage).is_err());
+    }
+}
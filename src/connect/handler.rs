@@ -8,9 +8,10 @@ use crate::base::AppError;
 
 use super::data::{AppMessage, Event, Request, Response, Stream};
 use super::message::MessageManager;
-use super::rpc::RPC;
 
-type Handler<T> = Arc<dyn Fn(T) -> BoxFuture<'static, Result<(), AppError>> + Send + Sync>;
+/// 处理函数的第一个参数为消息来源音箱的 device_id
+type Handler<T> =
+    Arc<dyn Fn(String, T) -> BoxFuture<'static, Result<(), AppError>> + Send + Sync>;
 
 pub struct MessageHandler<T> {
     handler: Arc<Mutex<Option<Handler<T>>>>,
@@ -30,13 +31,15 @@ impl<T> MessageHandler<T> {
 
     pub async fn set_handler<F, Fut>(&self, handler: F)
     where
-        F: Fn(T) -> Fut + Send + Sync + 'static,
+        F: Fn(String, T) -> Fut + Send + Sync + 'static,
         Fut: Future<Output = Result<(), AppError>> + Send + 'static,
     {
-        *self.handler.lock().await = Some(Arc::new(move |data| Box::pin(handler(data))));
+        *self.handler.lock().await = Some(Arc::new(move |device_id, data| {
+            Box::pin(handler(device_id, data))
+        }));
     }
 
-    pub async fn on(&self, data: T) -> Result<(), AppError> {
+    pub async fn on(&self, device_id: &str, data: T) -> Result<(), AppError> {
         let handler = {
             let guard = self.handler.lock().await;
             match &*guard {
@@ -44,7 +47,7 @@ impl<T> MessageHandler<T> {
                 None => return Err("handler is not initialized".into()),
             }
         };
-        handler(data).await
+        handler(device_id.to_string(), data).await
     }
 }
 
@@ -53,16 +56,18 @@ impl MessageHandler<Request> {
         &REQUEST_INSTANCE
     }
 
-    pub async fn on_request(&self, request: Request) -> Result<(), AppError> {
+    pub async fn on_request(
+        &self,
+        manager: &MessageManager,
+        request: Request,
+    ) -> Result<(), AppError> {
         let id = request.id.clone();
-        let response: Response = match RPC::instance().on_request(request).await {
+        let response: Response = match manager.rpc().on_request(request).await {
             Ok(resp) => Response { id, ..resp },
             Err(e) => Response::from_error(&id, e),
         };
         if let Ok(data) = serde_json::to_string(&AppMessage::Response(response)) {
-            MessageManager::instance()
-                .send(Message::Text(data.into()))
-                .await?;
+            manager.send(Message::Text(data.into())).await?;
         }
         Ok(())
     }
@@ -73,8 +78,12 @@ impl MessageHandler<Response> {
         &RESPONSE_INSTANCE
     }
 
-    pub async fn on_response(&self, response: Response) -> Result<(), AppError> {
-        RPC::instance().on_response(response).await;
+    pub async fn on_response(
+        &self,
+        manager: &MessageManager,
+        response: Response,
+    ) -> Result<(), AppError> {
+        manager.rpc().on_response(response).await;
         Ok(())
     }
 }
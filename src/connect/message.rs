@@ -1,19 +1,33 @@
 use futures::stream::{SplitSink, SplitStream};
 use futures::{SinkExt, StreamExt};
-use serde_json::Value;
+use serde_json::{json, Value};
 use std::future::Future;
-use std::sync::{Arc, LazyLock};
+use std::sync::atomic::{AtomicBool, AtomicU64, Ordering};
+use std::sync::Arc;
+use std::time::Instant;
 use tokio::net::TcpStream;
+use tokio::sync::mpsc;
 use tokio::sync::{Mutex, Semaphore};
 use tokio_tungstenite::MaybeTlsStream;
 use tokio_tungstenite::{tungstenite::Message, WebSocketStream};
+use uuid::Uuid;
 
 use super::rpc::RPC;
 use crate::base::AppError;
+use crate::shell_session::ShellSession;
 use crate::utils::task::TaskManager;
 
-use super::data::{AppMessage, Event, Request, Response, Stream};
+use super::data::{AppMessage, Event, Request, Response, Stream, StreamRef};
+use super::frame::{encode_stream_frame, is_stream_frame};
 use super::handler::MessageHandler;
+use super::stats::{queue_depth, MessageStats, Offered};
+
+/// 同一连接内最多并发处理的 Request 数
+const REQUEST_CONCURRENCY: usize = 32;
+/// Event 队列容量，按序处理；满时丢弃新到的事件并计数，读循环不等待，Response 不会被积压的事件挡住
+const EVENT_QUEUE_CAPACITY: usize = 256;
+/// Stream 队列容量，满时丢弃新到的音频帧，避免拖慢 Response 的处理
+const STREAM_QUEUE_CAPACITY: usize = 64;
 
 pub enum WsStream {
     Server(WebSocketStream<TcpStream>),
@@ -30,55 +44,147 @@ pub enum WsWriter {
     Client(SplitSink<WebSocketStream<MaybeTlsStream<TcpStream>>, Message>),
 }
 
+/// 单个音箱连接的消息通道，每个连接拥有独立的读写端与 RPC 表
 pub struct MessageManager {
+    device_id: String,
+    task_tag: String,
     semaphore: Arc<Semaphore>,
     reader: Arc<Mutex<Option<WsReader>>>,
     writer: Arc<Mutex<Option<WsWriter>>>,
+    rpc: RPC,
+    shell: ShellSession,
+    binary_streams: AtomicBool,
+    event_tx: mpsc::Sender<(Instant, Event)>,
+    stream_tx: mpsc::Sender<(Instant, Stream)>,
+    stats: MessageStats,
 }
 
-static INSTANCE: LazyLock<MessageManager> = LazyLock::new(MessageManager::new);
+static NEXT_CONNECTION_ID: AtomicU64 = AtomicU64::new(1);
 
 impl MessageManager {
-    fn new() -> Self {
-        Self {
-            reader: Arc::new(Mutex::new(None)),
-            writer: Arc::new(Mutex::new(None)),
-            semaphore: Arc::new(Semaphore::new(32)),
-        }
-    }
-
-    pub fn instance() -> &'static Self {
-        &INSTANCE
-    }
-
-    pub async fn init(&self, ws_stream: WsStream) {
-        match ws_stream {
+    pub async fn new(device_id: &str, ws_stream: WsStream) -> Arc<Self> {
+        let (reader, writer) = match ws_stream {
             WsStream::Client(stream) => {
                 let (tx, rx) = stream.split();
-                self.reader.lock().await.replace(WsReader::Client(rx));
-                self.writer.lock().await.replace(WsWriter::Client(tx));
+                (WsReader::Client(rx), WsWriter::Client(tx))
             }
             WsStream::Server(stream) => {
                 let (tx, rx) = stream.split();
-                self.reader.lock().await.replace(WsReader::Server(rx));
-                self.writer.lock().await.replace(WsWriter::Server(tx));
+                (WsReader::Server(rx), WsWriter::Server(tx))
             }
-        }
-        RPC::instance()
-            .init(|request| async {
-                let data = serde_json::to_string(&AppMessage::Request(request)).unwrap();
-                MessageManager::instance()
-                    .send(Message::Text(data.into()))
-                    .await
+        };
+        let connection_id = NEXT_CONNECTION_ID.fetch_add(1, Ordering::Relaxed);
+        let (event_tx, event_rx) = mpsc::channel(EVENT_QUEUE_CAPACITY);
+        let (stream_tx, stream_rx) = mpsc::channel(STREAM_QUEUE_CAPACITY);
+        let manager = Arc::new(Self {
+            device_id: device_id.to_string(),
+            task_tag: format!("MessageManager#{}", connection_id),
+            reader: Arc::new(Mutex::new(Some(reader))),
+            writer: Arc::new(Mutex::new(Some(writer))),
+            semaphore: Arc::new(Semaphore::new(REQUEST_CONCURRENCY)),
+            rpc: RPC::new(),
+            shell: ShellSession::new(),
+            binary_streams: AtomicBool::new(false),
+            event_tx,
+            stream_tx,
+            stats: MessageStats::default(),
+        });
+        manager.spawn_consumers(event_rx, stream_rx).await;
+
+        // 使用弱引用，避免 RPC 闭包与连接互相持有导致断开后无法释放
+        let weak = Arc::downgrade(&manager);
+        manager
+            .rpc
+            .init(move |request| {
+                let weak = weak.clone();
+                async move {
+                    let Some(manager) = weak.upgrade() else {
+                        return Err("connection is closed".into());
+                    };
+                    let data = serde_json::to_string(&AppMessage::Request(request)).unwrap();
+                    manager.send(Message::Text(data.into())).await
+                }
             })
             .await;
+        manager
+    }
+
+    pub fn device_id(&self) -> &str {
+        &self.device_id
+    }
+
+    pub fn rpc(&self) -> &RPC {
+        &self.rpc
+    }
+
+    /// 在音箱上执行脚本，优先复用常驻 shell 会话
+    pub async fn run_shell(&self, script: &str, timeout_millis: u64) -> Result<Value, String> {
+        self.shell
+            .run(&self.rpc, &self.device_id, script, timeout_millis)
+            .await
+    }
+
+    /// 对端支持二进制帧后，Stream 消息改用二进制帧发送，否则保持 JSON
+    pub fn set_binary_streams(&self, enabled: bool) {
+        if self.binary_streams.swap(enabled, Ordering::Relaxed) != enabled {
+            crate::pylog!(
+                "✅ Stream 格式: {} device_id={}",
+                if enabled { "binary" } else { "json" },
+                self.device_id
+            );
+        }
+    }
+
+    pub fn binary_streams(&self) -> bool {
+        self.binary_streams.load(Ordering::Relaxed)
+    }
+
+    /// 各类消息的队列深度、丢弃数与处理延迟
+    pub fn stats(&self) -> Value {
+        json!({
+            "event": self.stats.event.snapshot(queue_depth(&self.event_tx)),
+            "stream": self.stats.stream.snapshot(queue_depth(&self.stream_tx)),
+            "request": self.stats.request.snapshot(REQUEST_CONCURRENCY - self.semaphore.available_permits()),
+            "response": self.stats.response.snapshot(0),
+        })
+    }
+
+    /// 每个连接各有一个 Event 与 Stream 消费任务，同类消息按到达顺序处理
+    async fn spawn_consumers(
+        self: &Arc<Self>,
+        mut event_rx: mpsc::Receiver<(Instant, Event)>,
+        mut stream_rx: mpsc::Receiver<(Instant, Stream)>,
+    ) {
+        let weak = Arc::downgrade(self);
+        let events = tokio::spawn(async move {
+            while let Some((queued_at, event)) = event_rx.recv().await {
+                let Some(manager) = weak.upgrade() else { break };
+                let _ = MessageHandler::<Event>::instance()
+                    .on(&manager.device_id, event)
+                    .await;
+                manager.stats.event.on_processed(queued_at.elapsed());
+            }
+        });
+        TaskManager::instance().add(&self.task_tag, events).await;
+
+        let weak = Arc::downgrade(self);
+        let streams = tokio::spawn(async move {
+            while let Some((queued_at, stream)) = stream_rx.recv().await {
+                let Some(manager) = weak.upgrade() else { break };
+                let _ = MessageHandler::<Stream>::instance()
+                    .on(&manager.device_id, stream)
+                    .await;
+                manager.stats.stream.on_processed(queued_at.elapsed());
+            }
+        });
+        TaskManager::instance().add(&self.task_tag, streams).await;
     }
 
     pub async fn dispose(&self) {
         *self.reader.lock().await = None;
         *self.writer.lock().await = None;
-        RPC::instance().dispose().await;
-        TaskManager::instance().dispose("MessageManager").await;
+        self.rpc.dispose().await;
+        TaskManager::instance().dispose(&self.task_tag).await;
     }
 
     pub async fn send(&self, msg: Message) -> Result<(), AppError> {
@@ -99,9 +205,24 @@ impl MessageManager {
     pub async fn send_event(&self, event: &str, data: Option<Value>) -> Result<(), AppError> {
         let event: Event = Event::new(event, data);
         let data = serde_json::to_string(&AppMessage::Event(event)).unwrap();
-        MessageManager::instance()
-            .send(Message::Text(data.into()))
-            .await
+        self.send(Message::Text(data.into())).await
+    }
+
+    /// 按协商好的格式把音频数据直接编码为待发送的消息，数据只拷贝一次
+    pub fn encode_stream(&self, tag: &str, bytes: &[u8], data: Option<&Value>) -> Message {
+        let id = Uuid::new_v4().to_string();
+        let frame = if self.binary_streams() {
+            encode_stream_frame(&id, tag, data, bytes)
+        } else {
+            let stream = StreamRef {
+                id: &id,
+                tag,
+                bytes,
+                data,
+            };
+            serde_json::to_vec(&stream).unwrap()
+        };
+        Message::Binary(frame.into())
     }
 
     pub async fn send_stream(
@@ -110,13 +231,11 @@ impl MessageManager {
         bytes: Vec<u8>,
         data: Option<Value>,
     ) -> Result<(), AppError> {
-        let stream = serde_json::to_vec(&Stream::new(tag, bytes, data)).unwrap();
-        MessageManager::instance()
-            .send(Message::Binary(stream.into()))
-            .await
+        let msg = self.encode_stream(tag, &bytes, data.as_ref());
+        self.send(msg).await
     }
 
-    pub async fn process_messages(&self) -> Result<(), AppError> {
+    pub async fn process_messages(self: &Arc<Self>) -> Result<(), AppError> {
         if self.reader.lock().await.is_none() {
             return Err("WebSocket reader is not initialized".into());
         }
@@ -150,32 +269,65 @@ impl MessageManager {
     }
 
     async fn on_bytes(&self, bytes: Vec<u8>) -> Result<(), AppError> {
-        let data = serde_json::from_slice::<Stream>(&bytes)?;
-        MessageHandler::<Stream>::instance().on(data).await
+        let data = if is_stream_frame(&bytes) {
+            // 对端发来二进制帧，说明其也能解析二进制帧
+            self.set_binary_streams(true);
+            Stream::from_binary_frame(bytes)?
+        } else {
+            serde_json::from_slice::<Stream>(&bytes)?
+        };
+        // 录音帧允许丢弃，积压时不阻塞读循环
+        self.stats.stream.offer(&self.stream_tx, (Instant::now(), data));
+        Ok(())
+    }
+
+    fn enqueue_event(&self, event: Event) -> Result<(), AppError> {
+        match self.stats.event.offer(&self.event_tx, (Instant::now(), event)) {
+            Offered::Queued => Ok(()),
+            Offered::Dropped(dropped) => {
+                if dropped == 1 || dropped % 100 == 0 {
+                    crate::pylog!(
+                        "⚠️ Event 队列已满，丢弃事件: device_id={} 累计丢弃={}",
+                        self.device_id,
+                        dropped
+                    );
+                }
+                Ok(())
+            }
+            Offered::Closed => Err("event queue is closed".into()),
+        }
     }
 
-    async fn on_text(&self, text: String) -> Result<(), AppError> {
+    async fn on_text(self: &Arc<Self>, text: String) -> Result<(), AppError> {
         let msg = serde_json::from_str::<AppMessage>(&text)?;
 
         match msg {
             AppMessage::Request(request) => {
+                let manager = Arc::clone(self);
+                let queued_at = Instant::now();
                 self.run_concurrently(move || {
                     let request = request.clone();
+                    let manager = Arc::clone(&manager);
                     async move {
-                        MessageHandler::<Request>::instance()
-                            .on_request(request)
-                            .await?;
-                        Ok(())
+                        let result = MessageHandler::<Request>::instance()
+                            .on_request(&manager, request)
+                            .await;
+                        manager.stats.request.on_processed(queued_at.elapsed());
+                        result
                     }
                 })
                 .await
             }
             AppMessage::Response(response) => {
-                MessageHandler::<Response>::instance()
-                    .on_response(response)
-                    .await
+                // Response 只需唤醒等待中的 RPC 调用，直接在读循环内处理
+                let started = Instant::now();
+                let result = MessageHandler::<Response>::instance()
+                    .on_response(self, response)
+                    .await;
+                self.stats.response.on_processed(started.elapsed());
+                result
             }
-            AppMessage::Event(event) => MessageHandler::<Event>::instance().on(event).await,
+            AppMessage::Event(event) => self.enqueue_event(event),
             _ => Ok(()),
         }
     }
@@ -185,17 +337,32 @@ impl MessageManager {
         F: Fn() -> Fut + Send + Sync + 'static,
         Fut: Future<Output = Result<(), AppError>> + Send + 'static,
     {
-        let permit = match self.semaphore.clone().try_acquire_owned() {
-            Ok(permit) => permit,
-            Err(_) => self.semaphore.clone().acquire_owned().await?,
+        let semaphore = self.semaphore.clone();
+        let permit = match semaphore.clone().try_acquire_owned() {
+            Ok(permit) => Some(permit),
+            Err(_) => {
+                self.stats.request.on_backpressure();
+                None
+            }
         };
+        self.stats
+            .request
+            .on_enqueue(REQUEST_CONCURRENCY - self.semaphore.available_permits());
 
+        // 没有空闲名额时在任务内等待，读循环照常读取后续的 Response
         let task = tokio::spawn(async move {
+            let permit = match permit {
+                Some(permit) => permit,
+                None => match semaphore.acquire_owned().await {
+                    Ok(permit) => permit,
+                    Err(_) => return,
+                },
+            };
             let _ = run().await;
             drop(permit);
         });
 
-        TaskManager::instance().add("MessageManager", task).await;
+        TaskManager::instance().add(&self.task_tag, task).await;
         Ok(())
     }
 }
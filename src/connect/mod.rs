@@ -1,4 +1,7 @@
 pub mod data;
+pub mod frame;
 pub mod handler;
 pub mod message;
+pub mod registry;
 pub mod rpc;
+pub mod stats;
@@ -0,0 +1,79 @@
+use std::collections::HashMap;
+use std::sync::{Arc, LazyLock, RwLock};
+
+use super::message::MessageManager;
+
+/// 当前在线的音箱连接，按 device_id 索引
+///
+/// 未指定 device_id 时默认使用最近连接的音箱，保持单音箱场景下的旧行为
+pub struct ConnectionRegistry {
+    state: RwLock<RegistryState>,
+}
+
+struct RegistryState {
+    connections: HashMap<String, Arc<MessageManager>>,
+    latest: Option<String>,
+}
+
+static INSTANCE: LazyLock<ConnectionRegistry> = LazyLock::new(ConnectionRegistry::new);
+
+impl ConnectionRegistry {
+    fn new() -> Self {
+        Self {
+            state: RwLock::new(RegistryState {
+                connections: HashMap::new(),
+                latest: None,
+            }),
+        }
+    }
+
+    pub fn instance() -> &'static Self {
+        &INSTANCE
+    }
+
+    /// 注册连接，同一音箱重连时返回被替换的旧连接
+    pub fn register(&self, manager: Arc<MessageManager>) -> Option<Arc<MessageManager>> {
+        let mut state = self.state.write().unwrap();
+        let device_id = manager.device_id().to_string();
+        state.latest = Some(device_id.clone());
+        state.connections.insert(device_id, manager)
+    }
+
+    /// 仅当登记的仍是同一个连接时才移除，避免旧连接断开时误删重连后的新连接
+    pub fn unregister(&self, manager: &Arc<MessageManager>) {
+        let mut state = self.state.write().unwrap();
+        let device_id = manager.device_id();
+        let is_current = state
+            .connections
+            .get(device_id)
+            .is_some_and(|current| Arc::ptr_eq(current, manager));
+        if !is_current {
+            return;
+        }
+        state.connections.remove(device_id);
+        if state.latest.as_deref() == Some(device_id) {
+            state.latest = state.connections.keys().next().cloned();
+        }
+    }
+
+    pub fn get(&self, device_id: Option<&str>) -> Option<Arc<MessageManager>> {
+        let state = self.state.read().unwrap();
+        let device_id = match device_id {
+            Some(device_id) => device_id,
+            None => state.latest.as_deref()?,
+        };
+        state.connections.get(device_id).cloned()
+    }
+
+    pub fn connections(&self) -> Vec<Arc<MessageManager>> {
+        let state = self.state.read().unwrap();
+        state.connections.values().cloned().collect()
+    }
+
+    pub fn device_ids(&self) -> Vec<String> {
+        let state = self.state.read().unwrap();
+        let mut ids: Vec<String> = state.connections.keys().cloned().collect();
+        ids.sort();
+        ids
+    }
+}
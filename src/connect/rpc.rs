@@ -1,8 +1,10 @@
 use futures::future::BoxFuture;
+use std::collections::hash_map::DefaultHasher;
 use std::collections::HashMap;
 use std::future::Future;
-use std::sync::{Arc, LazyLock};
-use tokio::sync::{oneshot, Mutex, RwLock};
+use std::hash::{Hash, Hasher};
+use std::sync::{Arc, Mutex};
+use tokio::sync::{oneshot, RwLock};
 use tokio::time::{timeout, Duration};
 use uuid::Uuid;
 
@@ -14,27 +16,56 @@ type SendRequestFn = Arc<dyn Fn(Request) -> BoxFuture<'static, Result<(), AppErr
 type RequestHandler =
     Arc<dyn Fn(Request) -> BoxFuture<'static, Result<Response, AppError>> + Send + Sync>;
 
-static INSTANCE: LazyLock<RPC> = LazyLock::new(RPC::new);
+const PENDING_SHARDS: usize = 16;
+
+/// 按请求 id 分片的等待表，并发调用不再争用同一把锁；锁只在插入/取出时短暂持有
+struct PendingRequests {
+    shards: Vec<Mutex<HashMap<String, oneshot::Sender<Response>>>>,
+}
+
+impl PendingRequests {
+    fn new() -> Self {
+        Self {
+            shards: (0..PENDING_SHARDS).map(|_| Mutex::new(HashMap::new())).collect(),
+        }
+    }
+
+    fn shard(&self, id: &str) -> &Mutex<HashMap<String, oneshot::Sender<Response>>> {
+        let mut hasher = DefaultHasher::new();
+        id.hash(&mut hasher);
+        &self.shards[hasher.finish() as usize % self.shards.len()]
+    }
+
+    fn insert(&self, id: String, tx: oneshot::Sender<Response>) {
+        self.shard(&id).lock().unwrap().insert(id, tx);
+    }
+
+    fn remove(&self, id: &str) -> Option<oneshot::Sender<Response>> {
+        self.shard(id).lock().unwrap().remove(id)
+    }
+
+    fn clear(&self) {
+        for shard in &self.shards {
+            shard.lock().unwrap().clear();
+        }
+    }
+}
 
 pub struct RPC {
     send_request: Arc<RwLock<Option<SendRequestFn>>>,
     request_handlers: Arc<RwLock<HashMap<String, RequestHandler>>>,
-    pending_requests: Arc<Mutex<HashMap<String, oneshot::Sender<Response>>>>,
+    pending_requests: PendingRequests,
 }
 
 impl RPC {
-    fn new() -> Self {
+    pub fn new() -> Self {
         Self {
             send_request: Arc::new(RwLock::new(None)),
             request_handlers: Arc::new(RwLock::new(HashMap::new())),
-            pending_requests: Arc::new(Mutex::new(HashMap::new())),
+            pending_requests: PendingRequests::new(),
         }
     }
 
-    pub fn instance() -> &'static Self {
-        &INSTANCE
-    }
-
     pub async fn init<F, Fut>(&self, send_request: F)
     where
         F: Fn(Request) -> Fut + Send + Sync + 'static,
@@ -53,10 +84,8 @@ impl RPC {
             let mut lock = self.request_handlers.write().await;
             lock.clear();
         }
-        {
-            let mut lock = self.pending_requests.lock().await;
-            lock.clear();
-        }
+        // 丢弃等待中的 sender，调用方立即收到 channel closed 而不是等到超时
+        self.pending_requests.clear();
     }
 
     pub async fn add_command<F, Fut>(&self, command: &str, handler: F)
@@ -80,11 +109,7 @@ impl RPC {
     }
 
     pub async fn on_response(&self, response: Response) {
-        let tx = {
-            let mut pending = self.pending_requests.lock().await;
-            pending.remove(&response.id)
-        };
-        if let Some(tx) = tx {
+        if let Some(tx) = self.pending_requests.remove(&response.id) {
             let _ = tx.send(response);
         }
     }
@@ -109,24 +134,22 @@ impl RPC {
             payload,
         };
 
-        send_request(request).await?;
-
-        {
-            let mut pending = self.pending_requests.lock().await;
-            pending.insert(uid.clone(), tx);
+        // 先登记再发送，否则响应先于登记到达时会被丢弃，只能等到超时
+        self.pending_requests.insert(uid.clone(), tx);
+        if let Err(e) = send_request(request).await {
+            self.pending_requests.remove(&uid);
+            return Err(e);
         }
 
         let timeout_duration = Duration::from_millis(timeout_millis.unwrap_or(10 * 1000));
         match timeout(timeout_duration, rx).await {
             Ok(Ok(response)) => Ok(response),
             Ok(Err(_)) => {
-                let mut pending = self.pending_requests.lock().await;
-                pending.remove(&uid);
+                self.pending_requests.remove(&uid);
                 Err("response channel closed".into())
             }
             Err(_) => {
-                let mut pending = self.pending_requests.lock().await;
-                pending.remove(&uid);
+                self.pending_requests.remove(&uid);
                 Err("request timeout".into())
             }
         }
@@ -142,3 +165,45 @@ impl RPC {
         handlers.get(event).cloned()
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use serde_json::json;
+
+    #[tokio::test]
+    async fn response_during_send_is_delivered() {
+        let rpc = Arc::new(RPC::new());
+        let weak = Arc::downgrade(&rpc);
+        rpc.init(move |request: Request| {
+            let weak = weak.clone();
+            async move {
+                // 响应在 send_request 返回之前就到达
+                if let Some(rpc) = weak.upgrade() {
+                    let response = Response {
+                        id: request.id,
+                        code: None,
+                        msg: None,
+                        data: Some(json!("pong")),
+                    };
+                    rpc.on_response(response).await;
+                }
+                Ok(())
+            }
+        })
+        .await;
+        let response = rpc.call_remote("ping", None, Some(100)).await.unwrap();
+        assert_eq!(response.data, Some(json!("pong")));
+    }
+
+    #[tokio::test]
+    async fn unanswered_request_times_out() {
+        let rpc = RPC::new();
+        rpc.init(|_request: Request| async { Ok(()) }).await;
+        let error = rpc.call_remote("ping", None, Some(20)).await.unwrap_err();
+        assert_eq!(error.to_string(), "request timeout");
+        for shard in &rpc.pending_requests.shards {
+            assert!(shard.lock().unwrap().is_empty());
+        }
+    }
+}
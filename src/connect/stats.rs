@@ -0,0 +1,147 @@
+use serde_json::{json, Value};
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::time::Duration;
+use tokio::sync::mpsc::{self, error::TrySendError};
+
+/// 有界队列中尚未被取走的消息数
+pub fn queue_depth<T>(tx: &mpsc::Sender<T>) -> usize {
+    tx.max_capacity() - tx.capacity()
+}
+
+/// `QueueStats::offer` 的结果
+#[derive(Debug, PartialEq, Eq)]
+pub enum Offered {
+    Queued,
+    /// 队列已满被丢弃，附带累计丢弃数
+    Dropped(u64),
+    Closed,
+}
+
+/// 单类消息队列的计数器，全部为无锁原子操作
+#[derive(Default)]
+pub struct QueueStats {
+    enqueued: AtomicU64,
+    processed: AtomicU64,
+    dropped: AtomicU64,
+    backpressure: AtomicU64,
+    max_depth: AtomicU64,
+    latency_total_us: AtomicU64,
+    latency_max_us: AtomicU64,
+}
+
+impl QueueStats {
+    pub fn on_enqueue(&self, depth: usize) {
+        self.enqueued.fetch_add(1, Ordering::Relaxed);
+        self.max_depth.fetch_max(depth as u64, Ordering::Relaxed);
+    }
+
+    /// 返回累计丢弃数
+    pub fn on_drop(&self) -> u64 {
+        self.dropped.fetch_add(1, Ordering::Relaxed) + 1
+    }
+
+    pub fn on_backpressure(&self) {
+        self.backpressure.fetch_add(1, Ordering::Relaxed);
+    }
+
+    /// 不等待地放入有界队列并计数；队列满时丢弃，调用方（读循环）不会因此停顿
+    pub fn offer<T>(&self, tx: &mpsc::Sender<T>, item: T) -> Offered {
+        match tx.try_send(item) {
+            Ok(()) => {
+                self.on_enqueue(queue_depth(tx));
+                Offered::Queued
+            }
+            Err(TrySendError::Full(_)) => Offered::Dropped(self.on_drop()),
+            Err(TrySendError::Closed(_)) => Offered::Closed,
+        }
+    }
+
+    /// latency 为入队到处理完成的耗时
+    pub fn on_processed(&self, latency: Duration) {
+        let micros = latency.as_micros() as u64;
+        self.processed.fetch_add(1, Ordering::Relaxed);
+        self.latency_total_us.fetch_add(micros, Ordering::Relaxed);
+        self.latency_max_us.fetch_max(micros, Ordering::Relaxed);
+    }
+
+    pub fn snapshot(&self, depth: usize) -> Value {
+        let processed = self.processed.load(Ordering::Relaxed);
+        let total_us = self.latency_total_us.load(Ordering::Relaxed);
+        let avg_ms = if processed > 0 {
+            total_us as f64 / processed as f64 / 1000.0
+        } else {
+            0.0
+        };
+        json!({
+            "depth": depth,
+            "max_depth": self.max_depth.load(Ordering::Relaxed),
+            "enqueued": self.enqueued.load(Ordering::Relaxed),
+            "processed": processed,
+            "dropped": self.dropped.load(Ordering::Relaxed),
+            "backpressure": self.backpressure.load(Ordering::Relaxed),
+            "avg_latency_ms": avg_ms,
+            "max_latency_ms": self.latency_max_us.load(Ordering::Relaxed) as f64 / 1000.0,
+        })
+    }
+}
+
+#[derive(Default)]
+pub struct MessageStats {
+    pub event: QueueStats,
+    pub stream: QueueStats,
+    pub request: QueueStats,
+    pub response: QueueStats,
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn snapshot_reports_counters_and_latency() {
+        let stats = QueueStats::default();
+        assert_eq!(stats.snapshot(0)["avg_latency_ms"], 0.0);
+
+        stats.on_enqueue(3);
+        stats.on_enqueue(1);
+        stats.on_drop();
+        stats.on_backpressure();
+        stats.on_processed(Duration::from_millis(2));
+        stats.on_processed(Duration::from_millis(6));
+
+        let snapshot = stats.snapshot(1);
+        assert_eq!(snapshot["depth"], 1);
+        assert_eq!(snapshot["max_depth"], 3);
+        assert_eq!(snapshot["enqueued"], 2);
+        assert_eq!(snapshot["processed"], 2);
+        assert_eq!(snapshot["dropped"], 1);
+        assert_eq!(snapshot["backpressure"], 1);
+        assert_eq!(snapshot["avg_latency_ms"], 4.0);
+        assert_eq!(snapshot["max_latency_ms"], 6.0);
+    }
+
+    #[test]
+    fn offer_drops_when_full_without_waiting() {
+        let stats = QueueStats::default();
+        let (tx, mut rx) = mpsc::channel(2);
+        assert_eq!(stats.offer(&tx, 1), Offered::Queued);
+        assert_eq!(stats.offer(&tx, 2), Offered::Queued);
+        assert_eq!(queue_depth(&tx), 2);
+        assert_eq!(stats.offer(&tx, 3), Offered::Dropped(1));
+        assert_eq!(stats.offer(&tx, 4), Offered::Dropped(2));
+
+        // 取走后可以继续入队，已入队的消息保持顺序
+        assert_eq!(rx.try_recv(), Ok(1));
+        assert_eq!(stats.offer(&tx, 5), Offered::Queued);
+        assert_eq!(rx.try_recv(), Ok(2));
+        assert_eq!(rx.try_recv(), Ok(5));
+
+        let snapshot = stats.snapshot(queue_depth(&tx));
+        assert_eq!(snapshot["enqueued"], 3);
+        assert_eq!(snapshot["dropped"], 2);
+        assert_eq!(snapshot["max_depth"], 2);
+
+        drop(rx);
+        assert_eq!(stats.offer(&tx, 6), Offered::Closed);
+    }
+}
@@ -0,0 +1,253 @@
+use pyo3::prelude::*;
+use pyo3::types::{PyBool, PyDict, PyList, PyString};
+use serde_json::Value;
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::sync::{Arc, LazyLock, RwLock};
+
+use crate::connect::data::Event;
+
+/// Python 端注册的事件过滤规则
+///
+/// - `events` 为空表示不过滤事件类型
+/// - `namespace_hints` / `name_hints` 对 `data.NewLine` 中的 header 做大小写无关的子串匹配，
+///   两者都为空表示不过滤
+/// - `parse_new_line` 为 true 时在 Rust 侧解析 `data.NewLine`，Python 直接收到 dict
+pub struct EventFilter {
+    events: Vec<String>,
+    namespace_hints: Vec<String>,
+    name_hints: Vec<String>,
+    parse_new_line: bool,
+}
+
+impl EventFilter {
+    pub fn apply(&self, device_id: &str, event: Event) -> Option<Value> {
+        if !self.events.is_empty() && !self.events.iter().any(|e| *e == event.event) {
+            return None;
+        }
+        let Event { id, event, data } = event;
+        let mut data = data.unwrap_or(Value::Null);
+
+        let new_line = data
+            .get("NewLine")
+            .and_then(Value::as_str)
+            .map(|raw| serde_json::from_str::<Value>(raw).ok());
+        if let Some(line) = new_line {
+            let header = line.as_ref().and_then(|line| line.get("header"));
+            if !self.matches_header(header) {
+                return None;
+            }
+            if self.parse_new_line {
+                if let (Some(line), Some(obj)) = (line, data.as_object_mut()) {
+                    obj.insert("NewLine".to_string(), line);
+                }
+            }
+        }
+
+        let mut value = serde_json::Map::new();
+        value.insert("id".to_string(), Value::String(id));
+        value.insert("event".to_string(), Value::String(event));
+        value.insert("data".to_string(), data);
+        value.insert("device_id".to_string(), Value::String(device_id.to_string()));
+        Some(Value::Object(value))
+    }
+
+    fn matches_header(&self, header: Option<&Value>) -> bool {
+        if self.namespace_hints.is_empty() && self.name_hints.is_empty() {
+            return true;
+        }
+        let field = |key: &str| {
+            header
+                .and_then(|h| h.get(key))
+                .and_then(Value::as_str)
+                .unwrap_or("")
+                .to_lowercase()
+        };
+        let namespace = field("namespace");
+        let name = field("name");
+        self.namespace_hints.iter().any(|hint| namespace.contains(hint.as_str()))
+            || self.name_hints.iter().any(|hint| name.contains(hint.as_str()))
+    }
+}
+
+pub struct EventFilterManager {
+    filter: RwLock<Option<Arc<EventFilter>>>,
+    passed: AtomicU64,
+    dropped: AtomicU64,
+}
+
+static INSTANCE: LazyLock<EventFilterManager> = LazyLock::new(EventFilterManager::new);
+
+impl EventFilterManager {
+    fn new() -> Self {
+        Self {
+            filter: RwLock::new(None),
+            passed: AtomicU64::new(0),
+            dropped: AtomicU64::new(0),
+        }
+    }
+
+    pub fn instance() -> &'static Self {
+        &INSTANCE
+    }
+
+    pub fn current(&self) -> Option<Arc<EventFilter>> {
+        self.filter.read().unwrap().clone()
+    }
+
+    pub fn record(&self, passed: bool) {
+        if passed {
+            self.passed.fetch_add(1, Ordering::Relaxed);
+        } else {
+            self.dropped.fetch_add(1, Ordering::Relaxed);
+        }
+    }
+
+    fn set(&self, filter: Option<EventFilter>) {
+        *self.filter.write().unwrap() = filter.map(Arc::new);
+    }
+}
+
+/// 将 serde_json::Value 转换为 Python 原生对象，需在持有 GIL 时调用
+pub fn json_to_py<'py>(py: Python<'py>, value: &Value) -> PyResult<Bound<'py, PyAny>> {
+    let obj = match value {
+        Value::Null => py.None().into_bound(py),
+        Value::Bool(b) => PyBool::new(py, *b).to_owned().into_any(),
+        Value::Number(n) => {
+            if let Some(i) = n.as_i64() {
+                i.into_pyobject(py)?.into_any()
+            } else if let Some(u) = n.as_u64() {
+                u.into_pyobject(py)?.into_any()
+            } else {
+                n.as_f64().unwrap_or(0.0).into_pyobject(py)?.into_any()
+            }
+        }
+        Value::String(s) => PyString::new(py, s).into_any(),
+        Value::Array(items) => {
+            let list = PyList::empty(py);
+            for item in items {
+                list.append(json_to_py(py, item)?)?;
+            }
+            list.into_any()
+        }
+        Value::Object(map) => {
+            let dict = PyDict::new(py);
+            for (key, item) in map {
+                dict.set_item(key.as_str(), json_to_py(py, item)?)?;
+            }
+            dict.into_any()
+        }
+    };
+    Ok(obj)
+}
+
+#[pyfunction]
+#[pyo3(signature = (events=Vec::new(), namespace_hints=Vec::new(), name_hints=Vec::new(), parse_new_line=true))]
+fn set_event_filter(
+    events: Vec<String>,
+    namespace_hints: Vec<String>,
+    name_hints: Vec<String>,
+    parse_new_line: bool,
+) -> PyResult<()> {
+    let lower = |items: Vec<String>| -> Vec<String> { items.into_iter().map(|s| s.to_lowercase()).collect() };
+    EventFilterManager::instance().set(Some(EventFilter {
+        events,
+        namespace_hints: lower(namespace_hints),
+        name_hints: lower(name_hints),
+        parse_new_line,
+    }));
+    Ok(())
+}
+
+#[pyfunction]
+fn clear_event_filter() -> PyResult<()> {
+    EventFilterManager::instance().set(None);
+    Ok(())
+}
+
+#[pyfunction]
+fn event_filter_stats() -> (u64, u64) {
+    let manager = EventFilterManager::instance();
+    (
+        manager.passed.load(Ordering::Relaxed),
+        manager.dropped.load(Ordering::Relaxed),
+    )
+}
+
+pub fn init_module(m: &Bound<'_, PyModule>) -> PyResult<()> {
+    m.add_function(wrap_pyfunction!(set_event_filter, m)?)?;
+    m.add_function(wrap_pyfunction!(clear_event_filter, m)?)?;
+    m.add_function(wrap_pyfunction!(event_filter_stats, m)?)?;
+    Ok(())
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use serde_json::json;
+
+    fn filter(events: &[&str], namespace_hints: &[&str], name_hints: &[&str], parse_new_line: bool) -> EventFilter {
+        let owned = |items: &[&str]| items.iter().map(|item| item.to_string()).collect();
+        EventFilter {
+            events: owned(events),
+            namespace_hints: owned(namespace_hints),
+            name_hints: owned(name_hints),
+            parse_new_line,
+        }
+    }
+
+    fn instruction(namespace: &str, name: &str) -> Event {
+        let line = json!({ "header": { "namespace": namespace, "name": name }, "payload": { "text": "你好" } });
+        Event {
+            id: "e1".to_string(),
+            event: "instruction".to_string(),
+            data: Some(json!({ "NewLine": line.to_string() })),
+        }
+    }
+
+    #[test]
+    fn drops_unlisted_event_types() {
+        let filter = filter(&["instruction"], &[], &[], false);
+        let other = Event {
+            id: "e2".to_string(),
+            event: "playing".to_string(),
+            data: None,
+        };
+        assert!(filter.apply("dev", other).is_none());
+        assert!(filter.apply("dev", instruction("SpeechRecognizer", "RecognizeResult")).is_some());
+    }
+
+    #[test]
+    fn matches_header_hints_case_insensitively() {
+        let filter = filter(&[], &["speechrecognizer"], &["speak"], false);
+        assert!(filter.apply("dev", instruction("SpeechRecognizer", "RecognizeResult")).is_some());
+        assert!(filter.apply("dev", instruction("SpeechSynthesizer", "Speak")).is_some());
+        assert!(filter.apply("dev", instruction("AudioPlayer", "Play")).is_none());
+    }
+
+    #[test]
+    fn parses_new_line_and_adds_device_id() {
+        let value = filter(&[], &[], &[], true)
+            .apply("dev", instruction("Nlp", "Reply"))
+            .unwrap();
+        assert_eq!(value["device_id"], "dev");
+        assert_eq!(value["event"], "instruction");
+        assert_eq!(value["data"]["NewLine"]["payload"]["text"], "你好");
+
+        let raw = filter(&[], &[], &[], false)
+            .apply("dev", instruction("Nlp", "Reply"))
+            .unwrap();
+        assert!(raw["data"]["NewLine"].is_string());
+    }
+
+    #[test]
+    fn events_without_new_line_pass_header_hints() {
+        let filter = filter(&[], &["speechrecognizer"], &[], true);
+        let event = Event {
+            id: "e3".to_string(),
+            event: "playing".to_string(),
+            data: Some(json!({ "status": "idle" })),
+        };
+        let value = filter.apply("dev", event).unwrap();
+        assert_eq!(value["data"]["status"], "idle");
+    }
+}
@@ -1,24 +1,45 @@
+use pyo3::buffer::PyBuffer;
 use pyo3::prelude::*;
-use pyo3::types::PyBytes;
-use serde_json::json;
+use serde_json::Value;
 use server::AppServer;
-use crate::connect::message::MessageManager;
-use crate::connect::rpc::RPC;
+use uuid::Uuid;
+use crate::audio_buffer::contiguous_bytes;
+use crate::connect::registry::ConnectionRegistry;
+use crate::event_filter::json_to_py;
+use crate::shell_batch::{build_batch_script, split_batch_output};
 
+pub mod audio_buffer;
 pub mod base;
 pub mod connect;
+pub mod event_filter;
 pub mod macros;
 pub mod python;
 pub mod server;
+pub mod shell_batch;
+pub mod shell_session;
 pub mod utils;
 
+/// 接受 bytes / bytearray / memoryview 等缓冲区对象，持有 GIL 时直接编码为待发送帧，
+/// 音频数据只拷贝这一次
 #[pyfunction]
-fn on_output_data(py: Python, data: Py<PyBytes>) -> PyResult<Bound<PyAny>> {
-    let bytes = data.as_bytes(py).to_vec();
+#[pyo3(signature = (data, device_id=None))]
+fn on_output_data<'py>(
+    py: Python<'py>,
+    data: &Bound<'py, PyAny>,
+    device_id: Option<String>,
+) -> PyResult<Bound<'py, PyAny>> {
+    let manager = ConnectionRegistry::instance().get(device_id.as_deref());
+    let message = match &manager {
+        Some(manager) => {
+            let buffer = PyBuffer::<u8>::get(data)?;
+            Some(manager.encode_stream("play", contiguous_bytes(&buffer)?, None))
+        }
+        None => None,
+    };
     pyo3_async_runtimes::tokio::future_into_py(py, async move {
-        let _ = MessageManager::instance()
-            .send_stream("play", bytes, None)
-            .await;
+        if let (Some(manager), Some(message)) = (manager, message) {
+            let _ = manager.send(message).await;
+        }
         Ok(())
     })
 }
@@ -32,28 +53,94 @@ fn start_server(py: Python) -> PyResult<Bound<PyAny>> {
 }
 
 #[pyfunction]
-fn run_shell(py: Python, script: String, timeout_millis: f64) -> PyResult<Bound<PyAny>> {
+#[pyo3(signature = (script, timeout_millis, device_id=None))]
+fn run_shell(
+    py: Python,
+    script: String,
+    timeout_millis: f64,
+    device_id: Option<String>,
+) -> PyResult<Bound<PyAny>> {
     pyo3_async_runtimes::tokio::future_into_py(py, async move {
-        let res = RPC::instance()
-            .call_remote(
-                "run_shell",
-                Some(json!(script)),
-                Some(timeout_millis as u64),
-            )
-            .await;
-        let result = match res {
+        // device_id 为空时发往最近连接的音箱
+        let Some(manager) = ConnectionRegistry::instance().get(device_id.as_deref()) else {
+            return Ok(format!(
+                "run_shell error: device not connected: {}",
+                device_id.as_deref().unwrap_or("-")
+            ));
+        };
+        let result = match manager.run_shell(&script, timeout_millis as u64).await {
+            Err(e) => format!("run_shell error: {}", e),
+            Ok(data) => serde_json::to_string(&data).unwrap(),
+        };
+        Ok(result)
+    })
+}
+
+/// 多段脚本合并为一次 run_shell 往返，返回每段结果的 JSON 数组:
+/// `[{"stdout": ..., "stderr": ..., "exit_code": ...}, ...]`
+#[pyfunction]
+#[pyo3(signature = (scripts, timeout_millis, device_id=None))]
+fn run_shell_batch(
+    py: Python,
+    scripts: Vec<String>,
+    timeout_millis: f64,
+    device_id: Option<String>,
+) -> PyResult<Bound<PyAny>> {
+    pyo3_async_runtimes::tokio::future_into_py(py, async move {
+        let Some(manager) = ConnectionRegistry::instance().get(device_id.as_deref()) else {
+            return Ok(format!(
+                "run_shell error: device not connected: {}",
+                device_id.as_deref().unwrap_or("-")
+            ));
+        };
+        let marker = format!("__OXB_{}", Uuid::new_v4().simple());
+        let batch = build_batch_script(&scripts, &marker);
+        let result = match manager.run_shell(&batch, timeout_millis as u64).await {
             Err(e) => format!("run_shell error: {}", e),
-            Ok(res) => serde_json::to_string(&res.data.unwrap()).unwrap(),
+            Ok(data) => {
+                let field = |key: &str| data.get(key).and_then(Value::as_str).unwrap_or("").to_string();
+                let results = split_batch_output(&field("stdout"), &field("stderr"), &marker, scripts.len());
+                serde_json::to_string(&results).unwrap()
+            }
         };
         Ok(result)
     })
 }
 
+/// 关闭后每条命令都在音箱上新起一个 shell，默认开启（client 不支持时自动退回）
+#[pyfunction]
+fn set_shell_session(enabled: bool) {
+    crate::shell_session::set_enabled(enabled);
+}
+
+#[pyfunction]
+fn list_devices() -> Vec<String> {
+    ConnectionRegistry::instance().device_ids()
+}
+
+/// 各音箱连接的消息队列统计: `{device_id: {"event": {...}, "stream": {...}, ...}}`
+#[pyfunction]
+#[pyo3(signature = (device_id=None))]
+fn message_stats(py: Python, device_id: Option<String>) -> PyResult<Bound<PyAny>> {
+    let stats: serde_json::Map<String, Value> = ConnectionRegistry::instance()
+        .connections()
+        .into_iter()
+        .filter(|manager| device_id.as_deref().is_none_or(|id| id == manager.device_id()))
+        .map(|manager| (manager.device_id().to_string(), manager.stats()))
+        .collect();
+    json_to_py(py, &Value::Object(stats))
+}
+
 #[pymodule]
 fn open_xiaoai_server(_py: Python, m: Bound<'_, PyModule>) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(start_server, &m)?)?;
     m.add_function(wrap_pyfunction!(on_output_data, &m)?)?;
     m.add_function(wrap_pyfunction!(run_shell, &m)?)?;
+    m.add_function(wrap_pyfunction!(run_shell_batch, &m)?)?;
+    m.add_function(wrap_pyfunction!(set_shell_session, &m)?)?;
+    m.add_function(wrap_pyfunction!(list_devices, &m)?)?;
+    m.add_function(wrap_pyfunction!(message_stats, &m)?)?;
     crate::python::init_module(&m)?;
+    crate::event_filter::init_module(&m)?;
     Ok(())
 }
@@ -3,14 +3,19 @@ use crate::base::{AppError, VERSION};
 use crate::connect::data::{Event, Request, Response, Stream};
 use crate::connect::handler::MessageHandler;
 use crate::connect::message::{MessageManager, WsStream};
-use crate::connect::rpc::RPC;
+use crate::connect::registry::ConnectionRegistry;
+use crate::event_filter::{json_to_py, EventFilterManager};
 use pyo3::types::PyBytes;
 use pyo3::types::PyString;
 use pyo3::Python;
-use serde_json::json;
+use serde_json::{json, Value};
+use std::sync::Arc;
 use tokio::net::{TcpListener, TcpStream};
 use tokio_tungstenite::accept_async;
 
+const STREAM_FORMAT_BINARY: &str = "binary";
+const STREAM_FORMAT_JSON: &str = "json";
+
 pub struct AppServer;
 
 impl AppServer {
@@ -25,9 +30,10 @@ impl AppServer {
             .await
             .unwrap_or_else(|_| panic!("❌ 绑定地址失败: {}", addr));
         crate::pylog!("✅ 已启动: {:?}", addr);
+        AppServer::init().await;
         while let Ok((stream, addr)) = listener.accept().await {
-            // 同一时刻只处理一个连接
-            AppServer::handle_connection(stream, addr).await;
+            // 每个音箱连接独立处理，多台音箱可同时在线
+            tokio::spawn(AppServer::handle_connection(stream, addr));
         }
     }
 
@@ -36,30 +42,47 @@ impl AppServer {
             crate::pylog!("❌ 连接异常: {}", addr);
             return;
         };
-        crate::pylog!("✅ 已连接: {:?}", addr);
-        AppServer::init(ws_stream).await;
-        if let Err(e) = MessageManager::instance().process_messages().await {
-            crate::pylog!("❌ 消息处理异常: {}", e);
+        // 音箱以局域网 IP 作为 device_id
+        let device_id = addr.ip().to_string();
+        crate::pylog!("✅ 已连接: {:?} device_id={}", addr, device_id);
+
+        let manager = MessageManager::new(&device_id, ws_stream).await;
+        AppServer::init_connection(&manager).await;
+        // 同一音箱重连时新连接立即生效，旧连接在自身读循环结束后自行清理
+        if ConnectionRegistry::instance()
+            .register(Arc::clone(&manager))
+            .is_some()
+        {
+            crate::pylog!("⚠️ 音箱重连，已替换旧连接: {}", device_id);
+        }
+        if let Err(e) = manager.process_messages().await {
+            crate::pylog!("❌ 消息处理异常: {} device_id={}", e, device_id);
         }
-        AppServer::dispose().await;
-        crate::pylog!("❌ 已断开连接");
+        ConnectionRegistry::instance().unregister(&manager);
+        manager.dispose().await;
+        crate::pylog!("❌ 已断开连接: {:?} device_id={}", addr, device_id);
     }
 
-    async fn init(ws_stream: WsStream) {
-        MessageManager::instance().init(ws_stream).await;
+    async fn init() {
         MessageHandler::<Event>::instance()
             .set_handler(on_event)
             .await;
         MessageHandler::<Stream>::instance()
             .set_handler(on_stream)
             .await;
+    }
 
-        let rpc = RPC::instance();
+    async fn init_connection(manager: &Arc<MessageManager>) {
+        let rpc = manager.rpc();
         rpc.add_command("get_version", get_version).await;
-    }
 
-    async fn dispose() {
-        MessageManager::instance().dispose().await;
+        // client 通过 stream_format 声明支持的 Stream 格式，未协商时保持 JSON
+        let weak = Arc::downgrade(manager);
+        rpc.add_command("stream_format", move |request| {
+            let weak = weak.clone();
+            async move { negotiate_stream_format(weak.upgrade(), request) }
+        })
+        .await;
     }
 }
 
@@ -68,7 +91,24 @@ async fn get_version(_: Request) -> Result<Response, AppError> {
     Ok(Response::from_data(data))
 }
 
-async fn on_stream(stream: Stream) -> Result<(), AppError> {
+fn negotiate_stream_format(
+    manager: Option<Arc<MessageManager>>,
+    request: Request,
+) -> Result<Response, AppError> {
+    let Some(manager) = manager else {
+        return Err("connection is closed".into());
+    };
+    let payload = request.payload.unwrap_or(Value::Null);
+    let formats = payload.get("formats").unwrap_or(&payload);
+    let binary = formats
+        .as_array()
+        .is_some_and(|items| items.iter().any(|item| item.as_str() == Some(STREAM_FORMAT_BINARY)));
+    manager.set_binary_streams(binary);
+    let format = if binary { STREAM_FORMAT_BINARY } else { STREAM_FORMAT_JSON };
+    Ok(Response::from_data(json!({ "format": format })))
+}
+
+async fn on_stream(_device_id: String, stream: Stream) -> Result<(), AppError> {
     let Stream { tag, bytes, .. } = stream;
     if tag == "record" {
         let data = Python::with_gil(|py| PyBytes::new(py, &bytes).into());
@@ -77,9 +117,28 @@ async fn on_stream(stream: Stream) -> Result<(), AppError> {
     Ok(())
 }
 
-async fn on_event(event: Event) -> Result<(), AppError> {
-    let event_json = serde_json::to_string(&event)?;
-    let data = Python::with_gil(|py| PyString::new(py, &event_json).into());
-    PythonManager::instance().call_fn("on_event", Some(data))?;
+async fn on_event(device_id: String, event: Event) -> Result<(), AppError> {
+    let filters = EventFilterManager::instance();
+    let Some(filter) = filters.current() else {
+        let mut value = serde_json::to_value(&event)?;
+        if let Value::Object(obj) = &mut value {
+            obj.insert("device_id".to_string(), Value::String(device_id));
+        }
+        let event_json = serde_json::to_string(&value)?;
+        let data = Python::with_gil(|py| PyString::new(py, &event_json).into());
+        PythonManager::instance().call_fn("on_event", Some(data))?;
+        return Ok(());
+    };
+
+    // 不关心的事件在拿 GIL 之前就丢弃
+    let Some(value) = filter.apply(&device_id, event) else {
+        filters.record(false);
+        return Ok(());
+    };
+    filters.record(true);
+    Python::with_gil(|py| {
+        let data = json_to_py(py, &value)?.unbind();
+        PythonManager::instance().call_fn("on_event", Some(data))
+    })?;
     Ok(())
 }
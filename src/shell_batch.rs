@@ -0,0 +1,101 @@
+//! 把多段脚本合并为一次 run_shell 调用，并按分隔标记拆回每段的输出
+//!
+//! 每段脚本在独立子 shell 中顺序执行，前后在 stdout/stderr 写入带随机串的标记，
+//! 音箱端 client 无需新增命令即可一次往返执行多条命令。
+
+use serde_json::{json, Value};
+
+pub fn build_batch_script(scripts: &[String], marker: &str) -> String {
+    let mut batch = String::new();
+    for (index, script) in scripts.iter().enumerate() {
+        batch.push_str(&format!(
+            "printf '%s\\n' '{marker} {index} begin'; printf '%s\\n' '{marker} {index} begin' >&2\n"
+        ));
+        batch.push_str("(\n");
+        batch.push_str(script);
+        batch.push_str("\n)\n");
+        batch.push_str(&format!(
+            "__oxb_code=$?; printf '\\n%s %s\\n' '{marker} {index} exit' \"$__oxb_code\"; printf '\\n%s\\n' '{marker} {index} end' >&2\n"
+        ));
+    }
+    batch
+}
+
+/// 取出第 index 段脚本在 begin 标记与结束标记之间的输出，及结束标记后的退出码
+fn take_section(output: &str, marker: &str, index: usize, end_tag: &str) -> Option<(String, String)> {
+    let begin = format!("{marker} {index} begin\n");
+    let end = format!("\n{marker} {index} {end_tag}");
+    let start = output.find(&begin)? + begin.len();
+    let stop = start + output[start..].find(&end)?;
+    let rest = &output[stop + end.len()..];
+    let tail = rest.split('\n').next().unwrap_or("").trim().to_string();
+    Some((output[start..stop].to_string(), tail))
+}
+
+pub fn split_batch_output(stdout: &str, stderr: &str, marker: &str, count: usize) -> Vec<Value> {
+    (0..count)
+        .map(|index| {
+            let Some((out, code)) = take_section(stdout, marker, index, "exit") else {
+                // 前面的脚本导致整个 shell 退出时，后续脚本没有执行
+                return json!({ "stdout": "", "stderr": "", "exit_code": Value::Null });
+            };
+            let err = take_section(stderr, marker, index, "end")
+                .map(|(err, _)| err)
+                .unwrap_or_default();
+            let exit_code = code.parse::<i64>().map(Value::from).unwrap_or(Value::Null);
+            json!({ "stdout": out, "stderr": err, "exit_code": exit_code })
+        })
+        .collect()
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    const MARKER: &str = "__OXB_test";
+
+    #[cfg(unix)]
+    fn run_sh(script: &str) -> (String, String) {
+        let output = std::process::Command::new("sh").arg("-c").arg(script).output().unwrap();
+        (
+            String::from_utf8(output.stdout).unwrap(),
+            String::from_utf8(output.stderr).unwrap(),
+        )
+    }
+
+    #[cfg(unix)]
+    #[test]
+    fn batch_output_splits_back_per_script() {
+        let scripts = vec![
+            "echo first".to_string(),
+            "printf 'no newline'; echo oops >&2; false".to_string(),
+            "exit 7".to_string(),
+            "cd /; printf '%s' \"$PWD\"".to_string(),
+        ];
+        let (stdout, stderr) = run_sh(&build_batch_script(&scripts, MARKER));
+        let results = split_batch_output(&stdout, &stderr, MARKER, scripts.len());
+        assert_eq!(results.len(), 4);
+        assert_eq!(results[0], json!({ "stdout": "first\n", "stderr": "", "exit_code": 0 }));
+        assert_eq!(results[1], json!({ "stdout": "no newline", "stderr": "oops\n", "exit_code": 1 }));
+        // 每段在子 shell 中执行，exit 只结束该段，后续脚本照常执行
+        assert_eq!(results[2], json!({ "stdout": "", "stderr": "", "exit_code": 7 }));
+        assert_eq!(results[3]["stdout"], "/");
+    }
+
+    #[test]
+    fn missing_sections_have_null_exit_code() {
+        let stdout = format!("{MARKER} 0 begin\nok\n{MARKER} 0 exit 0\n");
+        let results = split_batch_output(&stdout, "", MARKER, 2);
+        assert_eq!(results[0], json!({ "stdout": "ok", "stderr": "", "exit_code": 0 }));
+        assert_eq!(results[1], json!({ "stdout": "", "stderr": "", "exit_code": Value::Null }));
+    }
+
+    #[test]
+    fn markers_from_other_batches_are_ignored() {
+        // 输出中出现其他随机串的标记（如脚本打印了别的批次的输出）时不会被误切分
+        let stdout = format!("{MARKER} 0 begin\n__OXB_other 0 exit 5\n\n{MARKER} 0 exit 0\n");
+        let results = split_batch_output(&stdout, "", MARKER, 1);
+        assert_eq!(results[0]["stdout"], "__OXB_other 0 exit 5\n");
+        assert_eq!(results[0]["exit_code"], 0);
+    }
+}
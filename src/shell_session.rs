@@ -0,0 +1,300 @@
+//! 音箱端常驻 shell 会话
+//!
+//! 每次 run_shell 都会在音箱上新起一个 shell。client 实现了 `shell_session` 命令时，
+//! 连接内改为复用同一个常驻 shell，脚本逐条写入并在其子 shell 中执行（省去每次启动 shell，
+//! 脚本之间仍互不影响），结果随 RPC 响应返回：
+//!
+//! - `{"action": "open"}` -> `{"session": "<id>"}`
+//! - `{"action": "exec", "session": "<id>", "script": "..."}` -> `{"stdout", "stderr", "exit_code"}`
+//! - `{"action": "close", "session": "<id>"}`
+//!
+//! client 不支持、会话未打开或未启用时自动退回一次性的 run_shell，返回结构相同。
+//! `exec` 失败时只有错误表明脚本确定未开始执行（会话不存在、写入失败）才用 run_shell 重跑，
+//! 其余错误（如 shell 在执行中途退出）直接返回，避免 player_play_url 等命令被执行两次。
+
+use serde_json::{json, Value};
+use std::sync::atomic::{AtomicBool, Ordering};
+use tokio::sync::Mutex;
+
+use crate::connect::data::Response;
+use crate::connect::rpc::RPC;
+
+const SESSION_COMMAND: &str = "shell_session";
+const OPEN_TIMEOUT_MILLIS: u64 = 3000;
+const CLOSE_TIMEOUT_MILLIS: u64 = 1000;
+/// client 在脚本确定未开始执行时返回的错误前缀
+const NOT_STARTED_ERRORS: [&str; 2] = ["session not found", "shell session write failed"];
+
+static ENABLED: AtomicBool = AtomicBool::new(true);
+
+pub fn set_enabled(enabled: bool) {
+    ENABLED.store(enabled, Ordering::Relaxed);
+}
+
+enum SessionState {
+    /// 尚未打开，或上一个会话已失效，下次调用时重新打开
+    Closed,
+    Open(String),
+    /// client 不支持 shell_session，本连接内不再尝试
+    Unsupported,
+}
+
+/// 单个连接的 shell 会话
+///
+/// 常驻 shell 同一时间只执行一条脚本。会话正忙时（如正在播报 TTS）其他调用不排队，
+/// 直接改用一次性的 run_shell，打断播放等紧急命令不必等前一条命令结束或超时。
+pub struct ShellSession {
+    state: Mutex<SessionState>,
+    busy: Mutex<()>,
+}
+
+impl ShellSession {
+    pub fn new() -> Self {
+        Self {
+            state: Mutex::new(SessionState::Closed),
+            busy: Mutex::new(()),
+        }
+    }
+
+    pub async fn run(&self, rpc: &RPC, device_id: &str, script: &str, timeout_millis: u64) -> Result<Value, String> {
+        if !ENABLED.load(Ordering::Relaxed) {
+            return run_once(rpc, script, timeout_millis).await;
+        }
+        let Ok(busy) = self.busy.try_lock() else {
+            return run_once(rpc, script, timeout_millis).await;
+        };
+        let Some(session) = self.session(rpc, device_id).await else {
+            return run_once(rpc, script, timeout_millis).await;
+        };
+
+        let payload = json!({ "action": "exec", "session": &session, "script": script });
+        let result = rpc
+            .call_remote(SESSION_COMMAND, Some(payload), Some(timeout_millis))
+            .await
+            .map_err(|e| e.to_string());
+        match result {
+            Ok(response) => match response_data(response) {
+                Ok(data) => Ok(data),
+                Err(e) => {
+                    // 会话在 client 端已退出，重开留给下一次调用
+                    crate::pylog!("⚠️ shell 会话失效: {} device_id={}", e, device_id);
+                    self.discard(&session).await;
+                    drop(busy);
+                    if !script_not_started(&e) {
+                        // 脚本可能已执行了一部分，重跑会重复执行
+                        return Err(e);
+                    }
+                    // 脚本未开始执行，本次用 run_shell 补上
+                    run_once(rpc, script, timeout_millis).await
+                }
+            },
+            Err(e) => {
+                // 超时的命令可能仍占着常驻 shell，丢弃该会话
+                self.discard(&session).await;
+                drop(busy);
+                close(rpc, &session).await;
+                Err(e)
+            }
+        }
+    }
+
+    /// 返回可用的会话 id，需要时先打开；只在持有 busy 时调用，state 锁不会跨越脚本执行
+    async fn session(&self, rpc: &RPC, device_id: &str) -> Option<String> {
+        let mut state = self.state.lock().await;
+        if let SessionState::Closed = *state {
+            *state = match open(rpc).await {
+                Ok(Some(session)) => {
+                    crate::pylog!("✅ shell 会话已打开: session={} device_id={}", session, device_id);
+                    SessionState::Open(session)
+                }
+                Ok(None) => {
+                    crate::pylog!("⚠️ client 不支持 shell 会话，改用 run_shell: device_id={}", device_id);
+                    SessionState::Unsupported
+                }
+                // 打开失败（如超时）时本次退回 run_shell，下次再试
+                Err(_) => SessionState::Closed,
+            };
+        }
+        match &*state {
+            SessionState::Open(session) => Some(session.clone()),
+            _ => None,
+        }
+    }
+
+    async fn discard(&self, session: &str) {
+        let mut state = self.state.lock().await;
+        if matches!(&*state, SessionState::Open(current) if current == session) {
+            *state = SessionState::Closed;
+        }
+    }
+}
+
+/// 返回 `Ok(None)` 表示 client 不支持 shell_session
+async fn open(rpc: &RPC) -> Result<Option<String>, String> {
+    let response = rpc
+        .call_remote(SESSION_COMMAND, Some(json!({ "action": "open" })), Some(OPEN_TIMEOUT_MILLIS))
+        .await
+        .map_err(|e| e.to_string())?;
+    let Ok(data) = response_data(response) else {
+        return Ok(None);
+    };
+    Ok(data.get("session").and_then(Value::as_str).map(str::to_string))
+}
+
+async fn close(rpc: &RPC, session: &str) {
+    let payload = json!({ "action": "close", "session": session });
+    let _ = rpc
+        .call_remote(SESSION_COMMAND, Some(payload), Some(CLOSE_TIMEOUT_MILLIS))
+        .await;
+}
+
+pub async fn run_once(rpc: &RPC, script: &str, timeout_millis: u64) -> Result<Value, String> {
+    let response = rpc
+        .call_remote("run_shell", Some(json!(script)), Some(timeout_millis))
+        .await
+        .map_err(|e| e.to_string())?;
+    response_data(response)
+}
+
+fn script_not_started(error: &str) -> bool {
+    NOT_STARTED_ERRORS.iter().any(|prefix| error.starts_with(prefix))
+}
+
+fn response_data(response: Response) -> Result<Value, String> {
+    match response.code {
+        Some(code) if code != 0 => Err(response.msg.unwrap_or_else(|| format!("code {}", code))),
+        _ => Ok(response.data.unwrap_or(Value::Null)),
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::sync::Arc;
+    use std::time::Duration;
+    use tokio::sync::mpsc;
+
+    use crate::connect::data::Request;
+
+    /// 模拟支持 shell_session 的 client，按处理完成的顺序记录收到的命令；脚本为 "slow" 时延迟响应，
+    /// 为 "lost" 时报告会话不存在，为 "dies" 时报告 shell 在执行中途退出
+    async fn fake_client() -> (Arc<RPC>, Arc<std::sync::Mutex<Vec<String>>>) {
+        let rpc = Arc::new(RPC::new());
+        let (tx, mut rx) = mpsc::unbounded_channel::<Request>();
+        rpc.init(move |request| {
+            let _ = tx.send(request);
+            async { Ok(()) }
+        })
+        .await;
+        let log = Arc::new(std::sync::Mutex::new(Vec::new()));
+        let (responder, handled) = (Arc::clone(&rpc), Arc::clone(&log));
+        tokio::spawn(async move {
+            while let Some(request) = rx.recv().await {
+                let rpc = Arc::clone(&responder);
+                let log = Arc::clone(&handled);
+                tokio::spawn(async move {
+                    let payload = request.payload.clone().unwrap_or(Value::Null);
+                    let (label, result) = if request.command == "run_shell" {
+                        (format!("run_shell:{}", payload.as_str().unwrap_or("")), Ok(json!({ "stdout": "once" })))
+                    } else {
+                        match payload["action"].as_str() {
+                            Some("open") => ("open".to_string(), Ok(json!({ "session": "s1" }))),
+                            Some("exec") => {
+                                let script = payload["script"].as_str().unwrap_or("").to_string();
+                                let result = match script.as_str() {
+                                    "slow" => {
+                                        tokio::time::sleep(Duration::from_millis(200)).await;
+                                        Ok(json!({ "stdout": "session" }))
+                                    }
+                                    "lost" => Err("session not found: s1"),
+                                    "dies" => Err("shell session exited"),
+                                    _ => Ok(json!({ "stdout": "session" })),
+                                };
+                                (format!("exec:{}", script), result)
+                            }
+                            _ => ("close".to_string(), Ok(Value::Null)),
+                        }
+                    };
+                    log.lock().unwrap().push(label);
+                    let response = match result {
+                        Ok(data) => Response {
+                            id: request.id,
+                            code: None,
+                            msg: None,
+                            data: Some(data),
+                        },
+                        Err(msg) => Response {
+                            id: request.id,
+                            code: Some(-1),
+                            msg: Some(msg.to_string()),
+                            data: None,
+                        },
+                    };
+                    rpc.on_response(response).await;
+                });
+            }
+        });
+        (rpc, log)
+    }
+
+    #[tokio::test]
+    async fn idle_session_is_reused() {
+        let (rpc, log) = fake_client().await;
+        let session = ShellSession::new();
+        let first = session.run(&rpc, "dev", "a", 1000).await.unwrap();
+        session.run(&rpc, "dev", "b", 1000).await.unwrap();
+        assert_eq!(first["stdout"], "session");
+        assert_eq!(*log.lock().unwrap(), ["open", "exec:a", "exec:b"]);
+    }
+
+    #[tokio::test]
+    async fn busy_session_falls_back_to_run_once() {
+        let (rpc, log) = fake_client().await;
+        let session = ShellSession::new();
+        let slow = session.run(&rpc, "dev", "slow", 1000);
+        let urgent = async {
+            tokio::time::sleep(Duration::from_millis(20)).await;
+            session.run(&rpc, "dev", "stop", 1000).await
+        };
+        let (slow, urgent) = tokio::join!(slow, urgent);
+        assert_eq!(slow.unwrap()["stdout"], "session");
+        assert_eq!(urgent.unwrap()["stdout"], "once");
+        // 紧急命令不等待常驻 shell 上的慢命令
+        assert_eq!(*log.lock().unwrap(), ["open", "run_shell:stop", "exec:slow"]);
+    }
+
+    #[tokio::test]
+    async fn script_that_never_started_is_rerun_once() {
+        let (rpc, log) = fake_client().await;
+        let session = ShellSession::new();
+        let result = session.run(&rpc, "dev", "lost", 1000).await.unwrap();
+        assert_eq!(result["stdout"], "once");
+        // 失效的会话被丢弃，下一次调用重新打开
+        session.run(&rpc, "dev", "b", 1000).await.unwrap();
+        assert_eq!(*log.lock().unwrap(), ["open", "exec:lost", "run_shell:lost", "open", "exec:b"]);
+    }
+
+    #[tokio::test]
+    async fn script_interrupted_midway_is_not_rerun() {
+        let (rpc, log) = fake_client().await;
+        let session = ShellSession::new();
+        let result = session.run(&rpc, "dev", "dies", 1000).await;
+        assert_eq!(result, Err("shell session exited".to_string()));
+        session.run(&rpc, "dev", "b", 1000).await.unwrap();
+        assert_eq!(*log.lock().unwrap(), ["open", "exec:dies", "open", "exec:b"]);
+    }
+
+    #[test]
+    fn response_data_rejects_error_code() {
+        let response = |code: Option<i32>, msg: Option<&str>| Response {
+            id: "1".to_string(),
+            code,
+            msg: msg.map(str::to_string),
+            data: Some(json!("ok")),
+        };
+        assert_eq!(response_data(response(Some(1), Some("bad"))), Err("bad".to_string()));
+        assert_eq!(response_data(response(Some(2), None)), Err("code 2".to_string()));
+        assert_eq!(response_data(response(Some(0), None)), Ok(json!("ok")));
+        assert_eq!(response_data(response(None, None)), Ok(json!("ok")));
+    }
+}
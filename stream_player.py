@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections.abc import Awaitable, Callable
+
+import open_xiaoai_server
+
+
+logger = logging.getLogger(__name__)
+
+
+class DecodeJob:
+    """后台 ffmpeg 解码为 PCM，分块放入有限的缓冲池，池满时解码自然阻塞。"""
+
+    def __init__(
+        self,
+        ffmpeg_path: str,
+        path: str,
+        loop: asyncio.AbstractEventLoop,
+        sample_rate: int,
+        channels: int,
+        chunk_bytes: int,
+        pool_size: int,
+    ):
+        self.path = path
+        self.failed = False
+        self._loop = loop
+        self._cmd = [
+            ffmpeg_path,
+            "-nostdin",
+            "-v",
+            "error",
+            "-i",
+            path,
+            "-vn",
+            "-f",
+            "s16le",
+            "-acodec",
+            "pcm_s16le",
+            "-ac",
+            str(channels),
+            "-ar",
+            str(sample_rate),
+            "pipe:1",
+        ]
+        # 缓冲区预先分配并循环使用，播放过程中不再为每块音频分配内存
+        self._free: queue.Queue[bytearray] = queue.Queue()
+        for _ in range(pool_size):
+            self._free.put(bytearray(chunk_bytes))
+        self._ready: asyncio.Queue[tuple[bytearray, int] | None] = asyncio.Queue()
+        self._closed = threading.Event()
+        self._proc: subprocess.Popen | None = None
+        self._thread = threading.Thread(target=self._run, name="stream-decode", daemon=True)
+        self._thread.start()
+
+    async def next_chunk(self) -> tuple[bytearray, int] | None:
+        return await self._ready.get()
+
+    def release(self, buf: bytearray):
+        self._free.put(buf)
+
+    def close(self):
+        self._closed.set()
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+    def _deliver(self, item: tuple[bytearray, int] | None):
+        try:
+            self._loop.call_soon_threadsafe(self._ready.put_nowait, item)
+        except RuntimeError:
+            # 事件循环已关闭
+            self._closed.set()
+
+    def _run(self):
+        stderr_file = None
+        try:
+            # stderr 写入临时文件而不是管道：解码出错较多时 stderr 管道写满会让 ffmpeg 卡住
+            stderr_file = tempfile.TemporaryFile()
+            self._proc = subprocess.Popen(self._cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+            stdout = self._proc.stdout
+            while not self._closed.is_set():
+                try:
+                    buf = self._free.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                filled = 0
+                while filled < len(buf):
+                    count = stdout.readinto(memoryview(buf)[filled:])
+                    if not count:
+                        break
+                    filled += count
+                if filled == 0:
+                    break
+                self._deliver((buf, filled))
+                if filled < len(buf):
+                    break
+            if not self._closed.is_set() and self._proc.wait() != 0:
+                stderr_file.seek(0)
+                stderr = stderr_file.read(4096).decode("utf-8", errors="replace").strip()
+                self.failed = True
+                logger.warning("音频流解码失败: 路径=%s 错误=%s", self.path, stderr or "-")
+        except Exception as exc:
+            self.failed = True
+            logger.warning("音频流解码失败: 路径=%s 错误=%s", self.path, exc)
+        finally:
+            if self._proc is not None and self._proc.poll() is None:
+                self._proc.kill()
+                self._proc.wait()
+            if self._proc is not None:
+                self._proc.stdout.close()
+            if stderr_file is not None:
+                stderr_file.close()
+            self._deliver(None)
+
+
+class StreamPlayer:
+    """通过 WebSocket "play" 流向单台音箱推送 PCM，按实时速度发送并限制超前量。"""
+
+    def __init__(
+        self,
+        ffmpeg_path: str,
+        device_id: str | None = None,
+        sample_rate: int = 16000,
+        channels: int = 1,
+        chunk_ms: int = 100,
+        window_ms: int = 600,
+        decode_ahead_ms: int = 3000,
+    ):
+        self.ffmpeg_path = ffmpeg_path
+        self.device_id = device_id
+        self.sample_rate = int(sample_rate)
+        self.channels = int(channels)
+        frame_bytes = 2 * self.channels
+        self.bytes_per_sec = self.sample_rate * frame_bytes
+        self.chunk_bytes = max(self.bytes_per_sec * int(chunk_ms) // 1000 // frame_bytes, 1) * frame_bytes
+        self.window_sec = max(int(window_ms), int(chunk_ms)) / 1000
+        self.pool_size = max(int(decode_ahead_ms) // max(int(chunk_ms), 1), 2)
+        self._job: DecodeJob | None = None
+        self._prepared: DecodeJob | None = None
+        self._task: asyncio.Task | None = None
+
+    def prepare(self, path: str | None):
+        """提前解码下一首的开头，切歌时直接从内存推送。"""
+        if self._prepared is not None:
+            if self._prepared.path == path:
+                return
+            self._prepared.close()
+            self._prepared = None
+        if path:
+            self._prepared = self._start_job(path)
+
+    async def play(self, path: str, on_finished: Callable[[], Awaitable[None]] | None = None):
+        await self._stop_current()
+        job = self._prepared if self._prepared is not None and self._prepared.path == path else None
+        if job is not None:
+            self._prepared = None
+        else:
+            job = self._start_job(path)
+        self._job = job
+        self._task = asyncio.create_task(self._pump(job, on_finished))
+
+    async def stop(self):
+        await self._stop_current()
+        self.prepare(None)
+
+    async def _stop_current(self):
+        task, self._task = self._task, None
+        job, self._job = self._job, None
+        if job is not None:
+            job.close()
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def _start_job(self, path: str) -> DecodeJob:
+        return DecodeJob(
+            ffmpeg_path=self.ffmpeg_path,
+            path=path,
+            loop=asyncio.get_running_loop(),
+            sample_rate=self.sample_rate,
+            channels=self.channels,
+            chunk_bytes=self.chunk_bytes,
+            pool_size=self.pool_size,
+        )
+
+    async def _pump(self, job: DecodeJob, on_finished: Callable[[], Awaitable[None]] | None):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        sent_sec = 0.0
+        sent_bytes = 0
+        while True:
+            item = await job.next_chunk()
+            if item is None:
+                break
+            buf, size = item
+            # 流控: 已发送音频最多比实际播放进度超前 window_sec，音箱端缓冲有上界
+            ahead = sent_sec - (loop.time() - start)
+            if ahead > self.window_sec:
+                await asyncio.sleep(ahead - self.window_sec)
+            try:
+                # Rust 侧在调用返回前已完成编码，缓冲区可以立即归还
+                sending = open_xiaoai_server.on_output_data(memoryview(buf)[:size], self.device_id)
+            finally:
+                job.release(buf)
+            await sending
+            if sent_bytes == 0:
+                logger.debug("音频流首块已发送: 路径=%s 耗时=%.1f毫秒", job.path, (loop.time() - start) * 1000)
+            sent_sec += size / self.bytes_per_sec
+            sent_bytes += size
+
+        # 等音箱播完窗口内剩余的音频
+        remaining = sent_sec - (loop.time() - start)
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+        logger.info(
+            "音频流播放结束: 设备=%s 路径=%s 时长=%.1f秒 字节=%d 失败=%s",
+            self.device_id or "默认",
+            job.path,
+            sent_sec,
+            sent_bytes,
+            job.failed,
+        )
+        if self._task is asyncio.current_task():
+            self._task = None
+            self._job = None
+        if on_finished is not None:
+            # 回调中通常会开始下一首并停止当前任务，放到独立任务中执行
+            asyncio.create_task(on_finished())
+
+
+def build_stream_player(stream_config: dict, device_id: str | None = None) -> StreamPlayer | None:
+    if not stream_config.get("enabled", False):
+        return None
+    ffmpeg_path = shutil.which("ffmpeg")
+    if not ffmpeg_path:
+        logger.warning("已开启音频流播放但未检测到 ffmpeg，改用 URL 播放")
+        return None
+    return StreamPlayer(
+        ffmpeg_path=ffmpeg_path,
+        device_id=device_id,
+        sample_rate=int(stream_config.get("sample_rate", 16000)),
+        channels=int(stream_config.get("channels", 1)),
+        chunk_ms=int(stream_config.get("chunk_ms", 100)),
+        window_ms=int(stream_config.get("window_ms", 600)),
+        decode_ahead_ms=int(stream_config.get("decode_ahead_ms", 3000)),
+    )
@@ -0,0 +1,124 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+
+logger = logging.getLogger(__name__)
+
+
+# slow_wait_ms: 排队超过该时长时输出警告，0 表示不警告（后台任务排队属正常现象）
+DEFAULT_EXECUTORS = {
+    # 语音搜索、随机选歌与构建播放队列
+    "search": {"workers": 2, "nice": 0, "slow_wait_ms": 200},
+    # 刷新曲库时解析元信息（ffprobe 子进程继承线程的 nice 值）
+    "probe": {"workers": min(8, os.cpu_count() or 4), "nice": 10, "slow_wait_ms": 0},
+    # 索引刷新与保存，每个音乐目录占一个线程
+    "refresh": {"workers": 4, "nice": 10, "slow_wait_ms": 0},
+    # 命令行阻塞读取
+    "console": {"workers": 1, "nice": 0, "slow_wait_ms": 0},
+}
+
+
+class NamedExecutor(Executor):
+    """固定大小的具名线程池，线程按 nice 值降低优先级，并统计任务排队等待时间。"""
+
+    def __init__(self, name: str, workers: int, nice: int = 0, slow_wait_ms: float = 0):
+        self.name = name
+        self.workers = max(int(workers), 1)
+        self.nice = max(int(nice), 0)
+        self.slow_wait_sec = max(float(slow_wait_ms), 0) / 1000
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix=f"exec-{name}",
+            initializer=self._init_thread,
+        )
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._started = 0
+        self._completed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _init_thread(self):
+        if self.nice <= 0:
+            return
+        try:
+            # Linux 下 nice 值按线程生效，提高 nice 无需特权
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+        except (AttributeError, OSError) as exc:
+            logger.debug("设置线程优先级失败: 执行器=%s 错误=%s", self.name, exc)
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        submitted_at = time.monotonic()
+        with self._lock:
+            self._submitted += 1
+
+        def call():
+            self._record_wait(time.monotonic() - submitted_at)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._completed += 1
+
+        future = self._pool.submit(call)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Future):
+        if future.cancelled():
+            with self._lock:
+                self._submitted -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        # 与 loop.run_in_executor 不同，带上调用方的 contextvars（如命令追踪）
+        context = contextvars.copy_context()
+        return await asyncio.wrap_future(self.submit(context.run, fn, *args))
+
+    def _record_wait(self, wait_sec: float):
+        with self._lock:
+            self._started += 1
+            self._wait_total += wait_sec
+            self._wait_max = max(self._wait_max, wait_sec)
+        if self.slow_wait_sec > 0 and wait_sec >= self.slow_wait_sec:
+            logger.warning("执行器排队过久: 执行器=%s 等待=%.1f毫秒", self.name, wait_sec * 1000)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "nice": self.nice,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "queued": self._submitted - self._started,
+                "avg_wait_ms": round(self._wait_total / self._started * 1000, 2) if self._started else 0.0,
+                "max_wait_ms": round(self._wait_max * 1000, 2),
+            }
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def build_executors(executor_config: dict) -> dict[str, NamedExecutor]:
+    executors = {}
+    for name, defaults in DEFAULT_EXECUTORS.items():
+        options = {**defaults, **(executor_config.get(name) or {})}
+        executors[name] = NamedExecutor(
+            name,
+            workers=options["workers"],
+            nice=options["nice"],
+            slow_wait_ms=options["slow_wait_ms"],
+        )
+    logger.info(
+        "执行器已创建: %s",
+        ", ".join(f"{item.name}(线程={item.workers} nice={item.nice})" for item in executors.values()),
+    )
+    return executors
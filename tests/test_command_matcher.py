@@ -0,0 +1,69 @@
+from command_matcher import INTENT_PLAY
+from command_matcher import INTENT_RANDOM
+from command_matcher import INTENT_REFRESH
+from command_matcher import INTENT_STOP
+from command_matcher import CommandMatch
+from command_matcher import CommandMatcher
+
+
+COMMANDS = {
+    "play_keywords": ["播放", "播放歌曲", "我想听"],
+    "stop_keywords": ["停止播放", "暂停"],
+    "refresh_keywords": ["刷新曲库"],
+    "random_play_keywords": ["随机播放", "暂停"],
+    "interrupt_whitelist_keywords": ["小爱同学", "音量"],
+}
+
+
+def test_exact_commands_ignore_spaces_and_punctuation():
+    matcher = CommandMatcher(COMMANDS)
+    assert matcher.match("停止播放").intent == INTENT_STOP
+    assert matcher.match(" 停 止 播放。").intent == INTENT_STOP
+    assert matcher.match("刷新曲库！").intent == INTENT_REFRESH
+    assert matcher.match("随机播放").intent == INTENT_RANDOM
+
+
+def test_exact_commands_follow_intent_priority():
+    # “暂停”同时出现在停止与随机列表中，停止优先
+    assert CommandMatcher(COMMANDS).match("暂停").intent == INTENT_STOP
+
+
+def test_exact_command_wins_over_play_prefix():
+    # “随机播放”不应被当作以“播放”为前缀的点歌
+    assert CommandMatcher({"play_keywords": ["随机"], "random_play_keywords": ["随机播放"]}).match("随机播放") == CommandMatch(
+        intent=INTENT_RANDOM
+    )
+
+
+def test_play_prefix_extracts_argument():
+    matcher = CommandMatcher(COMMANDS)
+    assert matcher.match("播放晴天") == CommandMatch(intent=INTENT_PLAY, argument="晴天")
+    assert matcher.match("播 放 周杰伦 晴天。") == CommandMatch(intent=INTENT_PLAY, argument="周杰伦 晴天")
+    assert matcher.match("我想听：稻香") == CommandMatch(intent=INTENT_PLAY, argument="稻香")
+
+
+def test_earlier_play_prefix_takes_precedence():
+    # 配置中“播放”在“播放歌曲”之前，剩余部分整体作为关键词
+    assert CommandMatcher(COMMANDS).match("播放歌曲晴天").argument == "歌曲晴天"
+
+
+def test_play_prefix_without_argument_is_no_command():
+    matcher = CommandMatcher(COMMANDS)
+    assert matcher.match("播放").intent is None
+    assert matcher.match("播放。").intent is None
+    assert matcher.match("请播放晴天").intent is None
+
+
+def test_whitelist_is_reported_alongside_intent():
+    matcher = CommandMatcher(COMMANDS)
+    assert matcher.match("小爱 同学 停止播放").whitelisted
+    assert matcher.match("调大音量") == CommandMatch(whitelisted=True)
+    assert matcher.match("播放音量歌") == CommandMatch(intent=INTENT_PLAY, argument="音量歌", whitelisted=True)
+    assert not matcher.match("播放晴天").whitelisted
+
+
+def test_empty_text_and_config():
+    assert CommandMatcher(COMMANDS).match("") == CommandMatch()
+    assert CommandMatcher(COMMANDS).match(None) == CommandMatch()
+    assert CommandMatcher().match("播放晴天") == CommandMatch()
+    assert CommandMatcher({"play_keywords": [""], "stop_keywords": None}).match("播放晴天") == CommandMatch()
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+from music_search_core import indexer as indexer_module
+from music_search_core import MusicIndexer
+from music_search_core.indexer import SAMPLE_BYTES
+from music_search_core.indexer import sample_hash
+from music_search_core.models import IndexedSong
+
+
+@pytest.fixture
+def hashed_paths(monkeypatch):
+    paths: list[str] = []
+
+    def counting_sample_hash(path: str, size: int) -> str:
+        paths.append(path)
+        return sample_hash(path, size)
+
+    monkeypatch.setattr(indexer_module, "sample_hash", counting_sample_hash)
+    return paths
+
+
+def song_file(root, name: str, data: bytes, duration_ms: int = 1000) -> IndexedSong:
+    path = root / name
+    path.write_bytes(data)
+    stat_result = os.stat(path)
+    return IndexedSong(
+        path=str(path),
+        name_lower=name,
+        size=stat_result.st_size,
+        mtime_ns=stat_result.st_mtime_ns,
+        duration_ms=duration_ms,
+    )
+
+
+def test_only_colliding_candidates_are_read(tmp_path, hashed_paths):
+    a = song_file(tmp_path, "a.mp3", b"x" * 100)
+    copy = song_file(tmp_path, "copy.mp3", b"x" * 100)
+    other_size = song_file(tmp_path, "b.mp3", b"x" * 200)
+    other_duration = song_file(tmp_path, "c.mp3", b"x" * 100, duration_ms=2000)
+
+    assert MusicIndexer().hash_duplicate_candidates([a, copy, other_size, other_duration]) == 2
+    assert sorted(hashed_paths) == sorted([a.path, copy.path])
+
+
+def test_collapse_keeps_first_of_identical_files(tmp_path):
+    a = song_file(tmp_path, "a.mp3", b"x" * 100)
+    copy = song_file(tmp_path, "copy.mp3", b"x" * 100)
+    same_size = song_file(tmp_path, "same_size.mp3", b"y" * 100)
+    indexer = MusicIndexer()
+    songs = [a, copy, same_size]
+
+    # 尚未计算哈希时不合并
+    assert indexer.collapse_duplicates(songs) == songs
+    indexer.hash_duplicate_candidates(songs)
+    assert indexer.collapse_duplicates(songs) == [a, same_size]
+    assert indexer.collapse_duplicates([copy, a]) == [copy]
+
+
+def test_hashes_are_cached_until_file_changes(tmp_path, hashed_paths):
+    a = song_file(tmp_path, "a.mp3", b"x" * 100)
+    copy = song_file(tmp_path, "copy.mp3", b"x" * 100)
+    indexer = MusicIndexer()
+    assert indexer.hash_duplicate_candidates([a, copy]) == 2
+    assert indexer.hash_duplicate_candidates([a, copy]) == 0
+
+    changed = song_file(tmp_path, "copy.mp3", b"z" * 100)
+    changed = IndexedSong(**{**changed.to_dict(), "mtime_ns": copy.mtime_ns + 1})
+    assert indexer.hash_duplicate_candidates([a, changed]) == 1
+    assert hashed_paths[-1] == changed.path
+    assert indexer.collapse_duplicates([a, changed]) == [a, changed]
+
+
+def test_saved_hashes_are_reused_without_reading(tmp_path, hashed_paths):
+    a = song_file(tmp_path, "a.mp3", b"x" * 100)
+    copy = song_file(tmp_path, "copy.mp3", b"x" * 100)
+    first = MusicIndexer()
+    first.hash_duplicate_candidates([a, copy])
+    saved = first.attach_sample_hashes([a, copy])
+    assert all(item.sample_hash for item in saved)
+
+    hashed_paths.clear()
+    second = MusicIndexer()
+    assert second.hash_duplicate_candidates(saved) == 0
+    assert hashed_paths == []
+    assert second.collapse_duplicates(saved) == [saved[0]]
+
+
+def test_cache_drops_removed_paths(tmp_path):
+    a = song_file(tmp_path, "a.mp3", b"x" * 100)
+    copy = song_file(tmp_path, "copy.mp3", b"x" * 100)
+    indexer = MusicIndexer()
+    indexer.hash_duplicate_candidates([a, copy])
+    indexer.hash_duplicate_candidates([a])
+    assert indexer.attach_sample_hashes([copy])[0].sample_hash == ""
+
+
+def test_sample_hash_reads_head_middle_and_tail(tmp_path):
+    size = SAMPLE_BYTES * 5
+    base = bytearray(size)
+    path = tmp_path / "big.mp3"
+
+    def digest_with(offset: int) -> str:
+        data = bytearray(base)
+        data[offset] = 1
+        path.write_bytes(bytes(data))
+        return sample_hash(str(path), size)
+
+    path.write_bytes(bytes(base))
+    original = sample_hash(str(path), size)
+    for offset in (0, size // 2, size - 1):
+        assert digest_with(offset) != original
+    # 未被抽样的区域不参与计算
+    assert digest_with(SAMPLE_BYTES + 1) == original
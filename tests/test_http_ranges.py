@@ -0,0 +1,144 @@
+import http.client
+from email.utils import formatdate
+from urllib.parse import urlparse
+
+import pytest
+
+from music_service import LocalMusicHttpServer
+
+
+ETAG = '"a-1"'
+MTIME = 1_700_000_000
+
+
+@pytest.fixture
+def server_obj():
+    # 只测试请求头解析，不需要绑定端口
+    return LocalMusicHttpServer.__new__(LocalMusicHttpServer)
+
+
+class FakeHandler:
+    def __init__(self, **headers):
+        self.headers = {key.replace("_", "-"): value for key, value in headers.items()}
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", [(0, 99)]),
+        ("bytes=100-", [(100, 999)]),
+        ("bytes=-100", [(900, 999)]),
+        ("bytes=-5000", [(0, 999)]),
+        ("bytes=900-5000", [(900, 999)]),
+        ("BYTES=0-0", [(0, 0)]),
+        ("bytes=0-9, 20-29", [(0, 9), (20, 29)]),
+        # 重叠与相邻区间合并
+        ("bytes=20-29,0-9,10-15,25-40", [(0, 15), (20, 40)]),
+        # 越界的区间被忽略，只要还有可满足的区间
+        ("bytes=0-9,2000-3000", [(0, 9)]),
+        ("bytes=0-9,-0", [(0, 9)]),
+    ],
+)
+def test_parse_range_header(server_obj, header, expected):
+    assert server_obj._parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        "items=0-9",
+        "bytes=",
+        "bytes=abc",
+        "bytes=a-9",
+        "bytes=10-5",
+        "bytes=1000-",
+        "bytes=-0",
+    ],
+)
+def test_parse_range_header_rejects(server_obj, header):
+    assert server_obj._parse_range_header(header, 1000) is None
+
+
+def test_range_count_limit(server_obj):
+    specs = ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(LocalMusicHttpServer.MAX_RANGES))
+    assert len(server_obj._parse_range_header("bytes=" + specs, 1000)) == LocalMusicHttpServer.MAX_RANGES
+    assert server_obj._parse_range_header("bytes=" + specs + ",990-991", 1000) is None
+
+
+def test_if_range(server_obj):
+    assert server_obj._is_range_applicable(None, ETAG, MTIME)
+    assert server_obj._is_range_applicable(ETAG, ETAG, MTIME)
+    assert not server_obj._is_range_applicable('"other"', ETAG, MTIME)
+    # If-Range 使用强比较
+    assert not server_obj._is_range_applicable("W/" + ETAG, ETAG, MTIME)
+    assert server_obj._is_range_applicable(formatdate(MTIME, usegmt=True), ETAG, MTIME)
+    assert not server_obj._is_range_applicable(formatdate(MTIME - 1, usegmt=True), ETAG, MTIME)
+    assert not server_obj._is_range_applicable("not a date", ETAG, MTIME)
+
+
+def test_conditional_get(server_obj):
+    assert not server_obj._is_not_modified(FakeHandler(), ETAG, MTIME)
+    assert server_obj._is_not_modified(FakeHandler(If_None_Match=ETAG), ETAG, MTIME)
+    # If-None-Match 使用弱比较
+    assert server_obj._is_not_modified(FakeHandler(If_None_Match='"x", W/' + ETAG), ETAG, MTIME)
+    assert server_obj._is_not_modified(FakeHandler(If_None_Match="*"), ETAG, MTIME)
+    assert not server_obj._is_not_modified(FakeHandler(If_None_Match='"x"'), ETAG, MTIME)
+    assert server_obj._is_not_modified(FakeHandler(If_Modified_Since=formatdate(MTIME, usegmt=True)), ETAG, MTIME)
+    assert not server_obj._is_not_modified(FakeHandler(If_Modified_Since=formatdate(MTIME - 1, usegmt=True)), ETAG, MTIME)
+    # 同时存在时 If-None-Match 优先
+    handler = FakeHandler(If_None_Match='"x"', If_Modified_Since=formatdate(MTIME, usegmt=True))
+    assert not server_obj._is_not_modified(handler, ETAG, MTIME)
+
+
+@pytest.fixture
+def live_server():
+    server = LocalMusicHttpServer("127.0.0.1", 0, "http://127.0.0.1")
+    server.start()
+    yield server
+    server.stop()
+
+
+def request(server, url, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server._server.server_address[1], timeout=5)
+    try:
+        connection.request("GET", urlparse(url).path, headers=headers or {})
+        response = connection.getresponse()
+        return response, response.read()
+    finally:
+        connection.close()
+
+
+def test_served_ranges(live_server, tmp_path):
+    data = bytes(range(256)) * 4
+    song = tmp_path / "song.mp3"
+    song.write_bytes(data)
+    url = live_server.create_file_url(str(song))
+
+    response, body = request(live_server, url)
+    assert response.status == 200
+    assert body == data
+    etag = response.getheader("ETag")
+
+    response, body = request(live_server, url, {"Range": "bytes=10-19"})
+    assert response.status == 206
+    assert response.getheader("Content-Range") == f"bytes 10-19/{len(data)}"
+    assert body == data[10:20]
+
+    response, body = request(live_server, url, {"Range": "bytes=0-1,-2"})
+    assert response.status == 206
+    assert response.getheader("Content-Type").startswith("multipart/byteranges")
+    assert int(response.getheader("Content-Length")) == len(body)
+    assert data[:2] in body and data[-2:] in body
+
+    response, _ = request(live_server, url, {"Range": f"bytes={len(data)}-"})
+    assert response.status == 416
+    assert response.getheader("Content-Range") == f"bytes */{len(data)}"
+
+    # If-Range 不匹配时返回完整内容
+    response, body = request(live_server, url, {"Range": "bytes=10-19", "If-Range": '"stale"'})
+    assert response.status == 200
+    assert body == data
+
+    response, body = request(live_server, url, {"If-None-Match": etag})
+    assert response.status == 304
+    assert body == b""
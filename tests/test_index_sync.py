@@ -0,0 +1,156 @@
+import os
+import threading
+
+import pytest
+
+from music_search import MusicSearcher
+from music_search_core import IndexBuildCancelled
+from music_search_core import IndexChangeLog
+from music_search_core.models import IndexedSong
+from music_search_core.models import SongMetadata
+
+
+def song(path: str, title: str = "") -> IndexedSong:
+    return IndexedSong(path=path, name_lower=os.path.basename(path), title_lower=title, size=1, mtime_ns=1)
+
+
+class TitleExtractor:
+    """按文件名返回元信息；首次解析 block_name 时停住，直到 release 置位。"""
+
+    def __init__(self, block_name: str = ""):
+        self.block_name = block_name
+        self.reached = threading.Event()
+        self.release = threading.Event()
+
+    def extract(self, file_path: str) -> SongMetadata:
+        name = os.path.basename(file_path)
+        if name == self.block_name and not self.reached.is_set():
+            self.reached.set()
+            self.release.wait(10)
+        return SongMetadata(title=os.path.splitext(name)[0])
+
+
+def write_files(root, names):
+    for name in names:
+        (root / name).write_bytes(name.encode("utf-8"))
+
+
+def build_searcher(tmp_path, root, extractor) -> MusicSearcher:
+    searcher = MusicSearcher(
+        [str(root)],
+        extensions={".mp3"},
+        index_file=str(tmp_path / "index" / "music_index.json"),
+        publish_every=1,
+        publish_interval_sec=0,
+        probe_workers=1,
+        dedup=False,
+    )
+    searcher._indexer._metadata_extractor = extractor
+    return searcher
+
+
+def test_change_log_merges_generations():
+    log = IndexChangeLog()
+    assert log.record([], [song("/m/a"), song("/m/b")]) == 2
+    assert log.record([song("/m/a"), song("/m/b")], [song("/m/a", "new"), song("/m/c")]) == 3
+    assert log.generation == 2
+
+    changes = log.changes_since(log.epoch, 1)
+    assert changes == {"/m/a": song("/m/a", "new"), "/m/b": None, "/m/c": song("/m/c")}
+    assert log.changes_since(log.epoch, 0).keys() == {"/m/a", "/m/b", "/m/c"}
+
+
+def test_change_log_unchanged_library_returns_empty_delta():
+    log = IndexChangeLog()
+    assert log.record([song("/m/a")], [song("/m/a")]) == 0
+    assert log.changes_since(log.epoch, 0) == {}
+    assert log.changes_since("other", 0) is None
+    assert log.changes_since(log.epoch, 1) is None
+
+
+def test_change_log_falls_back_to_snapshot_outside_window():
+    log = IndexChangeLog(max_generations=2)
+    shard: list[IndexedSong] = []
+    for index in range(4):
+        new_shard = shard + [song(f"/m/{index}")]
+        log.record(shard, new_shard)
+        shard = new_shard
+    assert log.changes_since(log.epoch, 1) is None
+    assert log.changes_since(log.epoch, 2).keys() == {"/m/2", "/m/3"}
+
+
+def test_cancelled_refresh_does_not_hide_changes(tmp_path):
+    root = tmp_path / "music"
+    root.mkdir()
+    write_files(root, ["a.mp3", "b.mp3", "c.mp3"])
+    extractor = TitleExtractor(block_name="n05.mp3")
+    searcher = build_searcher(tmp_path, root, extractor)
+    searcher.refresh_root(str(root))
+    epoch = searcher.export_snapshot()["epoch"]
+    assert searcher.export_snapshot()["generation"] == 1
+
+    (root / "c.mp3").unlink()
+    new_names = [f"n{index:02d}.mp3" for index in range(10)]
+    write_files(root, new_names)
+
+    errors = []
+
+    def first_refresh():
+        try:
+            searcher.refresh_root(str(root))
+        except IndexBuildCancelled as exc:
+            errors.append(exc)
+
+    thread = threading.Thread(target=first_refresh)
+    thread.start()
+    assert extractor.reached.wait(10)
+    # 第一次刷新已发布部分快照，第二次刷新取代它
+    searcher.refresh_root(str(root))
+    extractor.release.set()
+    thread.join(10)
+    assert len(errors) == 1
+
+    changes = searcher.export_changes(epoch, 1)
+    assert changes["full"] is False
+    assert changes["removed"] == [str(root / "c.mp3")]
+    assert sorted(os.path.basename(item["path"]) for item in changes["upserts"]) == new_names
+    assert all(item["title_lower"] for item in changes["upserts"])
+
+
+def test_export_and_import_round_trip(tmp_path):
+    upstream_root = tmp_path / "upstream"
+    upstream_root.mkdir()
+    write_files(upstream_root, ["a.mp3", "b.mp3"])
+    upstream = build_searcher(tmp_path / "up", upstream_root, TitleExtractor())
+    upstream.refresh_root(str(upstream_root))
+
+    local_root = tmp_path / "local"
+    local_root.mkdir()
+    local = build_searcher(tmp_path / "down", local_root, TitleExtractor())
+    path_map = {str(upstream_root): str(local_root)}
+
+    snapshot = upstream.export_changes("", 0)
+    assert snapshot["full"] is True
+    assert local.import_changes(snapshot, path_map) == 2
+    assert sorted(os.path.basename(path) for path in local.find("a")) == ["a.mp3"]
+
+    # 未变化时增量为空
+    unchanged = upstream.export_changes(snapshot["epoch"], snapshot["generation"])
+    assert unchanged["full"] is False
+    assert unchanged["upserts"] == [] and unchanged["removed"] == []
+
+    (upstream_root / "a.mp3").unlink()
+    write_files(upstream_root, ["c.mp3"])
+    upstream.refresh_root(str(upstream_root))
+    delta = upstream.export_changes(snapshot["epoch"], snapshot["generation"])
+    assert delta["full"] is False
+    assert local.import_changes(delta, path_map) == 2
+    assert local.find("a") == []
+    assert local.find("c") == [str(local_root / "c.mp3")]
+
+
+@pytest.mark.parametrize("since", [-1, 5])
+def test_change_log_rejects_unknown_generation(since):
+    log = IndexChangeLog()
+    log.record([], [song("/m/a")])
+    assert log.changes_since(log.epoch, since) is None
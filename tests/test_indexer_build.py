@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from music_search_core import IndexBuildCancelled
+from music_search_core import MusicIndexer
+from music_search_core.models import SongMetadata
+
+
+class CountingExtractor:
+    """按文件名返回标题；解析到 cancel_after 个文件后置位取消事件。"""
+
+    def __init__(self, cancel_event: threading.Event | None = None, cancel_after: int = 0):
+        self.cancel_event = cancel_event
+        self.cancel_after = cancel_after
+        self.calls: list[str] = []
+
+    def extract(self, file_path: str) -> SongMetadata:
+        self.calls.append(file_path)
+        if self.cancel_event is not None and len(self.calls) >= self.cancel_after:
+            self.cancel_event.set()
+        return SongMetadata(title=file_path.rsplit("/", 1)[-1].split(".")[0].upper())
+
+
+def make_indexer(extractor) -> MusicIndexer:
+    indexer = MusicIndexer(extensions={".mp3"}, metadata_workers=1)
+    indexer._metadata_extractor = extractor
+    return indexer
+
+
+@pytest.fixture
+def library(tmp_path):
+    for index in range(6):
+        (tmp_path / f"song{index}.mp3").write_bytes(b"x" * (index + 1))
+    (tmp_path / "cover.jpg").write_bytes(b"x")
+    return tmp_path
+
+
+def test_partial_snapshots_precede_final_result(library):
+    indexer = make_indexer(CountingExtractor())
+    snapshots = list(indexer.iter_build([str(library)], publish_every=2))
+
+    assert [snapshot.done for snapshot in snapshots] == [False, False, False, False, True]
+    # 首个快照只含文件名，尚未解析元信息
+    assert len(snapshots[0].songs) == 6
+    assert all(song.title_lower == "" and song.size == 0 for song in snapshots[0].songs)
+    final = snapshots[-1].songs
+    assert [song.title_lower for song in final] == [f"song{index}" for index in range(6)]
+    assert [song.path for song in final] == sorted(song.path for song in final)
+
+
+def test_cancel_raises_and_placeholders_are_not_reused(library):
+    cancel_event = threading.Event()
+    extractor = CountingExtractor(cancel_event, cancel_after=2)
+    indexer = make_indexer(extractor)
+    seen = []
+    with pytest.raises(IndexBuildCancelled):
+        for snapshot in indexer.iter_build([str(library)], publish_every=1, cancel_event=cancel_event):
+            seen.append(snapshot)
+    assert not any(snapshot.done for snapshot in seen)
+    assert len(extractor.calls) == 2
+
+    # 取消前的部分结果作为上次结果传入时，只有真正解析过的文件会被复用
+    extractor = CountingExtractor()
+    songs = make_indexer(extractor).build([str(library)], previous_songs=seen[-1].songs)
+    assert len(songs) == 6
+    assert len(extractor.calls) == 4
+
+
+def test_unchanged_files_are_reused(library):
+    songs = make_indexer(CountingExtractor()).build([str(library)])
+    (library / "song0.mp3").write_bytes(b"changed")
+    extractor = CountingExtractor()
+    rebuilt = make_indexer(extractor).build([str(library)], previous_songs=songs)
+    assert extractor.calls == [str(library / "song0.mp3")]
+    assert len(rebuilt) == 6
+
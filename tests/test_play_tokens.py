@@ -0,0 +1,81 @@
+import pytest
+
+import music_service
+from music_service import PlayTokenTable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(music_service.time, "monotonic", fake)
+    return fake
+
+
+def issue(table: PlayTokenTable, path: str, size: int = 10):
+    return table.issue(path, size, 1, "audio/mpeg")
+
+
+def test_same_path_reuses_token_and_updates_entry(clock):
+    table = PlayTokenTable()
+    first = issue(table, "/music/a.mp3", size=10)
+    second = issue(table, "/music/a.mp3", size=20)
+    assert first.token == second.token
+    assert table.lookup(first.token).size == 20
+    assert issue(table, "/music/b.mp3").token != first.token
+    assert len(table) == 2
+
+
+def test_tokens_are_url_safe(clock):
+    token = issue(PlayTokenTable(token_bytes=6), "/music/a.mp3").token
+    assert len(token) == 8
+    assert token.replace("-", "").replace("_", "").isalnum()
+
+
+def test_lookup_unknown_token(clock):
+    assert PlayTokenTable().lookup("missing") is None
+
+
+def test_evicts_least_recently_used(clock):
+    table = PlayTokenTable(max_entries=2)
+    a = issue(table, "/music/a.mp3")
+    b = issue(table, "/music/b.mp3")
+    # 查询 a 使其成为最近使用，新签发时淘汰 b
+    assert table.lookup(a.token) is not None
+    c = issue(table, "/music/c.mp3")
+    assert len(table) == 2
+    assert table.lookup(b.token) is None
+    assert table.lookup(a.token) is not None
+    assert table.lookup(c.token) is not None
+    # 被淘汰的路径重新签发时获得新 token
+    assert issue(table, "/music/b.mp3").token != b.token
+
+
+def test_entries_expire_after_ttl(clock):
+    table = PlayTokenTable(ttl_sec=60)
+    a = issue(table, "/music/a.mp3")
+    clock.now += 59
+    assert table.lookup(a.token) is not None
+    # 查询会续期
+    clock.now += 59
+    assert table.lookup(a.token) is not None
+    clock.now += 60
+    assert table.lookup(a.token) is None
+    assert len(table) == 0
+
+
+def test_issue_drops_expired_entries(clock):
+    table = PlayTokenTable(ttl_sec=60)
+    a = issue(table, "/music/a.mp3")
+    clock.now += 61
+    b = issue(table, "/music/b.mp3")
+    assert len(table) == 1
+    assert table.lookup(b.token) is not None
+    assert issue(table, "/music/a.mp3").token != a.token
@@ -0,0 +1,114 @@
+import os
+import random
+
+import pytest
+
+from music_search_core import MusicSearchEngine
+from music_search_core import SharedIndexReader
+from music_search_core import SharedIndexWriter
+from music_search_core.models import IndexedSong
+from music_search_core.shared_index import read_generation
+
+
+WORDS = ["晴天", "稻香", "adele", "hello", "周杰伦", "七里香", "a", "live", "歌手0042", "ab"]
+KEYWORDS = WORDS + ["lo", "香", "不存在", "mp3", "music", "\u0000", "e\na"]
+
+
+def random_songs(count: int, seed: int = 0) -> list[IndexedSong]:
+    rng = random.Random(seed)
+
+    def field() -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 2)))
+
+    return [
+        IndexedSong(
+            path=f"/music/dir{index % 7}/{index}.mp3",
+            name_lower=f"{field()}.mp3",
+            title_lower=field(),
+            artist_lower=field(),
+            album_lower=field(),
+        )
+        for index in range(count)
+    ]
+
+
+@pytest.fixture
+def index_file(tmp_path):
+    return str(tmp_path / "shared" / "index.bin")
+
+
+def test_search_matches_engine(index_file):
+    songs = random_songs(500)
+    SharedIndexWriter(index_file).publish(songs)
+    reader = SharedIndexReader(index_file)
+    engine = MusicSearchEngine()
+
+    assert reader.size() == len(songs)
+    for keyword in KEYWORDS:
+        expected_total, expected = engine.search_with_count(songs, keyword, len(songs))
+        total, paths = reader.search_with_count(keyword, len(songs))
+        assert total == expected_total, keyword
+        assert sorted(paths) == sorted(expected), keyword
+
+        limited_total, limited = reader.search_with_count(keyword, 3)
+        assert limited_total == expected_total
+        assert len(limited) == min(3, expected_total)
+        assert set(limited) <= set(expected)
+        assert reader.search_with_count(keyword, 0) == (expected_total, [])
+
+
+def test_fields_with_separators_do_not_leak(index_file):
+    songs = [
+        IndexedSong(path="/music/keyword/1.mp3", name_lower="a\nb", title_lower="c\0d"),
+        IndexedSong(path="/music/2.mp3", name_lower="x", album_lower="keyword"),
+    ]
+    SharedIndexWriter(index_file).publish(songs)
+    reader = SharedIndexReader(index_file)
+    # 路径中的文本不参与搜索
+    assert reader.search_with_count("keyword", 10) == (1, ["/music/2.mp3"])
+    assert reader.search_with_count("c d", 10) == (1, ["/music/keyword/1.mp3"])
+
+
+def test_reader_switches_to_new_generation(index_file):
+    writer = SharedIndexWriter(index_file)
+    reader = SharedIndexReader(index_file)
+    assert reader.generation == 0
+    assert reader.search_with_count("晴天", 10) == (0, [])
+    assert reader.random_pick(5) == []
+
+    writer.publish([IndexedSong(path="/music/old.mp3", name_lower="晴天.mp3")])
+    assert reader.generation == 1
+    assert reader.search_with_count("晴天", 10) == (1, ["/music/old.mp3"])
+
+    writer.publish([IndexedSong(path="/music/new.mp3", name_lower="稻香.mp3")])
+    assert reader.generation == 2
+    assert reader.search_with_count("晴天", 10) == (0, [])
+    assert reader.search_with_count("稻香", 10) == (1, ["/music/new.mp3"])
+
+    # 重启后的写入方从文件中的代数继续递增
+    assert read_generation(index_file) == 2
+    assert SharedIndexWriter(index_file).publish([]) == 3
+    assert reader.size() == 0
+
+
+def test_random_pick_returns_distinct_paths(index_file):
+    songs = random_songs(50)
+    SharedIndexWriter(index_file).publish(songs)
+    reader = SharedIndexReader(index_file)
+    picked = reader.random_pick(20)
+    assert len(picked) == len(set(picked)) == 20
+    assert set(picked) <= {song.path for song in songs}
+    assert len(reader.random_pick(100)) == len(songs)
+    assert reader.random_pick(0) == []
+
+
+def test_corrupt_file_keeps_current_mapping(index_file):
+    SharedIndexWriter(index_file).publish([IndexedSong(path="/music/a.mp3", name_lower="a.mp3")])
+    reader = SharedIndexReader(index_file)
+    assert reader.size() == 1
+    # 写入方总是整体替换文件，已映射的旧版本不受影响
+    with open(index_file + ".bad", "wb") as file_obj:
+        file_obj.write(b"not an index" * 10)
+    os.replace(index_file + ".bad", index_file)
+    assert reader.size() == 1
+    assert reader.search_with_count("a.mp3", 10) == (1, ["/music/a.mp3"])
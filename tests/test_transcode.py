@@ -0,0 +1,72 @@
+import os
+import stat
+
+import pytest
+
+import music_transcode
+from music_transcode import TranscodeCache
+
+
+def fake_ffmpeg(tmp_path, body: str) -> tuple[str, str]:
+    """写一个代替 ffmpeg 的脚本，每次运行在 runs 文件中追加一行。"""
+    runs = tmp_path / "runs"
+    script = tmp_path / "ffmpeg"
+    script.write_text(f"#!/bin/sh\necho run >> '{runs}'\n{body}\n")
+    script.chmod(script.stat().st_mode | stat.S_IXUSR)
+    return str(script), str(runs)
+
+
+def run_count(runs: str) -> int:
+    if not os.path.exists(runs):
+        return 0
+    with open(runs, encoding="utf-8") as file_obj:
+        return len(file_obj.readlines())
+
+
+def finish(cache: TranscodeCache, path: str, size: int = 1):
+    cached, job = cache.get_or_start(path, size, 1)
+    assert cached is None and job is not None
+    with job.cond:
+        while not job.done:
+            job.cond.wait(5)
+    return job
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "song.flac"
+    path.write_bytes(b"flac")
+    return str(path)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="需要 sh")
+def test_successful_transcode_is_cached(tmp_path, source):
+    ffmpeg, runs = fake_ffmpeg(tmp_path, "printf 'mp3 data'")
+    cache = TranscodeCache(ffmpeg, str(tmp_path / "cache"), extensions={".flac"})
+    job = finish(cache, source)
+    assert not job.failed
+    cached, job = cache.get_or_start(source, 1, 1)
+    assert job is None
+    with open(cached, "rb") as file_obj:
+        assert file_obj.read() == b"mp3 data"
+    assert run_count(runs) == 1
+
+
+@pytest.mark.skipif(os.name != "posix", reason="需要 sh")
+def test_failed_transcode_is_not_retried_until_ttl(tmp_path, source, monkeypatch):
+    ffmpeg, runs = fake_ffmpeg(tmp_path, "echo 'invalid data' >&2; exit 1")
+    cache = TranscodeCache(ffmpeg, str(tmp_path / "cache"), extensions={".flac"}, failure_ttl_sec=60)
+    assert finish(cache, source).failed
+    assert not os.listdir(tmp_path / "cache")
+
+    # 失败记录有效期内直接回退原文件，不再启动 ffmpeg
+    assert cache.get_or_start(source, 1, 1) == (None, None)
+    cache.prepare(source, 1, 1)
+    assert run_count(runs) == 1
+    # 文件变化后 cache_key 不同，照常重试
+    assert finish(cache, source, size=2).failed
+
+    now = music_transcode.time.monotonic()
+    monkeypatch.setattr(music_transcode.time, "monotonic", lambda: now + 61)
+    assert finish(cache, source).failed
+    assert run_count(runs) == 3
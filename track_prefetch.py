@@ -0,0 +1,82 @@
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class TrackPrefetcher:
+    def __init__(self, bytes_per_track: int = 4 * 1024 * 1024, chunk_size: int = 256 * 1024):
+        self.bytes_per_track = max(int(bytes_per_track), 0)
+        self.chunk_size = max(int(chunk_size), 4096)
+        self._lock = threading.Lock()
+        self._cancel_event: threading.Event | None = None
+        self._thread: threading.Thread | None = None
+
+    def schedule(self, paths: list[str]):
+        paths = [path for path in paths if path]
+        with self._lock:
+            self._cancel_unlocked()
+            if not paths or self.bytes_per_track <= 0:
+                return
+            cancel_event = threading.Event()
+            self._cancel_event = cancel_event
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(paths, cancel_event),
+                name="track-prefetch",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def cancel(self):
+        with self._lock:
+            self._cancel_unlocked()
+
+    def _cancel_unlocked(self):
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+        self._cancel_event = None
+        self._thread = None
+
+    def _run(self, paths: list[str], cancel_event: threading.Event):
+        for path in paths:
+            if cancel_event.is_set():
+                return
+            start_time = time.monotonic()
+            warmed = self._warm_file(path, cancel_event)
+            if warmed:
+                logger.debug(
+                    "预读下一首完成: 路径=%s 字节=%d 耗时=%.1f毫秒",
+                    path,
+                    warmed,
+                    (time.monotonic() - start_time) * 1000,
+                )
+
+    def _warm_file(self, path: str, cancel_event: threading.Event) -> int:
+        try:
+            fd = os.open(path, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+        except OSError as exc:
+            logger.debug("预读打开文件失败: 路径=%s 错误=%s", path, exc)
+            return 0
+        warmed = 0
+        try:
+            if hasattr(os, "posix_fadvise"):
+                try:
+                    os.posix_fadvise(fd, 0, self.bytes_per_track, os.POSIX_FADV_WILLNEED)
+                except OSError:
+                    pass
+            # fadvise 只是提示，网络存储和休眠磁盘仍需实际读取才能唤醒
+            while warmed < self.bytes_per_track and not cancel_event.is_set():
+                size = min(self.chunk_size, self.bytes_per_track - warmed)
+                chunk = os.pread(fd, size, warmed)
+                if not chunk:
+                    break
+                warmed += len(chunk)
+        except OSError as exc:
+            logger.debug("预读文件失败: 路径=%s 错误=%s", path, exc)
+        finally:
+            os.close(fd)
+        return warmed